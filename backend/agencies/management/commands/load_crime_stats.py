@@ -124,6 +124,7 @@ class Command(BaseCommand):
                 # Create CrimeStatistic for each district and year
                 stat, created = CrimeStatistic.objects.update_or_create(
                     date=datetime(year, 1, 1),
+                    status=None,  # yearly summary, not a daily rollup
                     district=district,
                     agency=agency,
                     defaults={
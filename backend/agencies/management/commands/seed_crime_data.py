@@ -2,6 +2,9 @@ from django.core.management.base import BaseCommand
 from django.contrib.gis.geos import Point
 from django.utils import timezone
 from crimes.models import Crime, CrimeCategory, CrimeMedia, CrimeNote, CrimeStatistic, District, Neighborhood
+from crimes.cache import bump_versions
+from crimes.rollups import rebuild
+from crimes.geohash import spatial_key
 from agencies.models import Agency
 import random
 from datetime import datetime, timedelta
@@ -218,6 +221,7 @@ class Command(BaseCommand):
                         time=time,
                         status=random.choice(['reported', 'under_investigation', 'solved']),
                         location=location,
+                        geohash=spatial_key(location),
                         block_address=f"{neighborhood.name} Block {random.randint(1, 100)}",
                         district=district,
                         neighborhood=neighborhood,
@@ -238,6 +242,9 @@ class Command(BaseCommand):
                 Crime.objects.bulk_create(batch, ignore_conflicts=True)
                 created_count += len(batch)
                 self.stdout.write(f"Created {len(batch)} crimes for {year} (batch {i // batch_size + 1})")
+        # bulk_create skips the rollup signals (and ignored conflicts hide which rows were new).
+        rebuild(agency_id=agency.id)
+        bump_versions(agency.id)
         self.stdout.write(self.style.SUCCESS(f"Created {created_count} crimes"))
 
         # Step 6: Seed Crime Media and Notes
@@ -283,6 +290,7 @@ class Command(BaseCommand):
             for district in districts:
                 stat, created = CrimeStatistic.objects.update_or_create(
                     date=datetime(year, 1, 1),
+                    status=None,  # yearly summary, not a daily rollup
                     district=district,
                     agency=agency,
                     defaults={
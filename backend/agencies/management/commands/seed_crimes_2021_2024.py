@@ -2,6 +2,9 @@ from django.core.management.base import BaseCommand
 from django.contrib.gis.geos import Point
 from django.utils import timezone
 from crimes.models import Crime, CrimeCategory, District, Neighborhood
+from crimes.cache import bump_versions
+from crimes.rollups import rebuild
+from crimes.geohash import spatial_key
 from agencies.models import Agency
 import random
 from datetime import timedelta
@@ -112,6 +115,7 @@ class Command(BaseCommand):
                         time=time,
                         status=random.choice(['reported', 'under_investigation', 'solved']),
                         location=location,
+                        geohash=spatial_key(location),
                         block_address=f"{neighborhood.name} Block {random.randint(1, 100)}",
                         district=district,
                         neighborhood=neighborhood,
@@ -138,4 +142,7 @@ class Command(BaseCommand):
             except Exception as e:
                 self.stderr.write(f"Error creating crimes for {year}: {str(e)}")
 
+        # bulk_create skips the rollup signals (and ignored conflicts hide which rows were new).
+        rebuild(agency_id=agency.id)
+        bump_versions(agency.id)
         self.stdout.write(self.style.SUCCESS(f"Successfully created {created_count} crimes for 2021-2024"))
\ No newline at end of file
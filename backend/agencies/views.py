@@ -5,10 +5,10 @@ from django.utils.decorators import method_decorator
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.decorators import action
 from dateutil.relativedelta import relativedelta
-from django.db.models import Count
+from django.db.models import Count, Sum
 from django.utils import timezone
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import FormParser
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Agency, AgencyContact, APIKey, DataImportLog
@@ -16,12 +16,75 @@ from .serializers import (
     AgencySerializer, AgencyListSerializer, AgencyContactSerializer,
     APIKeySerializer, DataImportLogSerializer, AgencyAdminSerializer
 )
-from crime_etl.models import ImportJob, ImportLog, DataSource
+from crime_etl.jobs import enqueue, store_upload
+from crime_etl.parallel import max_partitions
+from crime_etl.readers import READERS, SpooledMultiPartParser
+from crime_etl.models import ImportJob, DataSource
 from crimes.models import Crime, CrimeCategory
-from crimes.serializers import CrimeCreateSerializer
-import pandas as pd
-import json
-from django.db import transaction
+from crimes.aggregates import period_key, time_series
+from crimes.cache import analytics_keys
+from crimes.query import CrimeQueryBuilder
+from crimes.refresh import refreshable
+from crimes.rollups import analytics_source
+from crimes.singleflight import single_flight, single_flight_metrics
+
+# Longer than refresh_analytics_cache's default --lead (300s), so the refresher renews the
+# entry shortly before it expires instead of recomputing it on every cycle.
+SYSTEM_STATS_TIMEOUT = 60 * 10
+
+# 'bulk' validates DataFrame chunks in Python, 'parallel' does so in one worker per case-number
+# partition, and 'copy' loads CSV files through a PostgreSQL staging table.
+UPLOAD_LOADERS = ('bulk', 'parallel', 'copy')
+
+
+@refreshable('agency_stats')
+@single_flight('agency_stats', lambda builder, start_date, end_date: analytics_keys(
+    'agency_stats', builder, start_date=start_date, end_date=end_date
+))
+def agency_crime_stats(builder, start_date, end_date):
+    """Compute an agency's crime total, per-category counts and monthly trends."""
+    queryset, rollup = analytics_source(builder, 'Agency crime stats query')
+    per_type = (
+        queryset.order_by()
+        .values('category__name')
+        .annotate(crimes=Sum('count') if rollup else Count('id'))
+        .order_by('-crimes')
+    )
+    crime_types = [{'category__name': row['category__name'], 'count': row['crimes']} for row in per_type]
+    monthly_trends = [
+        {'date': period_key(bucket['period']), 'total': bucket['total']}
+        for bucket in time_series(queryset, start_date, end_date, metrics=['total'], rollup=rollup)
+    ]
+    return {
+        'total_crimes': sum(row['count'] for row in crime_types),
+        'crime_types': crime_types,
+        'monthly_trends': monthly_trends
+    }
+
+
+@refreshable('system_stats')
+@single_flight('system_stats', lambda: ('agency_system_stats', 'agency_system_stats_stale'), timeout=SYSTEM_STATS_TIMEOUT)
+def system_stats_data():
+    """Compute the system-wide agency, API key and import counts."""
+    return {
+        'total_agencies': Agency.objects.count(),
+        'approved_agencies': Agency.objects.filter(status='approved').count(),
+        'pending_agencies': Agency.objects.filter(status='pending').count(),
+        'disabled_agencies': Agency.objects.filter(status='disabled').count(),
+        'total_api_keys': APIKey.objects.count(),
+        'active_api_keys': APIKey.objects.filter(is_active=True).count(),
+        'total_imports': DataImportLog.objects.count(),
+        'successful_imports': DataImportLog.objects.filter(status='completed').count(),
+        'failed_imports': DataImportLog.objects.filter(status='failed').count(),
+        'latest_registrations': AgencyAdminSerializer(
+            Agency.objects.order_by('-created_at')[:5], 
+            many=True
+        ).data,
+        'latest_imports': DataImportLogSerializer(
+            DataImportLog.objects.order_by('-import_date')[:5], 
+            many=True
+        ).data
+    }
 
 class IsAgencyUserOrReadOnly(permissions.BasePermission):
     """Custom permission to allow agency users to edit agencies, read-only for others."""
@@ -130,7 +193,7 @@ class AgencyViewSet(viewsets.ModelViewSet):
         serializer = DataImportLogSerializer(import_logs, many=True)
         return Response(serializer.data)
 
-    @action(detail=True, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    @action(detail=True, methods=['post'], parser_classes=[SpooledMultiPartParser, FormParser])
     def upload_data(self, request, pk=None):
         """Handle data upload for an agency."""
         agency = self.get_object()
@@ -143,6 +206,24 @@ class AgencyViewSet(viewsets.ModelViewSet):
             file = request.FILES.get('file')
             if not file:
                 return Response({"error": "No file uploaded"}, status=status.HTTP_400_BAD_REQUEST)
+
+            file_extension = file.name.split('.')[-1].lower()
+            loader = request.data.get('loader', 'bulk')
+            if loader not in UPLOAD_LOADERS:
+                return Response({"error": f"Unknown loader '{loader}'"}, status=status.HTTP_400_BAD_REQUEST)
+            if loader == 'copy' and file_extension != 'csv':
+                return Response({"error": "The copy loader only accepts CSV files"}, status=status.HTTP_400_BAD_REQUEST)
+            parameters = {'loader': loader}
+            if loader == 'parallel' and request.data.get('workers'):
+                try:
+                    parameters['workers'] = int(request.data['workers'])
+                except ValueError:
+                    return Response({"error": "workers must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+                if not 1 <= parameters['workers'] <= max_partitions():
+                    return Response(
+                        {"error": f"workers must be between 1 and {max_partitions()}"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
             
             # Create ImportJob
             data_source = DataSource.objects.filter(created_by__agency=agency, source_type='file').first()
@@ -157,6 +238,7 @@ class AgencyViewSet(viewsets.ModelViewSet):
             import_job = ImportJob.objects.create(
                 created_by=request.user,
                 data_source=data_source,
+                parameters=parameters,
                 status='pending',
                 started_at=timezone.now()
             )
@@ -172,19 +254,7 @@ class AgencyViewSet(viewsets.ModelViewSet):
             )
             
             # Process file based on type
-            file_extension = file.name.split('.')[-1].lower()
-            records = []
-            
-            if file_extension == 'csv':
-                df = pd.read_csv(file)
-                records = df.to_dict('records')
-            elif file_extension in ['xlsx', 'xls']:
-                df = pd.read_excel(file)
-                records = df.to_dict('records')
-            elif file_extension == 'json':
-                data = json.load(file)
-                records = data if isinstance(data, list) else [data]
-            else:
+            if file_extension not in READERS:
                 import_log.status = 'failed'
                 import_log.error_message = 'Unsupported file format'
                 import_log.save()
@@ -192,64 +262,22 @@ class AgencyViewSet(viewsets.ModelViewSet):
                 import_job.completed_at = timezone.now()
                 import_job.save()
                 return Response({"error": "Unsupported file format"}, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Process records and create Crimes
-            record_count = 0
-            with transaction.atomic():
-                for record in records:
-                    try:
-                        # Map fields to Crime model
-                        category_name = record.get('category') or record.get('crime_type', 'Unknown')
-                        category, _ = CrimeCategory.objects.get_or_create(name=category_name)
-                        
-                        crime_data = {
-                            'agency': agency.id,
-                            'category': category.id,
-                            'case_number': record.get('case_number', ''),
-                            'description': record.get('description', ''),
-                            'date': record.get('date', timezone.now().date()),
-                            'time': record.get('time', None),
-                            'latitude': record.get('latitude'),
-                            'longitude': record.get('longitude'),
-                            'block_address': record.get('block_address', ''),
-                            'status': record.get('status', 'reported'),
-                            'is_violent': record.get('is_violent', False),
-                            'arrests_made': record.get('arrests_made', False),
-                            'property_loss': record.get('property_loss', None)
-                        }
-                        
-                        serializer = CrimeCreateSerializer(data=crime_data)
-                        if serializer.is_valid():
-                            serializer.save(agency=agency)
-                            record_count += 1
-                        else:
-                            continue  # Skip invalid records
-                    except Exception as e:
-                        continue  # Skip records with errors
-                
-                # Update import job and log
-                import_log.status = 'completed'
-                import_log.record_count = record_count
-                import_log.completed_at = timezone.now()
-                import_log.save()
-                
-                import_job.status = 'completed'
-                import_job.completed_at = timezone.now()
-                import_job.record_count = record_count
-                import_job.save()
-                
-                # Create ImportLog for crime_etl
-                import_log_entry = ImportLog.objects.create(
-                    import_job=import_job,
-                    status='completed',
-                    message=f'Imported {record_count} crime records',
-                    created_at=timezone.now()
-                )
-                
-                agency.last_data_upload = timezone.now()
-                agency.save()
-            
-            return Response({"status": "success", "import_id": import_log.id, "record_count": record_count})
+
+            # Store the upload and load it in the background; progress is written to the ImportJob
+            import_job.parameters.update({
+                'format': file_extension,
+                'agency_id': agency.id,
+                'data_import_log_id': import_log.id,
+            })
+            import_job.save(update_fields=['parameters'])
+            store_upload(import_job, file)
+            enqueue(import_job)
+
+            return Response({
+                "status": "accepted",
+                "job_id": import_job.id,
+                "import_id": import_log.id
+            }, status=status.HTTP_202_ACCEPTED)
         except Exception as e:
             error_message = str(e)
             if import_log:
@@ -270,23 +298,12 @@ class AgencyViewSet(viewsets.ModelViewSet):
         if not (request.user.user_type == 'agency' and request.user.agency == agency or request.user.is_staff):
             return Response({"detail": "Not authorized."}, status=status.HTTP_403_FORBIDDEN)
         
-        # Crime statistics
-        crimes = Crime.objects.filter(agency=agency)
-        crime_types = crimes.values('category__name').annotate(count=Count('id')).order_by('-count')
-        
-        # Monthly trends (last 6 months)
+        # Crime statistics, with monthly trends for the last 6 months
         end_date = timezone.now().date()
         start_date = end_date - relativedelta(months=6)
-        monthly_trends = []
-        current_date = start_date.replace(day=1)
-        while current_date <= end_date:
-            next_month = current_date + relativedelta(months=1)
-            month_crimes = crimes.filter(date__gte=current_date, date__lt=next_month)
-            monthly_trends.append({
-                'date': current_date.strftime('%Y-%m'),
-                'total': month_crimes.count()
-            })
-            current_date = next_month
+        crime_stats = agency_crime_stats(
+            CrimeQueryBuilder().agency(agency.id), start_date.replace(day=1), end_date
+        )
         
         stats = {
             'contact_count': agency.contacts.count(),
@@ -295,9 +312,7 @@ class AgencyViewSet(viewsets.ModelViewSet):
             'successful_imports': agency.import_logs.filter(status='completed').count(),
             'status': agency.status,
             'last_data_upload': agency.last_data_upload,
-            'total_crimes': crimes.count(),
-            'crime_types': list(crime_types),
-            'monthly_trends': monthly_trends
+            **crime_stats
         }
         return Response(stats)
 
@@ -369,23 +384,11 @@ class AdminAgencyViewSet(viewsets.ModelViewSet):
     def system_stats(self, request):
         """Get system-wide statistics for admin dashboard."""
         stats = {
-            'total_agencies': Agency.objects.count(),
-            'approved_agencies': Agency.objects.filter(status='approved').count(),
-            'pending_agencies': Agency.objects.filter(status='pending').count(),
-            'disabled_agencies': Agency.objects.filter(status='disabled').count(),
-            'total_api_keys': APIKey.objects.count(),
-            'active_api_keys': APIKey.objects.filter(is_active=True).count(),
-            'total_imports': DataImportLog.objects.count(),
-            'successful_imports': DataImportLog.objects.filter(status='completed').count(),
-            'failed_imports': DataImportLog.objects.filter(status='failed').count(),
-            'latest_registrations': AgencyAdminSerializer(
-                Agency.objects.order_by('-created_at')[:5], 
-                many=True
-            ).data,
-            'latest_imports': DataImportLogSerializer(
-                DataImportLog.objects.order_by('-import_date')[:5], 
-                many=True
-            ).data
+            **system_stats_data(),
+            'analytics_cache': {
+                name: single_flight_metrics(name)
+                for name in ('stats', 'trends', 'heatmap', 'agency_stats', 'system_stats')
+            }
         }
         return Response(stats)
 
@@ -1 +1,4 @@
-# This file is intentionally left empty to mark directory as Python package
+# Load the Celery app with Django so shared tasks bind to it
+from .celery import app as celery_app
+
+__all__ = ('celery_app',)
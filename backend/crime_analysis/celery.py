@@ -0,0 +1,15 @@
+"""
+Celery application for crime_analysis project.
+
+Start a worker with ``celery -A crime_analysis worker``.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crime_analysis.settings')
+
+app = Celery('crime_analysis')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -0,0 +1,67 @@
+"""
+JSON rendering for the API.
+"""
+import json
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+    orjson.Fragment  # added in orjson 3.9
+except (ImportError, AttributeError):  # pragma: no cover - falls back to DRF's json encoder
+    orjson = None
+
+
+class RawJSON:
+    """A pre-rendered JSON value (e.g. ``ST_AsGeoJSON`` output) to embed as-is."""
+
+    __slots__ = ('json',)
+
+    def __init__(self, value):
+        self.json = value
+
+    def __repr__(self):
+        return f'RawJSON({self.json!r})'
+
+
+class RawJSONEncoder(encoders.JSONEncoder):
+    """DRF's encoder, parsing RawJSON values back into Python objects."""
+
+    def default(self, obj):
+        if isinstance(obj, RawJSON):
+            return json.loads(obj.json)
+        return super().default(obj)
+
+
+_encoder = RawJSONEncoder()
+
+
+def _orjson_default(obj):
+    if isinstance(obj, RawJSON):
+        return orjson.Fragment(obj.json)
+    return _encoder.default(obj)
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """
+    JSONRenderer backed by orjson.
+
+    Output matches DRF's compact rendering: datetimes, decimals and other
+    non-native types go through DRF's encoder, and U+2028/U+2029 are
+    escaped. RawJSON values are spliced into the output without being
+    parsed. Indented output (e.g. the browsable API), ASCII-only output or
+    a missing orjson fall back to the stock renderer.
+    """
+
+    encoder_class = RawJSONEncoder
+    options = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.ensure_ascii or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=_orjson_default, option=self.options)
+        if b'\xe2\x80' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
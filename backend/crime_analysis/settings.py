@@ -35,6 +35,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.gis',  # Geographic information system support
+    'django.contrib.postgres',  # Full-text and trigram search
     
     # Third-party apps
     'rest_framework',
@@ -172,6 +173,10 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'crime_analysis.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 25,
 }
@@ -267,4 +272,17 @@ CACHES = {
         },
         "KEY_PREFIX": "crime_analysis"
     }
-}
\ No newline at end of file
+}
+
+# Celery
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', CACHES['default']['LOCATION'])
+# Partitioned uploads collect their subtasks' results with a chord, which needs a result backend
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', CELERY_BROKER_URL)
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Where uploaded import files run: 'celery' workers, or a 'local' in-process thread pool (development and tests)
+IMPORT_JOB_EXECUTOR = os.environ.get('IMPORT_JOB_EXECUTOR', 'celery')
+
+# Most partitions (worker processes or Celery subtasks) a 'parallel' upload may be split into
+IMPORT_MAX_PARTITIONS = int(os.environ.get('IMPORT_MAX_PARTITIONS', os.cpu_count() or 1))
@@ -7,6 +7,7 @@ from .models import (
     PatternAnalysis,
     DemographicCorrelation
 )
+from crimes.fields import PrerenderedGeometryField
 from crimes.serializers import CrimeCategorySerializer, DistrictSerializer, NeighborhoodSerializer
 
 class PredictionModelSerializer(serializers.ModelSerializer):
@@ -19,6 +20,7 @@ class PredictionModelSerializer(serializers.ModelSerializer):
         read_only_fields = ['trained_date', 'updated_at']
 
 class HotspotZoneSerializer(GeoFeatureModelSerializer):
+    boundary = PrerenderedGeometryField(read_only=True)
     crime_types = CrimeCategorySerializer(many=True, read_only=True)
     district = DistrictSerializer(read_only=True)
     neighborhood = NeighborhoodSerializer(read_only=True)
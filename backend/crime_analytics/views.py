@@ -11,7 +11,9 @@ from django.contrib.gis.measure import D
 from django.db.models import Count, Avg
 from .models import PredictionModel, HotspotZone, CrimePrediction, PatternAnalysis, DemographicCorrelation, CrimePredictionResult
 from .serializers import PredictionModelSerializer, HotspotZoneSerializer, CrimePredictionSerializer, PatternAnalysisSerializer, DemographicCorrelationSerializer
+from crimes.fields import with_geojson
 from crimes.models import Crime
+from crimes.query import CrimeQueryBuilder
 from crimes.serializers import CrimeListSerializer
 import joblib
 import os
@@ -34,6 +36,11 @@ class HotspotZoneViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['crime_types', 'district', 'neighborhood']
+
+    def get_queryset(self):
+        """Render boundaries as GeoJSON in the database instead of loading GEOS polygons."""
+        queryset = super().get_queryset().defer('boundary').select_related('district', 'neighborhood')
+        return with_geojson(queryset.prefetch_related('crime_types'), 'boundary')
     
     @action(detail=False, methods=['get'])
     def current(self, request):
@@ -89,7 +96,7 @@ class CrimePredictionViewSet(viewsets.ReadOnlyModelViewSet):
             if location:
                 # Adjust the distance as needed (currently set to ~5km)
                 predictions_qs = predictions_qs.filter(
-                    location__distance_lte=(location, D(km=5))
+                    location__dwithin=(location, D(km=5))
                 )
             
             # Serialize the data
@@ -141,19 +148,11 @@ class CrimeDataViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         """Apply filters for analytics-specific queries."""
-        queryset = super().get_queryset()
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
-        crime_types = self.request.query_params.getlist('crime_types')
-
-        if start_date:
-            queryset = queryset.filter(date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(date__lte=end_date)
-        if crime_types:
-            queryset = queryset.filter(category__name__in=crime_types)
-
-        return queryset
+        params = self.request.query_params
+        builder = CrimeQueryBuilder(super().get_queryset())
+        builder.date_range(params.get('start_date'), params.get('end_date'))
+        builder.crime_types(params.getlist('crime_types'))
+        return builder.build()
 
 @api_view(['POST'])
 def predict_crime(request):
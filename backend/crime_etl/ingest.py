@@ -0,0 +1,271 @@
+"""
+Bulk crime ingestion for agency uploads.
+
+Uploaded records arrive as pandas DataFrames. :class:`CrimeIngestor`
+coerces and validates whole columns at once, resolves category names
+through one lookup map, builds geohashes and points per chunk and
+inserts crimes with ``bulk_create``. Rows failing validation are
+reported with their row number and per-field messages, like the
+serializer errors they replace.
+"""
+import logging
+from django.contrib.gis.geos import Point
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+import numpy as np
+import pandas as pd
+from crimes.cache import bump_versions_on_commit
+from crimes.geohash import encode_many
+from crimes.models import Crime, CrimeCategory
+from crimes.reference import categories
+from crimes.rollups import add_crimes
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 5000
+# Errors kept for the response and ImportJob.error_details; the counts stay exact.
+MAX_REPORTED_ERRORS = 1000
+
+# Category severity from which Crime.save() marks a crime violent.
+VIOLENT_SEVERITY = 7
+
+STATUSES = {value for value, _ in Crime.STATUS_CHOICES}
+TRUE_VALUES = {'true', 't', 'yes', 'y', 'on', '1', '1.0'}
+FALSE_VALUES = {'false', 'f', 'no', 'n', 'off', '0', '0.0'}
+
+REQUIRED = 'This field is required.'
+
+
+def _column(frame, name):
+    """Return a column, or an all-missing one if the upload lacks it."""
+    if name in frame:
+        return frame[name]
+    return pd.Series(np.nan, index=frame.index, dtype=object)
+
+
+def _text(series):
+    """Strip values to strings, with missing and blank values as NA."""
+    text = series.astype('string').str.strip()
+    return text.mask(text == '')
+
+
+def _boolean(series):
+    """Return ``(values, invalid mask)``; missing values are False."""
+    missing = series.isna()
+    values = series.astype('string').str.strip().str.lower()
+    parsed = values.map(lambda value: True if value in TRUE_VALUES else False if value in FALSE_VALUES else None)
+    invalid = ~missing & parsed.isna()
+    return parsed.where(parsed.notna(), False).astype(bool), invalid
+
+
+class CrimeIngestor:
+    """
+    Validate and insert one agency's uploaded crimes, chunk by chunk.
+
+    Call :meth:`ingest` for each DataFrame of records; ``created``,
+    ``failed`` and ``errors`` accumulate across calls. Each chunk commits
+    on its own and invalidates the agency's cached analytics.
+    """
+
+    def __init__(self, agency, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.agency = agency
+        self.chunk_size = chunk_size
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self._categories = {}
+
+    @property
+    def processed(self):
+        return self.created + self.failed
+
+    def ingest(self, frame, first_row=1):
+        """
+        Insert the valid rows of ``frame``, numbering its rows from ``first_row``.
+
+        With ``first_row=None`` the frame's index already holds the row numbers.
+        """
+        if first_row is not None:
+            frame = frame.reset_index(drop=True)
+            frame.index = frame.index + first_row
+        for start in range(0, len(frame), self.chunk_size):
+            self._ingest_chunk(frame.iloc[start:start + self.chunk_size])
+
+    # Validation
+
+    def category_ids(self, names):
+        """Map category names to ids through the reference cache, creating unknown categories once."""
+        for name in names:
+            if name in self._categories:
+                continue
+            category = categories.get_by('name', name)
+            if category is None:
+                category, _ = CrimeCategory.objects.get_or_create(name=name)
+            self._categories[name] = (category.id, category.severity_level)
+        return self._categories
+
+    def prepare(self, frame):
+        """
+        Coerce a chunk's columns and validate them.
+
+        Returns ``(columns, problems)``: a DataFrame of model-ready columns
+        and a ``{field: [(mask, message), ...]}`` dict of the failed checks.
+        """
+        problems = {}
+
+        def check(field, mask, message):
+            mask = mask.fillna(False).astype(bool)
+            if mask.any():
+                problems.setdefault(field, []).append((mask, message))
+
+        case_number = _text(_column(frame, 'case_number'))
+        check('case_number', case_number.isna(), REQUIRED)
+        check('case_number', case_number.str.len() > 50, 'Ensure this field has no more than 50 characters.')
+        check('case_number', case_number.notna() & case_number.duplicated(), 'Duplicate case number in this upload.')
+        existing = set(Crime.objects.filter(
+            case_number__in=case_number.dropna().unique().tolist()
+        ).values_list('case_number', flat=True))
+        check('case_number', case_number.isin(existing), 'crime with this case number already exists.')
+
+        category = _text(_column(frame, 'category')).fillna(_text(_column(frame, 'crime_type'))).fillna('Unknown')
+        check('category', category.str.len() > 100, 'Ensure this field has no more than 100 characters.')
+
+        description = _text(_column(frame, 'description'))
+        check('description', description.isna(), REQUIRED)
+
+        block_address = _text(_column(frame, 'block_address'))
+        check('block_address', block_address.isna(), REQUIRED)
+        check('block_address', block_address.str.len() > 255, 'Ensure this field has no more than 255 characters.')
+
+        if 'date' in frame:
+            date = pd.to_datetime(frame['date'], errors='coerce', format='mixed')
+            check('date', date.isna(), 'Date has wrong format. Use one of these formats instead: YYYY-MM-DD.')
+            date = date.dt.date
+        else:
+            date = pd.Series(timezone.now().date(), index=frame.index)
+
+        raw_time = _text(_column(frame, 'time'))
+        time = pd.to_datetime(raw_time, errors='coerce', format='mixed')
+        check('time', raw_time.notna() & time.isna(), 'Time has wrong format. Use one of these formats instead: hh:mm[:ss[.uuuuuu]].')
+        time = time.dt.time.astype(object).where(time.notna(), None)
+
+        coordinates = {}
+        for field, limit in (('latitude', 90), ('longitude', 180)):
+            value = pd.to_numeric(_column(frame, field), errors='coerce')
+            check(field, value.isna(), 'A valid number is required.')
+            check(field, value.abs() > limit, f'Ensure this value is between -{limit} and {limit}.')
+            coordinates[field] = value
+
+        status = _text(_column(frame, 'status')).fillna('reported')
+        check('status', ~status.isin(STATUSES), 'Not a valid choice.')
+
+        flags = {}
+        for field in ('is_violent', 'arrests_made'):
+            flags[field], invalid = _boolean(_column(frame, field))
+            check(field, invalid, 'Must be a valid boolean.')
+
+        raw_loss = _column(frame, 'property_loss')
+        property_loss = pd.to_numeric(raw_loss, errors='coerce').round(2)
+        check('property_loss', raw_loss.notna() & property_loss.isna(), 'A valid number is required.')
+        check('property_loss', property_loss.abs() >= 10 ** 8, 'Ensure that there are no more than 10 digits in total.')
+
+        columns = pd.DataFrame({
+            'case_number': case_number,
+            'category': category,
+            'description': description,
+            'block_address': block_address,
+            'date': date,
+            'time': time,
+            'latitude': coordinates['latitude'],
+            'longitude': coordinates['longitude'],
+            'status': status,
+            'is_violent': flags['is_violent'],
+            'arrests_made': flags['arrests_made'],
+            'property_loss': property_loss.astype(object).where(property_loss.notna(), None),
+        }, index=frame.index)
+        return columns, problems
+
+    def report(self, frame, problems):
+        """Record per-row errors for every row with a failed check; return the valid-row mask."""
+        invalid = pd.Series(False, index=frame.index)
+        for checks in problems.values():
+            for mask, _ in checks:
+                invalid |= mask
+
+        for row in invalid[invalid].index:
+            self.failed += 1
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                errors = {}
+                for field, checks in problems.items():
+                    messages = [message for mask, message in checks if mask[row]]
+                    if messages:
+                        errors[field] = messages
+                case_number = frame.at[row, 'case_number']
+                self.errors.append({
+                    'row': int(row),
+                    'case_number': None if pd.isna(case_number) else case_number,
+                    'errors': errors,
+                })
+        return ~invalid
+
+    # Insertion
+
+    def build(self, columns):
+        """Return unsaved Crime instances for validated rows, mirroring what Crime.save() derives."""
+        category_map = self.category_ids(columns['category'].unique())
+        severity = columns['category'].map(lambda name: category_map[name][1])
+        is_violent = columns['is_violent'] | (severity >= VIOLENT_SEVERITY)
+        geohashes = encode_many(columns['latitude'].to_numpy(), columns['longitude'].to_numpy())
+        now = timezone.now()
+        return [
+            Crime(
+                case_number=row.case_number,
+                category_id=category_map[row.category][0],
+                description=row.description,
+                date=row.date,
+                time=row.time,
+                status=row.status,
+                location=Point(row.longitude, row.latitude, srid=4326),
+                block_address=row.block_address,
+                agency_id=self.agency.id,
+                is_violent=violent,
+                property_loss=row.property_loss,
+                arrests_made=row.arrests_made,
+                geohash=geohash,
+                created_at=now,
+                updated_at=now,
+            )
+            for row, violent, geohash in zip(columns.itertuples(index=False), is_violent.tolist(), geohashes)
+        ]
+
+    def _ingest_chunk(self, frame):
+        columns, problems = self.prepare(frame)
+        valid = self.report(columns, problems)
+        columns = columns[valid]
+        if columns.empty:
+            return
+        crimes = self.build(columns)
+        rows = columns.index.tolist()
+        try:
+            with transaction.atomic():
+                Crime.objects.bulk_create(crimes, batch_size=self.chunk_size)
+                add_crimes(Crime.objects.filter(pk__in=[crime.pk for crime in crimes]))
+                bump_versions_on_commit(self.agency.id)
+            self.created += len(crimes)
+        except IntegrityError:
+            # A concurrent upload took some case numbers; retry row by row to report exactly which.
+            for row, crime in zip(rows, crimes):
+                self._insert_one(row, crime)
+
+    def _insert_one(self, row, crime):
+        crime.pk = None
+        try:
+            with transaction.atomic():
+                Crime.objects.bulk_create([crime])
+                add_crimes(Crime.objects.filter(pk=crime.pk))
+                bump_versions_on_commit(self.agency.id)
+            self.created += 1
+        except IntegrityError as e:
+            self.failed += 1
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                self.errors.append({'row': int(row), 'case_number': crime.case_number, 'errors': {'non_field_errors': [str(e)]}})
@@ -0,0 +1,226 @@
+"""
+Background execution of uploaded import files.
+
+``upload_data`` stores the upload with :func:`store_upload`, records how
+to load it in the ImportJob's ``parameters`` and calls :func:`enqueue`.
+:func:`run_upload` then loads the file on a Celery worker (or a local
+thread pool when ``IMPORT_JOB_EXECUTOR = 'local'``), writing progress
+counters to the job every few seconds and stopping between chunks once
+the job is canceled. Chunks loaded before a cancellation stay committed.
+With the ``parallel`` loader, :func:`run_upload` only splits the file into
+partitions: on Celery they run as a chord of subtasks whose callback,
+:func:`finish_partitioned_upload`, completes the job.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from agencies.models import Agency, DataImportLog
+from .ingest import CrimeIngestor
+from .models import ImportJob, ImportLog
+from .parallel import ParallelIngestor
+from .readers import read_chunks
+from .staging import StagingLoader
+
+logger = logging.getLogger(__name__)
+
+# Seconds between progress writes to the ImportJob row.
+PROGRESS_INTERVAL = 2
+UPLOAD_DIRECTORY = 'imports'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ImportCanceled(Exception):
+    """Raised between chunks once a running job has been canceled."""
+
+
+def store_upload(import_job, file):
+    """Save an uploaded file where workers can read it and record its path on the job."""
+    import_job.file_path = default_storage.save(f'{UPLOAD_DIRECTORY}/{import_job.pk}/{file.name}', file)
+    import_job.save(update_fields=['file_path'])
+
+
+def enqueue(import_job):
+    """Run an upload job in the background once the current transaction commits."""
+    transaction.on_commit(lambda: _submit(import_job.pk))
+
+
+def _runs_locally():
+    return getattr(settings, 'IMPORT_JOB_EXECUTOR', 'celery') == 'local'
+
+
+def _submit(job_id):
+    if _runs_locally():
+        _local_executor().submit(_run_local, job_id)
+    else:
+        from .tasks import process_import_job
+        process_import_job.delay(job_id)
+
+
+def _local_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'IMPORT_JOB_LOCAL_WORKERS', 2), thread_name_prefix='import-job'
+            )
+        return _executor
+
+
+def _run_local(job_id):
+    try:
+        run_upload(job_id)
+    except Exception:
+        logger.exception(f"Import job {job_id} crashed")
+    finally:
+        connection.close()
+
+
+class Progress:
+    """Writes an ingestor's counters to its job at intervals and notices cancellation."""
+
+    def __init__(self, import_job, interval=PROGRESS_INTERVAL):
+        self.import_job = import_job
+        self.interval = interval
+        self.last_write = time.monotonic()
+
+    def counters(self, ingestor):
+        return {
+            'records_processed': ingestor.processed,
+            'records_created': ingestor.created,
+            'records_failed': ingestor.failed,
+        }
+
+    def check(self, ingestor):
+        """Call between chunks: raises ImportCanceled if the job is no longer processing."""
+        jobs = ImportJob.objects.filter(pk=self.import_job.pk, status='processing')
+        if time.monotonic() - self.last_write >= self.interval:
+            running = jobs.update(**self.counters(ingestor))
+            self.last_write = time.monotonic()
+        else:
+            running = jobs.exists()
+        if not running:
+            raise ImportCanceled()
+
+
+def run_upload(job_id):
+    """Load a stored upload for its ImportJob, unless the job was canceled or already started."""
+    claimed = ImportJob.objects.filter(pk=job_id, status='pending').update(
+        status='processing', started_at=timezone.now()
+    )
+    if not claimed:
+        logger.info(f"Import job {job_id} is no longer pending; skipping")
+        return
+
+    import_job = ImportJob.objects.get(pk=job_id)
+    parameters = import_job.parameters or {}
+    agency = Agency.objects.get(pk=parameters['agency_id'])
+    import_log = DataImportLog.objects.filter(pk=parameters.get('data_import_log_id')).first()
+    progress = Progress(import_job)
+    ingestor = None
+    try:
+        with default_storage.open(import_job.file_path, 'rb') as file:
+            if parameters.get('loader') == 'copy':
+                # COPY into a staging table, then insert the valid rows in one statement
+                ingestor = StagingLoader(agency, import_job)
+                ingestor.load(file)
+            elif parameters.get('loader') == 'parallel':
+                # Partition rows by case number and load the partitions concurrently
+                ingestor = ParallelIngestor(agency, parameters.get('workers'))
+                paths = ingestor.split(file, parameters['format'], import_job)
+                if paths and not _runs_locally():
+                    # The partitions run as Celery subtasks; finish_partitioned_upload completes the job.
+                    _dispatch_partitions(job_id, paths, ingestor.chunk_size)
+                    return
+                ingestor.run_locally(job_id, paths)
+                if ingestor.canceled:
+                    raise ImportCanceled()
+            else:
+                # Stream the file in chunks, validating and inserting each in bulk
+                ingestor = CrimeIngestor(agency)
+                for chunk in read_chunks(file, parameters['format']):
+                    progress.check(ingestor)
+                    ingestor.ingest(chunk, first_row=ingestor.processed + 1)
+    except ImportCanceled:
+        logger.info(f"Import job {job_id} canceled after {ingestor.processed} records")
+        _finish(import_job, import_log, ingestor, 'canceled', 'Import canceled')
+    except Exception as e:
+        logger.exception(f"Import job {job_id} failed")
+        _finish(import_job, import_log, ingestor, 'failed', str(e))
+    else:
+        _complete(import_job, import_log, agency, ingestor)
+    finally:
+        default_storage.delete(import_job.file_path)
+
+
+def _dispatch_partitions(job_id, paths, chunk_size):
+    from celery import chord
+    from .tasks import finish_partitioned_import, process_import_partition
+    chord(
+        [process_import_partition.s(job_id, path, chunk_size) for path in paths]
+    )(finish_partitioned_import.s(job_id))
+
+
+def finish_partitioned_upload(job_id, results):
+    """Aggregate the partition results of a ``parallel`` upload and finish its job."""
+    import_job = ImportJob.objects.get(pk=job_id)
+    parameters = import_job.parameters or {}
+    agency = Agency.objects.get(pk=parameters['agency_id'])
+    import_log = DataImportLog.objects.filter(pk=parameters.get('data_import_log_id')).first()
+    ingestor = ParallelIngestor(agency, len(results))
+    try:
+        ingestor.gather(results)
+    except Exception as e:
+        logger.error(f"Import job {job_id} failed: {e}")
+        _finish(import_job, import_log, ingestor, 'failed', str(e))
+    else:
+        if ingestor.canceled:
+            logger.info(f"Import job {job_id} canceled after {ingestor.processed} records")
+            _finish(import_job, import_log, ingestor, 'canceled', 'Import canceled')
+        else:
+            _complete(import_job, import_log, agency, ingestor)
+
+
+def _complete(import_job, import_log, agency, ingestor):
+    _finish(import_job, import_log, ingestor, 'completed')
+    # An update rather than save(): saving an Agency invalidates the agencies reference table in every worker.
+    Agency.objects.filter(pk=agency.pk).update(last_data_upload=timezone.now())
+
+
+def _finish(import_job, import_log, ingestor, status, error_message=None):
+    """Write the final counters and status; a job canceled meanwhile stays canceled."""
+    now = timezone.now()
+    created = ingestor.created if ingestor else 0
+    failed = ingestor.failed if ingestor else 0
+    errors = ingestor.errors if ingestor else []
+    jobs = ImportJob.objects.filter(pk=import_job.pk)
+    jobs.update(
+        records_processed=created + failed,
+        records_created=created,
+        records_failed=failed,
+        error_details=errors,
+        completed_at=now,
+    )
+    if jobs.filter(status='processing').update(status=status, error_message=error_message):
+        final_status = status
+    else:
+        final_status, error_message = 'canceled', 'Import canceled'
+
+    ImportLog.objects.create(
+        import_job=import_job,
+        status=final_status,
+        message=f'Imported {created} crime records ({failed} rejected)',
+        errors=errors
+    )
+    if import_log:
+        import_log.status = 'completed' if final_status == 'completed' else 'failed'
+        import_log.record_count = created
+        import_log.error_message = error_message
+        import_log.completed_at = now
+        import_log.save()
@@ -1,15 +1,36 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from django.contrib.gis.geos import Point
+from django.db import connection, transaction
 from django.utils import timezone
 from crime_etl.models import DataSource, ImportJob, ImportLog
+from crimes.cache import bump_versions_on_commit
+from crimes.geohash import spatial_key
 from crimes.models import District, CrimeStatistic, CrimeCategory, Crime, Agency
-from datetime import datetime
+from crimes.reference import invalidate
+from crimes.rollups import add_crimes
+from datetime import date, time
 import random
 import uuid
 
 User = get_user_model()
 
+BATCH_SIZE = 1000
+MAX_CASE_NUMBER_ATTEMPTS = 10
+
+# Yearly district summaries (status NULL); the conflict target matches crimes_statistic_rollup_key.
+STATISTIC_UPSERT_SQL = f"""
+INSERT INTO {CrimeStatistic._meta.db_table}
+    (date, district_id, agency_id, count, violent_count, property_count, property_damage, arrests,
+     created_at, updated_at)
+VALUES {{values}}
+ON CONFLICT (date, COALESCE(category_id, 0), COALESCE(district_id, 0), COALESCE(neighborhood_id, 0),
+             agency_id, COALESCE(status, ''))
+DO UPDATE SET count = EXCLUDED.count, violent_count = EXCLUDED.violent_count,
+    property_damage = EXCLUDED.property_damage, arrests = EXCLUDED.arrests, updated_at = EXCLUDED.updated_at
+RETURNING xmax = 0
+"""
+
 class Command(BaseCommand):
     help = 'Run an import job for crime statistics and county data'
 
@@ -134,207 +155,12 @@ class Command(BaseCommand):
                 },
             ]
 
-            # Import counties into District
-            district_records_processed = 0
-            district_records_created = 0
-            district_records_updated = 0
-            district_records_failed = 0
-            district_errors = []
-
-            for county in counties:
-                district_records_processed += 1
-                source_data = county
-                transformed_data = county.copy()
-                lat, lon = county['latitude'], county['longitude']
-                if not (-90 <= lat <= 90 and -180 <= lon <= 180):
-                    raise ValueError(f"Invalid coordinates: lat={lat}, lon={lon}")
-                location = Point(x=lon, y=lat, srid=4326)
-                transformed_data['location'] = str(location)
-
-                try:
-                    district, created = District.objects.update_or_create(
-                        code=county['code'],
-                        defaults={
-                            'name': county['name'],
-                            'location': location,
-                            'agency': agency
-                        }
-                    )
-                    if created:
-                        district_records_created += 1
-                    else:
-                        district_records_updated += 1
-
-                    ImportLog.objects.create(
-                        import_job=import_job,
-                        crime=None,
-                        external_id=f"district_{county['code']}",
-                        source_data=source_data,
-                        transformed_data=transformed_data,
-                        status='success',
-                        message='District imported successfully'
-                    )
-                except Exception as e:
-                    district_records_failed += 1
-                    district_errors.append(str(e))
-                    ImportLog.objects.create(
-                        import_job=import_job,
-                        crime=None,
-                        external_id=f"district_{county['code']}",
-                        source_data=source_data,
-                        transformed_data=transformed_data,
-                        status='failed',
-                        message='Failed to import district',
-                        errors=[str(e)]
-                    )
-
-            # Import crime statistics into CrimeStatistic
-            stats_records_processed = 0
-            stats_records_created = 0
-            stats_records_updated = 0
-            stats_records_failed = 0
-            stats_errors = []
-
-            districts = District.objects.all()
-            for stat in crime_stats:
-                year = stat['year']
-                total_count = stat['count']
-                violent_count = stat['violent_count']
-                districts_per_year = len(districts)
-                avg_count_per_district = total_count // districts_per_year
-                avg_violent_per_district = violent_count // districts_per_year
-
-                for district in districts:
-                    stats_records_processed += 1
-                    source_data = stat.copy()
-                    transformed_data = stat.copy()
-                    transformed_data['avg_count_per_district'] = avg_count_per_district
-                    transformed_data['avg_violent_per_district'] = avg_violent_per_district
-
-                    try:
-                        crime_stat, created = CrimeStatistic.objects.update_or_create(
-                            date=datetime(year, 1, 1),
-                            district=district,
-                            agency=agency,
-                            defaults={
-                                'count': avg_count_per_district,
-                                'violent_count': avg_violent_per_district,
-                                'property_damage': 0,
-                                'arrests': 0
-                            }
-                        )
-                        if created:
-                            stats_records_created += 1
-                        else:
-                            stats_records_updated += 1
-
-                        ImportLog.objects.create(
-                            import_job=import_job,
-                            crime=None,
-                            external_id=f"crime_stat_{year}_{district.code}",
-                            source_data=source_data,
-                            transformed_data=transformed_data,
-                            status='success',
-                            message='Crime statistic imported successfully'
-                        )
-                    except Exception as e:
-                        stats_records_failed += 1
-                        stats_errors.append(str(e))
-                        ImportLog.objects.create(
-                            import_job=import_job,
-                            crime=None,
-                            external_id=f"crime_stat_{year}_{district.code}",
-                            source_data=source_data,
-                            transformed_data=transformed_data,
-                            status='failed',
-                            message='Failed to import crime statistic',
-                            errors=[str(e)]
-                        )
-
-            # Generate sample crime incidents based on statistics
-            crime_records_processed = 0
-            crime_records_created = 0
-            crime_records_failed = 0
-            crime_errors = []
-            categories = CrimeCategory.objects.all()
-
-            for stat in crime_stats:
-                year = stat['year']
-                for district in districts:
-                    for crime_index in range(random.randint(10, 20)):
-                        crime_records_processed += 1
-                        category = random.choice(categories)
-                        # Generate a unique case_number using district code and index
-                        base_case_number = f"CR-{year}-{district.code}-{crime_index:04d}"
-                        case_number = base_case_number
-                        attempt = 0
-                        max_attempts = 10
-
-                        while attempt < max_attempts:
-                            try:
-                                # Check if case_number already exists
-                                if not Crime.objects.filter(case_number=case_number).exists():
-                                    break
-                                # If it exists, append a UUID fragment to ensure uniqueness
-                                case_number = f"{base_case_number}-{uuid.uuid4().hex[:8]}"
-                                attempt += 1
-                            except Exception as e:
-                                break
-
-                        if attempt == max_attempts:
-                            crime_records_failed += 1
-                            crime_errors.append(f"Could not generate unique case_number for {base_case_number}")
-                            continue
-
-                        source_data = {
-                            'case_number': case_number,
-                            'category': category.name,
-                            'year': year,
-                            'district': district.name
-                        }
-                        transformed_data = source_data.copy()
-                        transformed_data['location'] = str(district.location)
-
-                        try:
-                            crime = Crime.objects.create(
-                                case_number=case_number,
-                                category=category,
-                                description=f"Incident of {category.name} in {district.name}",
-                                date=datetime(year, random.randint(1, 12), random.randint(1, 28)),
-                                time=datetime(year, 1, 1, random.randint(0, 23), random.randint(0, 59)).time(),
-                                status='reported',
-                                location=district.location,
-                                block_address=f"{district.name} Block {random.randint(1, 100)}",
-                                district=district,
-                                agency=agency,
-                                is_violent=category.severity_level >= 7,
-                                property_loss=random.uniform(0, 5000) if category.severity_level < 7 else None,
-                                data_source='National Police Records'
-                            )
-                            crime_records_created += 1
-
-                            ImportLog.objects.create(
-                                import_job=import_job,
-                                crime=crime,
-                                external_id=f"crime_{case_number}",
-                                source_data=source_data,
-                                transformed_data=transformed_data,
-                                status='success',
-                                message='Crime imported successfully'
-                            )
-                        except Exception as e:
-                            crime_records_failed += 1
-                            crime_errors.append(str(e))
-                            ImportLog.objects.create(
-                                import_job=import_job,
-                                crime=None,
-                                external_id=f"crime_{case_number}",
-                                source_data=source_data,
-                                transformed_data=transformed_data,
-                                status='failed',
-                                message='Failed to import crime',
-                                errors=[str(e)]
-                            )
+            (district_records_processed, district_records_created, district_records_updated,
+             district_records_failed, district_errors) = self.import_districts(import_job, agency, counties)
+            (stats_records_processed, stats_records_created, stats_records_updated,
+             stats_records_failed, stats_errors) = self.import_statistics(import_job, agency, crime_stats)
+            (crime_records_processed, crime_records_created, _,
+             crime_records_failed, crime_errors) = self.import_crimes(import_job, agency, crime_stats)
 
             # Update import job stats
             import_job.records_processed = (district_records_processed +
@@ -364,4 +190,146 @@ class Command(BaseCommand):
             import_job.error_message = str(e)
             import_job.completed_at = timezone.now()
             import_job.save()
-            self.stderr.write(self.style.ERROR(f"Import job failed: {str(e)}"))
\ No newline at end of file
+            self.stderr.write(self.style.ERROR(f"Import job failed: {str(e)}"))
+
+    def import_districts(self, import_job, agency, counties):
+        """Upsert the counties as districts by code in one transaction, logging each one."""
+        districts, logs = [], []
+        for county in counties:
+            lat, lon = county['latitude'], county['longitude']
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValueError(f"Invalid coordinates: lat={lat}, lon={lon}")
+            location = Point(x=lon, y=lat, srid=4326)
+            districts.append(District(code=county['code'], name=county['name'], location=location, agency=agency))
+            logs.append(ImportLog(
+                import_job=import_job,
+                crime=None,
+                external_id=f"district_{county['code']}",
+                source_data=county,
+                transformed_data={**county, 'location': str(location)},
+                status='success',
+                message='District imported successfully'
+            ))
+
+        with transaction.atomic():
+            existing = set(District.objects.filter(
+                code__in=[county['code'] for county in counties]
+            ).values_list('code', flat=True))
+            District.objects.bulk_create(
+                districts, batch_size=BATCH_SIZE, update_conflicts=True, unique_fields=['code'],
+                update_fields=['name', 'location', 'agency', 'updated_at']
+            )
+            ImportLog.objects.bulk_create(logs, batch_size=BATCH_SIZE)
+            # bulk_create skips the post_save signal that refreshes the cached district table
+            transaction.on_commit(lambda: invalidate('crimes.District'))
+        return len(districts), len(districts) - len(existing), len(existing), 0, []
+
+    def import_statistics(self, import_job, agency, crime_stats):
+        """Upsert each year's per-district averages as summary statistics in one transaction."""
+        districts = list(District.objects.all())
+        rows, logs = [], []
+        for stat in crime_stats:
+            year = stat['year']
+            avg_count_per_district = stat['count'] // len(districts)
+            avg_violent_per_district = stat['violent_count'] // len(districts)
+            transformed_data = {
+                **stat,
+                'avg_count_per_district': avg_count_per_district,
+                'avg_violent_per_district': avg_violent_per_district,
+            }
+            for district in districts:
+                rows.append((date(year, 1, 1), district.id, agency.id, avg_count_per_district, avg_violent_per_district))
+                logs.append(ImportLog(
+                    import_job=import_job,
+                    crime=None,
+                    external_id=f"crime_stat_{year}_{district.code}",
+                    source_data=stat,
+                    transformed_data=transformed_data,
+                    status='success',
+                    message='Crime statistic imported successfully'
+                ))
+
+        created = 0
+        now = timezone.now()
+        with transaction.atomic(), connection.cursor() as cursor:
+            for start in range(0, len(rows), BATCH_SIZE):
+                batch = rows[start:start + BATCH_SIZE]
+                values = ', '.join(['(%s, %s, %s, %s, %s, 0, 0, 0, 0, %s, %s)'] * len(batch))
+                cursor.execute(
+                    STATISTIC_UPSERT_SQL.format(values=values),
+                    [value for row in batch for value in (*row, now, now)]
+                )
+                created += sum(1 for inserted, in cursor.fetchall() if inserted)
+            ImportLog.objects.bulk_create(logs, batch_size=BATCH_SIZE)
+        return len(rows), created, len(rows) - created, 0, []
+
+    def import_crimes(self, import_job, agency, crime_stats):
+        """Generate sample crime incidents based on the statistics and insert them in one transaction."""
+        districts = list(District.objects.all())
+        categories = list(CrimeCategory.objects.all())
+        # Every case number a generated one could collide with, fetched once
+        taken = set(Crime.objects.filter(case_number__startswith='CR-').values_list('case_number', flat=True))
+
+        crimes, sources, errors = [], [], []
+        processed = failed = 0
+        for stat in crime_stats:
+            year = stat['year']
+            for district in districts:
+                for crime_index in range(random.randint(10, 20)):
+                    processed += 1
+                    category = random.choice(categories)
+                    base_case_number = f"CR-{year}-{district.code}-{crime_index:04d}"
+                    case_number = base_case_number
+                    for _ in range(MAX_CASE_NUMBER_ATTEMPTS):
+                        if case_number not in taken:
+                            break
+                        # Append a UUID fragment to ensure uniqueness
+                        case_number = f"{base_case_number}-{uuid.uuid4().hex[:8]}"
+                    else:
+                        failed += 1
+                        errors.append(f"Could not generate unique case_number for {base_case_number}")
+                        continue
+                    taken.add(case_number)
+
+                    source_data = {
+                        'case_number': case_number,
+                        'category': category.name,
+                        'year': year,
+                        'district': district.name
+                    }
+                    sources.append((source_data, {**source_data, 'location': str(district.location)}))
+                    crimes.append(Crime(
+                        case_number=case_number,
+                        category=category,
+                        description=f"Incident of {category.name} in {district.name}",
+                        date=date(year, random.randint(1, 12), random.randint(1, 28)),
+                        time=time(random.randint(0, 23), random.randint(0, 59)),
+                        status='reported',
+                        location=district.location,
+                        block_address=f"{district.name} Block {random.randint(1, 100)}",
+                        district=district,
+                        agency=agency,
+                        is_violent=category.severity_level >= 7,
+                        property_loss=random.uniform(0, 5000) if category.severity_level < 7 else None,
+                        data_source='National Police Records',
+                        geohash=spatial_key(district.location)
+                    ))
+
+        with transaction.atomic():
+            Crime.objects.bulk_create(crimes, batch_size=BATCH_SIZE)
+            ImportLog.objects.bulk_create([
+                ImportLog(
+                    import_job=import_job,
+                    crime=crime,
+                    external_id=f"crime_{crime.case_number}",
+                    source_data=source_data,
+                    transformed_data=transformed_data,
+                    status='success',
+                    message='Crime imported successfully'
+                )
+                for crime, (source_data, transformed_data) in zip(crimes, sources)
+            ], batch_size=BATCH_SIZE)
+            # bulk_create skips Crime.save() and its signals, so update rollups and caches here
+            add_crimes(Crime.objects.filter(pk__in=[crime.pk for crime in crimes]))
+            bump_versions_on_commit(agency.id)
+        return processed, len(crimes), 0, failed, errors
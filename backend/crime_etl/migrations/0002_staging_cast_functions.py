@@ -0,0 +1,55 @@
+# Generated by Django 5.1.7 on 2026-10-16 13:00
+
+from django.db import migrations
+
+CAST_FUNCTIONS_SQL = """
+CREATE OR REPLACE FUNCTION crime_etl_to_date(value text) RETURNS date AS $$
+BEGIN
+    RETURN value::date;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+CREATE OR REPLACE FUNCTION crime_etl_to_time(value text) RETURNS time AS $$
+BEGIN
+    RETURN value::time;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+CREATE OR REPLACE FUNCTION crime_etl_to_float(value text) RETURNS double precision AS $$
+BEGIN
+    RETURN value::double precision;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION crime_etl_to_numeric(value text) RETURNS numeric AS $$
+BEGIN
+    RETURN value::numeric;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+"""
+
+DROP_CAST_FUNCTIONS_SQL = """
+DROP FUNCTION IF EXISTS crime_etl_to_date(text);
+DROP FUNCTION IF EXISTS crime_etl_to_time(text);
+DROP FUNCTION IF EXISTS crime_etl_to_float(text);
+DROP FUNCTION IF EXISTS crime_etl_to_numeric(text);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crime_etl', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CAST_FUNCTIONS_SQL, DROP_CAST_FUNCTIONS_SQL),
+    ]
@@ -0,0 +1,201 @@
+"""
+Parallel partitioned ingestion of large upload files.
+
+:meth:`ParallelIngestor.split` streams the file with
+:func:`~crime_etl.readers.read_chunks`, numbers its rows and routes each
+row to one of ``workers`` partitions by a hash of its case number. Every
+partition is stored next to the upload as a sequence of pickled
+DataFrames and loaded by :func:`ingest_partition` with its own
+:class:`~crime_etl.ingest.CrimeIngestor`, in file order: as Celery
+subtasks, or in a pool of spawned processes with the local executor (a
+Celery prefork worker may not start child processes, and forking a
+multithreaded process can deadlock). Rows sharing a case number
+therefore always meet in the same partition, so the first one in the file
+wins exactly as in a serial load, whatever the timing between workers.
+Partitions add their counters to the ImportJob as they go and stop once
+it is canceled; :meth:`ParallelIngestor.gather` aggregates their results.
+"""
+import logging
+import multiprocessing
+import os
+import pickle
+import posixpath
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection, connections
+from django.db.models import F
+import pandas as pd
+from agencies.models import Agency
+from .ingest import DEFAULT_CHUNK_SIZE, MAX_REPORTED_ERRORS, CrimeIngestor, _column
+from .models import ImportJob
+from .readers import read_chunks
+
+logger = logging.getLogger(__name__)
+
+
+def max_partitions():
+    return max(1, getattr(settings, 'IMPORT_MAX_PARTITIONS', os.cpu_count() or 1))
+
+
+def default_workers():
+    return min(os.cpu_count() or 1, max_partitions())
+
+
+def _stored_frames(file):
+    """Yield the DataFrames pickled one after another into a partition file."""
+    while True:
+        try:
+            yield pickle.load(file)
+        except EOFError:
+            return
+
+
+def ingest_partition(job_id, path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Load one stored partition for its ImportJob, in file order, then delete it.
+
+    Returns a JSON-serializable ``{'created', 'failed', 'errors', 'canceled',
+    'error'}`` dict; failures are reported there rather than raised, so the
+    other partitions' results are still aggregated.
+    """
+    ingestor = None
+    canceled = False
+    try:
+        import_job = ImportJob.objects.get(pk=job_id)
+        ingestor = CrimeIngestor(Agency.objects.get(pk=import_job.parameters['agency_id']), chunk_size)
+        with default_storage.open(path, 'rb') as file:
+            for frame in _stored_frames(file):
+                created, failed = ingestor.created, ingestor.failed
+                ingestor.ingest(frame, first_row=None)
+                running = ImportJob.objects.filter(pk=job_id, status='processing').update(
+                    records_processed=F('records_processed') + ingestor.processed - created - failed,
+                    records_created=F('records_created') + ingestor.created - created,
+                    records_failed=F('records_failed') + ingestor.failed - failed,
+                )
+                if not running:
+                    canceled = True
+                    break
+        error = None
+    except Exception as e:
+        logger.exception(f"Partition {path} of import job {job_id} failed")
+        error = str(e)
+    finally:
+        default_storage.delete(path)
+    return {
+        'created': ingestor.created if ingestor else 0,
+        'failed': ingestor.failed if ingestor else 0,
+        'errors': ingestor.errors if ingestor else [],
+        'canceled': canceled,
+        'error': error,
+    }
+
+
+def _ingest_partition_locally(database_names, job_id, path, chunk_size):
+    """Run :func:`ingest_partition` in a spawned process, on the same databases as its parent (e.g. test databases)."""
+    for alias, name in database_names.items():
+        connections[alias].settings_dict['NAME'] = name
+    try:
+        return ingest_partition(job_id, path, chunk_size)
+    finally:
+        connection.close()
+
+
+class ParallelIngestor:
+    """
+    Validate and insert one agency's upload file across partition workers.
+
+    After :meth:`gather`, ``created``, ``failed`` and ``errors`` hold the
+    same results as a serial :class:`~crime_etl.ingest.CrimeIngestor` run,
+    with ``errors`` ordered by row.
+    """
+
+    def __init__(self, agency, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.agency = agency
+        self.workers = min(max(1, workers or default_workers()), max_partitions())
+        self.chunk_size = chunk_size
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.canceled = False
+
+    @property
+    def processed(self):
+        return self.created + self.failed
+
+    def partitions(self, frame):
+        """Return each row's partition: a stable hash of its stripped case number."""
+        case_number = _column(frame, 'case_number').astype('string').str.strip()
+        hashes = pd.util.hash_pandas_object(case_number, index=False)
+        return (hashes % self.workers).astype(int)
+
+    def split(self, file, file_format, import_job):
+        """
+        Store ``file`` in ``file_format`` as one partition file per worker next to the job's upload.
+
+        DataFrame indexes hold the rows' numbers in the file. Returns the
+        storage paths of the non-empty partitions.
+        """
+        outputs = [tempfile.TemporaryFile() for _ in range(self.workers)]
+        try:
+            buffers = [[] for _ in range(self.workers)]
+            sizes = [0] * self.workers
+            written = [False] * self.workers
+
+            def flush(partition):
+                pickle.dump(pd.concat(buffers[partition]), outputs[partition], pickle.HIGHEST_PROTOCOL)
+                buffers[partition], sizes[partition], written[partition] = [], 0, True
+
+            next_row = 1
+            for chunk in read_chunks(file, file_format, self.chunk_size):
+                chunk.index = pd.RangeIndex(next_row, next_row + len(chunk))
+                next_row += len(chunk)
+                for partition, rows in chunk.groupby(self.partitions(chunk), sort=False):
+                    buffers[partition].append(rows)
+                    sizes[partition] += len(rows)
+                    if sizes[partition] >= self.chunk_size:
+                        flush(partition)
+
+            paths = []
+            directory = posixpath.dirname(import_job.file_path)
+            for partition, output in enumerate(outputs):
+                if buffers[partition]:
+                    flush(partition)
+                if written[partition]:
+                    output.seek(0)
+                    paths.append(default_storage.save(f'{directory}/partition-{partition}.pkl', File(output)))
+            return paths
+        finally:
+            for output in outputs:
+                output.close()
+
+    def run_locally(self, job_id, paths):
+        """Load stored partitions in a pool of spawned processes and gather their results."""
+        results = []
+        if paths:
+            database_names = {alias: connections[alias].settings_dict['NAME'] for alias in connections}
+            # Workers unpickle this module's functions, so Django must be set up first.
+            with ProcessPoolExecutor(
+                max_workers=len(paths), mp_context=multiprocessing.get_context('spawn'), initializer=django.setup
+            ) as pool:
+                futures = [
+                    pool.submit(_ingest_partition_locally, database_names, job_id, path, self.chunk_size)
+                    for path in paths
+                ]
+                results = [future.result() for future in futures]
+        self.gather(results)
+
+    def gather(self, results):
+        """Aggregate :func:`ingest_partition` results; raise if one of the partitions failed."""
+        for result in results:
+            self.created += result['created']
+            self.failed += result['failed']
+            self.errors.extend(result['errors'])
+            self.canceled = self.canceled or result['canceled']
+        self.errors = sorted(self.errors, key=lambda error: error['row'])[:MAX_REPORTED_ERRORS]
+        failures = [result['error'] for result in results if result['error']]
+        if failures:
+            raise RuntimeError(f"Import worker failed: {'; '.join(failures)}")
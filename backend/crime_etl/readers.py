@@ -0,0 +1,190 @@
+"""
+Streaming readers for uploaded import files.
+
+Each reader yields DataFrames of at most ``chunk_size`` records, so an
+upload is never held in memory as a whole: CSV through pandas' chunked
+reader, XLSX through openpyxl's read-only mode, JSON arrays through an
+incremental decoder and NDJSON line by line. :class:`SpooledMultiPartParser`
+writes uploads to a temporary file instead of keeping small ones in memory.
+"""
+import io
+import json
+import logging
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from openpyxl import load_workbook
+import pandas as pd
+from rest_framework.parsers import MultiPartParser
+from .ingest import DEFAULT_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Characters read from a JSON upload at a time.
+JSON_BLOCK_SIZE = 64 * 1024
+
+
+class SpooledMultiPartParser(MultiPartParser):
+    """Multipart parser that spools every uploaded file to disk, whatever its size."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        request.upload_handlers = [TemporaryFileUploadHandler(request)]
+        return super().parse(stream, media_type, parser_context)
+
+
+def _decoded(file, parse):
+    """Decode a binary upload (skipping a BOM) and yield from ``parse(text)``, leaving the upload open."""
+    file.seek(0)
+    text = io.TextIOWrapper(getattr(file, 'file', file), encoding='utf-8-sig', newline='')
+    try:
+        yield from parse(text)
+    finally:
+        text.detach()
+
+
+def _frames(records, chunk_size, columns=None):
+    """Group an iterable of records (dicts, or rows of ``columns``) into DataFrames."""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield pd.DataFrame(chunk, columns=columns)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame(chunk, columns=columns)
+
+
+def _record(value):
+    if not isinstance(value, dict):
+        raise ValueError('Each JSON record must be an object')
+    return value
+
+
+def read_csv(file, chunk_size):
+    # Text columns keep case numbers such as '00123' intact and each chunk's types consistent.
+    file.seek(0)
+    yield from pd.read_csv(file, chunksize=chunk_size, dtype=str, encoding='utf-8-sig')
+
+
+def read_xlsx(file, chunk_size):
+    file.seek(0)
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name).strip() if name is not None else f'column_{index}' for index, name in enumerate(header)]
+        width = len(columns)
+        records = (
+            (tuple(row) + (None,) * width)[:width]
+            for row in rows if any(value is not None for value in row)
+        )
+        yield from _frames(records, chunk_size, columns)
+    finally:
+        workbook.close()
+
+
+def iter_json_array(text, block_size=JSON_BLOCK_SIZE):
+    """
+    Yield the elements of a JSON array (or a single top-level value) read incrementally from ``text``.
+
+    Raises ``ValueError`` on malformed input, including trailing commas and
+    anything but whitespace after the array.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+
+    def fill():
+        nonlocal buffer, position, eof
+        block = text.read(block_size)
+        eof = not block
+        buffer = buffer[position:] + block
+        position = 0
+
+    def skip(characters):
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in characters:
+                position += 1
+            if position < len(buffer) or eof:
+                return
+            fill()
+
+    def decode():
+        nonlocal position
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            # A value not followed by a delimiter, like the number "2." or "2.5e", may continue in the next block.
+            if not eof and (end == len(buffer) or buffer[end] not in ' \t\r\n,]'):
+                fill()
+                continue
+            position = end
+            return value
+
+    def finish(what):
+        skip(' \t\r\n')
+        if position < len(buffer):
+            raise ValueError(f'Unexpected data after {what}')
+
+    skip(' \t\r\n')
+    if position >= len(buffer):
+        return
+    if buffer[position] != '[':
+        yield decode()
+        finish('the JSON value')
+        return
+    position += 1
+    skip(' \t\r\n')
+    if position < len(buffer) and buffer[position] == ']':
+        position += 1
+        finish('the JSON array')
+        return
+    while True:
+        skip(' \t\r\n')
+        if position >= len(buffer):
+            raise ValueError('Unterminated JSON array')
+        if buffer[position] == ']':
+            raise ValueError('Trailing comma in JSON array')
+        yield decode()
+        skip(' \t\r\n')
+        if position >= len(buffer):
+            raise ValueError('Unterminated JSON array')
+        if buffer[position] == ']':
+            position += 1
+            finish('the JSON array')
+            return
+        if buffer[position] != ',':
+            raise ValueError('Expected , or ] in JSON array')
+        position += 1
+
+
+def read_json(file, chunk_size):
+    yield from _frames((_record(value) for value in _decoded(file, iter_json_array)), chunk_size)
+
+
+def read_ndjson(file, chunk_size):
+    lines = (line.strip() for line in _decoded(file, iter))
+    yield from _frames((_record(json.loads(line)) for line in lines if line), chunk_size)
+
+
+READERS = {
+    'csv': read_csv,
+    'xlsx': read_xlsx,
+    'json': read_json,
+    'ndjson': read_ndjson,
+    'jsonl': read_ndjson,
+}
+
+
+def read_chunks(file, file_format, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield DataFrames of up to ``chunk_size`` records from an uploaded file in ``file_format``."""
+    reader = READERS.get(file_format)
+    if reader is None:
+        raise ValueError(f"Unsupported file format '{file_format}'")
+    return reader(file, chunk_size)
@@ -0,0 +1,299 @@
+"""
+COPY-based staging loader for large agency CSV files.
+
+The CSV is streamed with ``COPY`` into an unlogged staging table of text
+columns. Rows with missing or extra fields are padded or truncated to the
+header's width on the way in and their original field count is kept, so
+they are rejected per row instead of aborting the COPY. Rows are parsed
+and validated there by one ``CREATE TABLE ... AS`` query, and loaded into
+``crimes_crime`` with a single ``INSERT ... SELECT``: categories are
+resolved by join (unknown names are created first), ``location`` is built
+with ``ST_MakePoint`` and ``is_violent`` follows the category severity as
+in ``Crime.save()``. Rejected rows go to the ``ImportLog`` table with the
+same per-field errors as :class:`~crime_etl.ingest.CrimeIngestor`. The
+staging tables are dropped afterwards.
+"""
+import csv
+import io
+import logging
+import tempfile
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from crimes.cache import bump_versions_on_commit
+from crimes.geohash import GEOHASH_PRECISION
+from crimes.models import Crime
+from crimes.reference import invalidate
+from crimes.rollups import add_crimes
+from .ingest import FALSE_VALUES, MAX_REPORTED_ERRORS, REQUIRED, STATUSES, TRUE_VALUES, VIOLENT_SEVERITY
+from .readers import _decoded
+
+logger = logging.getLogger(__name__)
+
+EXISTS_MESSAGE = 'crime with this case number already exists.'
+
+
+def _messages(*checks):
+    """SQL for a jsonb array of the messages whose conditions hold, or NULL if none do."""
+    cases = ', '.join(f"CASE WHEN {condition} THEN {message} END" for condition, message in checks)
+    return f"to_jsonb(NULLIF(array_remove(ARRAY[{cases}]::text[], NULL), '{{}}'::text[]))"
+
+
+def _literal(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _literals(values):
+    return ', '.join(_literal(value) for value in sorted(values))
+
+
+def _boolean(raw):
+    """SQL parsing a lower-cased text value like ``ingest._boolean``: NULL when invalid."""
+    return (
+        f"CASE WHEN {raw} IS NULL THEN false "
+        f"WHEN {raw} IN ({_literals(TRUE_VALUES)}) THEN true "
+        f"WHEN {raw} IN ({_literals(FALSE_VALUES)}) THEN false END"
+    )
+
+
+class StagingLoader:
+    """
+    Load one agency CSV upload through PostgreSQL ``COPY`` and set-based SQL.
+
+    After :meth:`load`, ``created``, ``failed`` and ``errors`` hold the
+    same results as a :class:`~crime_etl.ingest.CrimeIngestor` run.
+    """
+
+    def __init__(self, agency, import_job):
+        self.agency = agency
+        self.import_job = import_job
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        suffix = f'{import_job.pk}'
+        self.staging_table = f'crime_etl_staging_{suffix}'
+        self.parsed_table = f'crime_etl_parsed_{suffix}'
+        self.inserted_table = f'crime_etl_inserted_{suffix}'
+
+    @property
+    def processed(self):
+        return self.created + self.failed
+
+    def load(self, file):
+        """COPY ``file`` (a binary CSV file object with a header row) and load its valid rows."""
+        headers = self.read_headers(file)
+        try:
+            with connection.cursor() as cursor:
+                self.copy(cursor, file, headers)
+                self.parse(cursor, headers)
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    self.insert(cursor)
+                    self.reject(cursor, headers)
+                    self.collect(cursor)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DROP TABLE IF EXISTS {self.staging_table}, {self.parsed_table}, {self.inserted_table}'
+                )
+
+    def read_headers(self, file):
+        file.seek(0)
+        header = file.readline().decode('utf-8-sig')
+        file.seek(0)
+        headers = [name.strip() for name in next(csv.reader(io.StringIO(header)), [])]
+        if not headers:
+            raise ValueError('The CSV file has no header row')
+        return headers
+
+    def normalize(self, file, output, width):
+        """
+        Write the data rows of ``file`` to ``output`` as CSV rows of exactly ``width`` fields.
+
+        Each row is prefixed with its original field count; blank lines are
+        skipped as pandas does for the chunked loaders.
+        """
+        rows = _decoded(file, csv.reader)
+        next(rows, None)
+        writer = csv.writer(output)
+        for row in rows:
+            if row:
+                writer.writerow([len(row), *(row + [''] * width)[:width]])
+
+    def copy(self, cursor, file, headers):
+        """Stream the file into a staging table with one text column per CSV column, in file order."""
+        width = len(headers)
+        columns = ', '.join(f'f{index} text' for index in range(width))
+        cursor.execute(
+            f'CREATE UNLOGGED TABLE {self.staging_table} '
+            f'(row_number bigint GENERATED ALWAYS AS IDENTITY, field_count integer, {columns})'
+        )
+        column_list = ', '.join(f'f{index}' for index in range(width))
+        with tempfile.TemporaryFile('w+', encoding='utf-8', newline='') as normalized:
+            self.normalize(file, normalized, width)
+            normalized.seek(0)
+            cursor.copy_expert(
+                f"COPY {self.staging_table} (field_count, {column_list}) FROM STDIN WITH (FORMAT csv)",
+                normalized
+            )
+
+    def parse(self, cursor, headers):
+        """Build the typed, validated rows: one ``errors`` jsonb object per row, empty when valid."""
+        positions = {name: index for index, name in enumerate(headers)}
+
+        def raw(name):
+            if name not in positions:
+                return 'NULL::text'
+            return f"NULLIF(btrim(r.f{positions[name]}), '')"
+
+        statuses = _literals(STATUSES)
+        date = f"crime_etl_to_date({raw('date')})" if 'date' in positions else 'CURRENT_DATE'
+        errors = ', '.join([
+            "'non_field_errors'", _messages((
+                f't.field_count <> {len(headers)}',
+                f"'Expected {len(headers)} fields but found ' || t.field_count || '.'",
+            )),
+            "'case_number'", _messages(
+                ('t.case_number IS NULL', _literal(REQUIRED)),
+                ('length(t.case_number) > 50', _literal('Ensure this field has no more than 50 characters.')),
+                ('t.duplicate', _literal('Duplicate case number in this upload.')),
+                ('t.existing', _literal(EXISTS_MESSAGE)),
+            ),
+            "'category'", _messages(
+                ('length(t.category) > 100', _literal('Ensure this field has no more than 100 characters.')),
+            ),
+            "'description'", _messages(('t.description IS NULL', _literal(REQUIRED))),
+            "'block_address'", _messages(
+                ('t.block_address IS NULL', _literal(REQUIRED)),
+                ('length(t.block_address) > 255', _literal('Ensure this field has no more than 255 characters.')),
+            ),
+            "'date'", _messages(
+                ('t.date IS NULL', _literal('Date has wrong format. Use one of these formats instead: YYYY-MM-DD.')),
+            ),
+            "'time'", _messages((
+                't.time_raw IS NOT NULL AND t.time IS NULL',
+                _literal('Time has wrong format. Use one of these formats instead: hh:mm[:ss[.uuuuuu]].'),
+            )),
+            "'latitude'", _messages(
+                ('t.latitude IS NULL', _literal('A valid number is required.')),
+                ('abs(t.latitude) > 90', _literal('Ensure this value is between -90 and 90.')),
+            ),
+            "'longitude'", _messages(
+                ('t.longitude IS NULL', _literal('A valid number is required.')),
+                ('abs(t.longitude) > 180', _literal('Ensure this value is between -180 and 180.')),
+            ),
+            "'status'", _messages((f't.status NOT IN ({statuses})', _literal('Not a valid choice.'))),
+            "'is_violent'", _messages(('t.is_violent IS NULL', _literal('Must be a valid boolean.'))),
+            "'arrests_made'", _messages(('t.arrests_made IS NULL', _literal('Must be a valid boolean.'))),
+            "'property_loss'", _messages(
+                ('t.property_loss_raw IS NOT NULL AND t.property_loss IS NULL', _literal('A valid number is required.')),
+                ('abs(t.property_loss) >= 100000000', _literal('Ensure that there are no more than 10 digits in total.')),
+            ),
+        ])
+        cursor.execute(f"""
+            CREATE UNLOGGED TABLE {self.parsed_table} AS
+            SELECT t.*, jsonb_strip_nulls(jsonb_build_object({errors})) AS errors
+            FROM (
+                SELECT r.row_number,
+                       r.field_count,
+                       {raw('case_number')} AS case_number,
+                       COALESCE({raw('category')}, {raw('crime_type')}, 'Unknown') AS category,
+                       {raw('description')} AS description,
+                       {raw('block_address')} AS block_address,
+                       {date} AS date,
+                       {raw('time')} AS time_raw,
+                       crime_etl_to_time({raw('time')}) AS time,
+                       crime_etl_to_float({raw('latitude')}) AS latitude,
+                       crime_etl_to_float({raw('longitude')}) AS longitude,
+                       COALESCE({raw('status')}, 'reported') AS status,
+                       {_boolean(f"lower({raw('is_violent')})")} AS is_violent,
+                       {_boolean(f"lower({raw('arrests_made')})")} AS arrests_made,
+                       {raw('property_loss')} AS property_loss_raw,
+                       round(crime_etl_to_numeric({raw('property_loss')}), 2) AS property_loss,
+                       {raw('case_number')} IS NOT NULL AND row_number() OVER (
+                           PARTITION BY {raw('case_number')} ORDER BY r.row_number
+                       ) > 1 AS duplicate,
+                       EXISTS (
+                           SELECT 1 FROM {Crime._meta.db_table} c WHERE c.case_number = {raw('case_number')}
+                       ) AS existing
+                FROM {self.staging_table} r
+            ) t
+        """)
+
+    def insert(self, cursor):
+        """Create unknown categories, then insert every valid row in one statement."""
+        cursor.execute(f"""
+            INSERT INTO crimes_crimecategory (name, severity_level, created_at, updated_at)
+            SELECT DISTINCT p.category, 1, NOW(), NOW()
+            FROM {self.parsed_table} p
+            WHERE p.errors = '{{}}'::jsonb
+              AND NOT EXISTS (SELECT 1 FROM crimes_crimecategory c WHERE c.name = p.category)
+        """)
+        if cursor.rowcount:
+            transaction.on_commit(lambda: invalidate('crimes.CrimeCategory'))
+
+        cursor.execute(f'CREATE UNLOGGED TABLE {self.inserted_table} (id bigint PRIMARY KEY, case_number text)')
+        cursor.execute(f"""
+            WITH inserted AS (
+                INSERT INTO crimes_crime (
+                    case_number, category_id, description, date, time, status, location, block_address,
+                    agency_id, is_violent, property_loss, weapon_used, drug_related, domestic,
+                    arrests_made, gang_related, geohash, created_at, updated_at
+                )
+                SELECT p.case_number, c.id, p.description, p.date, p.time, p.status,
+                       ST_SetSRID(ST_MakePoint(p.longitude, p.latitude), 4326)::geography,
+                       p.block_address, %s, p.is_violent OR c.severity_level >= %s, p.property_loss,
+                       false, false, false, p.arrests_made, false,
+                       ST_GeoHash(ST_SetSRID(ST_MakePoint(p.longitude, p.latitude), 4326), %s), NOW(), NOW()
+                FROM {self.parsed_table} p
+                CROSS JOIN LATERAL (
+                    SELECT id, severity_level FROM crimes_crimecategory
+                    WHERE name = p.category ORDER BY id LIMIT 1
+                ) c
+                WHERE p.errors = '{{}}'::jsonb
+                ORDER BY p.row_number
+                ON CONFLICT (case_number) DO NOTHING
+                RETURNING id, case_number
+            )
+            INSERT INTO {self.inserted_table} (id, case_number) SELECT id, case_number FROM inserted
+        """, [self.agency.id, VIOLENT_SEVERITY, GEOHASH_PRECISION])
+        self.created = cursor.rowcount
+
+        add_crimes(Crime.objects.filter(pk__in=RawSQL(f'SELECT id FROM {self.inserted_table}', [])))
+        bump_versions_on_commit(self.agency.id)
+
+    def reject(self, cursor, headers):
+        """Divert rejected rows, including case numbers taken concurrently, to the ImportLog table."""
+        cursor.execute(f"""
+            UPDATE {self.parsed_table} p
+            SET errors = jsonb_build_object('case_number', jsonb_build_array(%s::text))
+            WHERE p.errors = '{{}}'::jsonb
+              AND NOT EXISTS (SELECT 1 FROM {self.inserted_table} i WHERE i.case_number = p.case_number)
+        """, [EXISTS_MESSAGE])
+
+        values = ', '.join(f'r.f{index}' for index in range(len(headers)))
+        cursor.execute(f"""
+            INSERT INTO crime_etl_importlog (
+                import_job_id, crime_id, external_id, source_data, transformed_data,
+                status, message, errors, created_at
+            )
+            SELECT %s, NULL, left(COALESCE(p.case_number, ''), 100),
+                   json_object(%s::text[], ARRAY[{values}]::text[])::jsonb, '{{}}'::jsonb,
+                   'failed', 'Row ' || p.row_number || ' rejected', p.errors, NOW()
+            FROM {self.parsed_table} p
+            JOIN {self.staging_table} r USING (row_number)
+            WHERE p.errors <> '{{}}'::jsonb
+        """, [self.import_job.pk, headers])
+        self.failed = cursor.rowcount
+
+    def collect(self, cursor):
+        """Read the first rejected rows back as ``{'row', 'case_number', 'errors'}`` dicts."""
+        cursor.execute(f"""
+            SELECT row_number, case_number, errors FROM {self.parsed_table}
+            WHERE errors <> '{{}}'::jsonb
+            ORDER BY row_number
+            LIMIT %s
+        """, [MAX_REPORTED_ERRORS])
+        self.errors = [
+            {'row': row, 'case_number': case_number, 'errors': errors}
+            for row, case_number, errors in cursor.fetchall()
+        ]
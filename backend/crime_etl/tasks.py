@@ -0,0 +1,24 @@
+"""
+Celery tasks for crime_etl app.
+"""
+from celery import shared_task
+from .jobs import finish_partitioned_upload, run_upload
+from .parallel import ingest_partition
+
+
+@shared_task(ignore_result=True)
+def process_import_job(job_id):
+    """Load an uploaded file for its ImportJob (see crime_etl.jobs)."""
+    run_upload(job_id)
+
+
+@shared_task
+def process_import_partition(job_id, path, chunk_size):
+    """Load one partition of a ``parallel`` upload; the results feed finish_partitioned_import."""
+    return ingest_partition(job_id, path, chunk_size)
+
+
+@shared_task(ignore_result=True)
+def finish_partitioned_import(results, job_id):
+    """Chord callback completing a ``parallel`` upload's ImportJob."""
+    finish_partitioned_upload(job_id, results)
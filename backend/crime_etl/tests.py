@@ -1,3 +1,278 @@
-from django.test import TestCase
+import io
+import json
+from datetime import date, time
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+import pandas as pd
+
+from agencies.models import Agency
+from crimes.models import Crime, CrimeCategory, CrimeStatistic
+from crime_analysis.celery import app
+from crimes.tests import clear_reference_tables
+from .ingest import REQUIRED, CrimeIngestor
+from .jobs import run_upload, store_upload
+from .models import DataSource, ImportJob, ImportLog
+from .parallel import ParallelIngestor
+from .readers import iter_json_array, read_chunks
+from .staging import StagingLoader
+
+
+def record(case_number, **fields):
+    return {
+        'case_number': case_number,
+        'category': 'Theft',
+        'description': 'Bicycle theft',
+        'block_address': 'Moi Avenue',
+        'date': '2024-01-01',
+        'latitude': '-1.28',
+        'longitude': '36.82',
+        **fields,
+    }
+
+
+class JsonReaderTests(SimpleTestCase):
+    """Incremental JSON decoding gives the same result whatever the block boundaries."""
+
+    BLOCK_SIZES = (1, 2, 3, 7, 64, 64 * 1024)
+
+    def read(self, text, block_size):
+        return list(iter_json_array(io.StringIO(text), block_size))
+
+    def test_valid_documents(self):
+        documents = [
+            '[{"case_number": "J-1", "note": "a, [b] \\"c\\""}, {"case_number": "J-2"}]',
+            '[1, -0.25E-2, 2.5e3, 123456789, true, null, "x"]',
+            '  [\n  {"nested": [1, {"a": []}]}\n]\n',
+            '[]',
+            ' [ ] ',
+        ]
+        for text in documents:
+            for block_size in self.BLOCK_SIZES:
+                self.assertEqual(self.read(text, block_size), json.loads(text), (text, block_size))
+
+    def test_single_top_level_value(self):
+        for block_size in self.BLOCK_SIZES:
+            self.assertEqual(self.read(' {"case_number": "J-1"} ', block_size), [{'case_number': 'J-1'}])
+            self.assertEqual(self.read('', block_size), [])
+
+    def test_malformed_documents(self):
+        documents = ['[1,]', '[1, ]', '[,]', '[1,,2]', '[1 2]', '[1', '[', '[1]]', '[1] x', '[] []', '{"a": 1} 2', '[2.]']
+        for text in documents:
+            for block_size in self.BLOCK_SIZES:
+                with self.assertRaises(ValueError, msg=(text, block_size)):
+                    self.read(text, block_size)
+
+    def test_read_json_chunks(self):
+        records = [{'case_number': f'J-{index}'} for index in range(5)]
+        upload = io.BytesIO(('\ufeff' + json.dumps(records)).encode('utf-8'))
+        chunks = list(read_chunks(upload, 'json', chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(pd.concat(chunks)['case_number'].tolist(), [record['case_number'] for record in records])
+
+
+class CrimeIngestorTests(TestCase):
+    """Column-wise validation, rejects and inserts of uploaded chunks."""
+
+    def setUp(self):
+        clear_reference_tables()
+        self.agency = Agency.objects.create(name='Test Police')
+        CrimeCategory.objects.create(name='Theft', severity_level=3)
+        CrimeCategory.objects.create(name='Assault', severity_level=8)
+        self.ingestor = CrimeIngestor(self.agency, chunk_size=2)
+
+    def ingest(self, records, first_row=1):
+        self.ingestor.ingest(pd.DataFrame(records, dtype=str), first_row=first_row)
+        return {error['row']: error['errors'] for error in self.ingestor.errors}
+
+    def test_valid_rows_are_inserted(self):
+        errors = self.ingest([
+            record('V-1', time='14:30', property_loss='12.5', arrests_made='yes'),
+            record('V-2', category='Assault', status='solved'),
+            record('V-3', category='Pickpocketing', is_violent='1'),
+        ])
+        self.assertEqual(errors, {})
+        self.assertEqual((self.ingestor.created, self.ingestor.failed), (3, 0))
+
+        first = Crime.objects.get(case_number='V-1')
+        self.assertEqual((first.date, first.time, first.status), (date(2024, 1, 1), time(14, 30), 'reported'))
+        self.assertEqual(first.property_loss, Decimal('12.50'))
+        self.assertTrue(first.arrests_made)
+        self.assertFalse(first.is_violent)
+        self.assertEqual(first.agency, self.agency)
+        self.assertIsNotNone(first.geohash)
+        # Severe categories and explicit flags both mark a crime violent, as Crime.save() does.
+        self.assertTrue(Crime.objects.get(case_number='V-2').is_violent)
+        self.assertTrue(Crime.objects.get(case_number='V-3').is_violent)
+        self.assertTrue(CrimeCategory.objects.filter(name='Pickpocketing').exists())
+
+        rollups = CrimeStatistic.objects.filter(agency=self.agency, status__isnull=False)
+        self.assertEqual(sum(rollups.values_list('count', flat=True)), 3)
+
+    def test_invalid_rows_are_rejected_with_field_errors(self):
+        errors = self.ingest([
+            record('R-1'),
+            record('R-2', description=' '),
+            record('R-3', latitude='91', longitude='east'),
+            record('R-4', status='lost'),
+            record('R-5', arrests_made='maybe', date='not a date'),
+            record('R-6', time='25:99', property_loss='lots'),
+            record(None),
+        ])
+        self.assertEqual((self.ingestor.created, self.ingestor.failed), (1, 6))
+        self.assertEqual(list(Crime.objects.values_list('case_number', flat=True)), ['R-1'])
+        self.assertEqual(errors[2], {'description': [REQUIRED]})
+        self.assertEqual(errors[3], {
+            'latitude': ['Ensure this value is between -90 and 90.'],
+            'longitude': ['A valid number is required.'],
+        })
+        self.assertEqual(errors[4], {'status': ['Not a valid choice.']})
+        self.assertEqual(set(errors[5]), {'arrests_made', 'date'})
+        self.assertEqual(set(errors[6]), {'time', 'property_loss'})
+        self.assertEqual(errors[7], {'case_number': [REQUIRED]})
+
+    def test_duplicate_case_numbers_are_rejected(self):
+        self.ingest([record('D-1')])
+        # Chunks hold two rows: D-2 is repeated within the first, D-1 is already stored.
+        errors = self.ingest([record('D-2'), record(' D-2 '), record('D-1')], first_row=2)
+        self.assertEqual((self.ingestor.created, self.ingestor.failed), (2, 2))
+        self.assertEqual(errors[3], {'case_number': ['Duplicate case number in this upload.']})
+        self.assertEqual(errors[4], {'case_number': ['crime with this case number already exists.']})
+        self.assertEqual(Crime.objects.filter(case_number='D-2').count(), 1)
+
+    def test_rows_keep_their_index_without_first_row(self):
+        frame = pd.DataFrame([record('I-1', status='lost'), record('I-2')], dtype=str, index=[41, 97])
+        self.ingestor.ingest(frame, first_row=None)
+        self.assertEqual([error['row'] for error in self.ingestor.errors], [41])
+        self.assertEqual(self.ingestor.errors[0]['case_number'], 'I-1')
+
+
+class StagingLoaderTests(TestCase):
+    """COPY loads of CSV uploads, including rows with the wrong number of fields."""
+
+    def setUp(self):
+        clear_reference_tables()
+        self.agency = Agency.objects.create(name='Test Police')
+        user = get_user_model().objects.create_user('uploader', password='uploader-password')
+        data_source = DataSource.objects.create(name='Uploads', source_type='file', created_by=user)
+        self.import_job = ImportJob.objects.create(data_source=data_source, created_by=user)
+
+    def load(self, text):
+        loader = StagingLoader(self.agency, self.import_job)
+        loader.load(io.BytesIO(text.encode('utf-8')))
+        return loader
+
+    def test_ragged_rows_are_rejected(self):
+        loader = self.load(
+            'case_number,category,description,block_address,date,latitude,longitude\n'
+            'S-1,Theft,"Bicycle, red",Moi Avenue,2024-01-01,-1.28,36.82\n'
+            'S-2,Theft,Phone,Moi Avenue\n'
+            '\n'
+            'S-3,Theft,Phone,Moi Avenue,2024-01-01,-1.28,36.82,extra\n'
+            'S-4,Theft,"Wallet\nand keys",Moi Avenue,2024-01-02,-1.28,36.82\n'
+        )
+        self.assertEqual((loader.created, loader.failed), (2, 2))
+        self.assertEqual(
+            sorted(Crime.objects.values_list('case_number', 'description')),
+            [('S-1', 'Bicycle, red'), ('S-4', 'Wallet\nand keys')],
+        )
+        self.assertEqual([(error['row'], error['case_number']) for error in loader.errors], [(2, 'S-2'), (3, 'S-3')])
+        self.assertEqual(loader.errors[0]['errors']['non_field_errors'], ['Expected 7 fields but found 4.'])
+        self.assertEqual(loader.errors[1]['errors'], {'non_field_errors': ['Expected 7 fields but found 8.']})
+        self.assertEqual(ImportLog.objects.filter(import_job=self.import_job, status='failed').count(), 2)
+
+
+PARALLEL_UPLOAD = (
+    'case_number,category,description,block_address,date,latitude,longitude\n'
+    + ''.join(f'P-{index},Theft,Phone,Moi Avenue,2024-01-0{index},-1.28,36.82\n' for index in range(1, 7))
+    + 'P-3,Theft,Phone again,Moi Avenue,2024-01-09,-1.28,36.82\n'
+    + 'P-8,Theft,Phone,Moi Avenue,2024-01-08,-91,36.82\n'
+)
+
+
+class ParallelUploadMixin:
+    """Runs a ``parallel`` upload job and checks it matches a serial load."""
+
+    def create_job(self):
+        clear_reference_tables()
+        agency = Agency.objects.create(name='Test Police')
+        user = get_user_model().objects.create_user('uploader', password='uploader-password')
+        data_source = DataSource.objects.create(name='Uploads', source_type='file', created_by=user)
+        import_job = ImportJob.objects.create(data_source=data_source, created_by=user, parameters={
+            'loader': 'parallel', 'format': 'csv', 'agency_id': agency.id, 'workers': 3,
+        })
+        store_upload(import_job, SimpleUploadedFile('crimes.csv', PARALLEL_UPLOAD.encode('utf-8')))
+        return import_job
+
+    def assert_loaded(self, import_job):
+        import_job.refresh_from_db()
+        self.assertEqual(import_job.status, 'completed')
+        self.assertEqual(
+            (import_job.records_processed, import_job.records_created, import_job.records_failed), (8, 6, 2)
+        )
+        self.assertEqual([error['row'] for error in import_job.error_details], [7, 8])
+        self.assertEqual(import_job.error_details[0]['errors'], {
+            'case_number': ['Duplicate case number in this upload.'],
+        })
+        # The first P-3 in the file wins, as in a serial load.
+        self.assertEqual(Crime.objects.get(case_number='P-3').description, 'Phone')
+        self.assertEqual(Crime.objects.count(), 6)
+
+
+@override_settings(IMPORT_JOB_EXECUTOR='celery')
+class CeleryParallelUploadTests(ParallelUploadMixin, TestCase):
+    """Partitions run as a chord of Celery subtasks (eagerly here)."""
+
+    def setUp(self):
+        self.addCleanup(setattr, app.conf, 'task_always_eager', app.conf.task_always_eager)
+        app.conf.task_always_eager = True
+
+    def test_partitions_run_as_subtasks(self):
+        import_job = self.create_job()
+        run_upload(import_job.pk)
+        self.assert_loaded(import_job)
+
+
+@override_settings(IMPORT_JOB_EXECUTOR='local')
+class LocalParallelUploadTests(ParallelUploadMixin, TransactionTestCase):
+    """Partitions run in spawned processes, which need committed data to see the job."""
+
+    def test_partitions_run_in_spawned_processes(self):
+        import_job = self.create_job()
+        run_upload(import_job.pk)
+        self.assert_loaded(import_job)
+
+
+@override_settings(IMPORT_MAX_PARTITIONS=4)
+class PartitionLimitTests(TestCase):
+    """The number of partitions of a parallel upload is bounded by IMPORT_MAX_PARTITIONS."""
+
+    def setUp(self):
+        self.agency = Agency.objects.create(name='Test Police')
+        user = get_user_model().objects.create_user(
+            'agency-user', password='agency-password', user_type='agency', agency=self.agency
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def upload(self, workers):
+        return self.client.post(reverse('agencies:agency-upload-data', args=[self.agency.pk]), {
+            'file': SimpleUploadedFile('crimes.csv', PARALLEL_UPLOAD.encode('utf-8')),
+            'loader': 'parallel',
+            'workers': workers,
+        }, format='multipart')
+
+    def test_upload_rejects_out_of_range_workers(self):
+        for workers in ('0', '-2', '5', '100000'):
+            response = self.upload(workers)
+            self.assertEqual(response.status_code, 400, workers)
+        self.assertFalse(ImportJob.objects.exists())
+
+    def test_ingestor_clamps_workers(self):
+        self.assertEqual(ParallelIngestor(self.agency, 100000).workers, 4)
+        self.assertEqual(ParallelIngestor(self.agency, 2).workers, 2)
+        self.assertLessEqual(ParallelIngestor(self.agency).workers, 4)
@@ -75,10 +75,14 @@ class ImportJobViewSet(viewsets.ModelViewSet):
     def cancel(self, request, pk=None):
         """Cancel an import job."""
         import_job = self.get_object()
-        if import_job.status in ['pending', 'processing']:
-            import_job.status = 'canceled'
-            import_job.save()
+        # Running uploads stop before their next chunk (see crime_etl.jobs). Only the status is written,
+        # and only if the job is still unfinished, so the worker's progress counters are kept.
+        canceled = ImportJob.objects.filter(pk=import_job.pk, status__in=['pending', 'processing']).update(
+            status='canceled', completed_at=timezone.now()
+        )
+        if canceled:
             return Response({"detail": "Import job canceled."})
+        import_job.refresh_from_db(fields=['status'])
         return Response(
             {"detail": f"Cannot cancel job with status '{import_job.status}'."},
             status=status.HTTP_400_BAD_REQUEST
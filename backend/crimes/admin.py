@@ -101,9 +101,9 @@ class CrimeNoteAdmin(admin.ModelAdmin):
 @admin.register(CrimeStatistic)
 class CrimeStatisticAdmin(admin.ModelAdmin):
     """Admin for crime statistics."""
-    list_display = ('date', 'category', 'district', 'neighborhood', 'agency', 
-                   'count', 'violent_count', 'arrests')
-    list_filter = ('date', 'category', 'district', 'neighborhood', 'agency')
+    list_display = ('date', 'category', 'district', 'neighborhood', 'agency', 'status',
+                   'count', 'violent_count', 'property_count', 'arrests')
+    list_filter = ('date', 'category', 'district', 'neighborhood', 'agency', 'status')
     search_fields = ('category__name', 'district__name', 'neighborhood__name', 'agency__name')
     date_hierarchy = 'date'
     ordering = ('-date',)
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""
+Aggregation helpers for crimes app.
+"""
+import datetime
+from dateutil.relativedelta import relativedelta
+from django.db.models import Count, DateField, Q, Sum
+from django.db.models.functions import Coalesce, TruncDay, TruncMonth, TruncQuarter, TruncWeek
+
+# Metric name -> extra condition counted on top of the date filter.
+METRIC_FILTERS = {
+    'total': Q(),
+    'violent': Q(is_violent=True),
+    'property': Q(property_loss__isnull=False),
+    'arrests': Q(arrests_made=True),
+}
+
+# Metric name -> CrimeStatistic rollup column holding its count.
+ROLLUP_METRIC_FIELDS = {
+    'total': 'count',
+    'violent': 'violent_count',
+    'property': 'property_count',
+    'arrests': 'arrests',
+}
+
+# Metric name -> key used in the CrimeStatResponseSerializer payload.
+WINDOW_STAT_NAMES = {
+    'total': 'total_crimes',
+    'violent': 'violent_crimes',
+    'property': 'property_crimes',
+    'arrests': 'arrests',
+}
+
+BUCKET_FUNCTIONS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+}
+
+BUCKET_STEPS = {
+    'day': relativedelta(days=1),
+    'week': relativedelta(weeks=1),
+    'month': relativedelta(months=1),
+    'quarter': relativedelta(months=3),
+}
+
+
+def _date_range_q(date_range):
+    start, end = date_range
+    return Q(date__gte=start, date__lte=end)
+
+
+def _metric(metric, condition, rollup):
+    """Count crimes matching ``condition`` and the metric, or sum the metric's rollup column."""
+    if rollup:
+        return Coalesce(Sum(ROLLUP_METRIC_FIELDS[metric], filter=condition), 0)
+    return Count('id', filter=condition & METRIC_FILTERS[metric])
+
+
+def window_stats(queryset, current_range, previous_range, top=10, rollup=False):
+    """
+    Compute current/previous window metrics for the stats endpoint.
+
+    Both windows are scanned together: the queryset is restricted to the
+    union of the two date ranges and grouped once by category, with one
+    filtered COUNT per metric and window. Totals are summed from the
+    per-category rows, so the whole payload costs a single query.
+    With ``rollup=True`` the queryset holds CrimeStatistic rollups and the
+    metrics sum their columns instead.
+    """
+    current_q = _date_range_q(current_range)
+    previous_q = _date_range_q(previous_range)
+
+    annotations = {}
+    for metric in METRIC_FILTERS:
+        name = WINDOW_STAT_NAMES[metric]
+        annotations[name] = _metric(metric, current_q, rollup)
+        annotations[f'previous_{name}'] = _metric(metric, previous_q, rollup)
+
+    # Aliased so they cannot clash with rollup columns such as ``arrests``.
+    rows = list(
+        queryset.filter(current_q | previous_q)
+        .order_by()
+        .values('category__name')
+        .annotate(**{f'{key}_value': value for key, value in annotations.items()})
+    )
+
+    stats = {key: sum(row[f'{key}_value'] for row in rows) for key in annotations}
+    ranked = sorted(
+        (row for row in rows if row['total_crimes_value']),
+        key=lambda row: row['total_crimes_value'],
+        reverse=True,
+    )
+    stats['top_crimes'] = [
+        {'category__name': row['category__name'], 'count': row['total_crimes_value']}
+        for row in ranked[:top]
+    ]
+    return stats
+
+
+def bucket_start(value, granularity='month'):
+    """Return the first day of the bucket containing ``value``."""
+    if granularity == 'day':
+        return value
+    if granularity == 'week':
+        return value - datetime.timedelta(days=value.weekday())
+    if granularity == 'month':
+        return value.replace(day=1)
+    if granularity == 'quarter':
+        return value.replace(month=(value.month - 1) // 3 * 3 + 1, day=1)
+    raise ValueError(f"Unsupported granularity: {granularity}")
+
+
+def iter_buckets(start_date, end_date, granularity='month'):
+    """Yield the start date of every bucket overlapping [start_date, end_date]."""
+    current = bucket_start(start_date, granularity)
+    step = BUCKET_STEPS[granularity]
+    while current <= end_date:
+        yield current
+        current = current + step
+
+
+def time_series(queryset, start_date, end_date, granularity='month', metrics=None, rollup=False):
+    """
+    Count crimes per time bucket in a single GROUP BY query.
+
+    Rows are grouped on the truncated ``date`` column with one filtered
+    COUNT per metric. Buckets without crimes are filled with zeros in
+    Python, so the result always has one entry per bucket in order:
+    ``[{'period': date, 'total': n, ...}, ...]``. With ``rollup=True`` the
+    queryset holds CrimeStatistic rollups, whose columns are summed.
+    """
+    if granularity not in BUCKET_FUNCTIONS:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+    metrics = metrics or list(METRIC_FILTERS)
+
+    trunc = BUCKET_FUNCTIONS[granularity]('date', output_field=DateField())
+    rows = (
+        queryset.filter(date__gte=start_date, date__lte=end_date)
+        .order_by()
+        .annotate(period=trunc)
+        .values('period')
+        .annotate(**{
+            f'{metric}_value': _metric(metric, Q(), rollup)
+            for metric in metrics
+        })
+    )
+    counts = {row['period']: row for row in rows}
+
+    series = []
+    for period in iter_buckets(start_date, end_date, granularity):
+        row = counts.get(period, {})
+        entry = {'period': period}
+        for metric in metrics:
+            entry[metric] = row.get(f'{metric}_value', 0)
+        series.append(entry)
+    return series
+
+
+def period_key(period, granularity='month'):
+    """Return the machine-readable key for a bucket (e.g. ``2024-05``)."""
+    if granularity == 'month':
+        return period.strftime('%Y-%m')
+    if granularity == 'quarter':
+        return f"{period.year}-Q{(period.month - 1) // 3 + 1}"
+    return period.strftime('%Y-%m-%d')
+
+
+def period_label(period, granularity='month'):
+    """Return the chart label for a bucket (e.g. ``May 2024``)."""
+    if granularity == 'month':
+        return period.strftime('%b %Y')
+    if granularity == 'quarter':
+        return f"Q{(period.month - 1) // 3 + 1} {period.year}"
+    return period.strftime('%d %b %Y')
+
@@ -9,4 +9,7 @@ class CrimesConfig(AppConfig):
 
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crimes'
-    verbose_name = 'Crime Data & Analysis'
\ No newline at end of file
+    verbose_name = 'Crime Data & Analysis'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,87 @@
+"""
+Versioned cache keys for crime analytics.
+
+Every agency, plus a global scope, has a generation counter in the cache.
+Changing an agency's crimes bumps its counter and the global one, and
+analytics keys embed the counter of the scope they were computed for, so
+entries written before a change are never read again and simply expire.
+"""
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+GLOBAL_SCOPE = 'all'
+DEFAULT_ANALYTICS_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def analytics_timeout():
+    return getattr(settings, 'CRIME_ANALYTICS_CACHE_TIMEOUT', DEFAULT_ANALYTICS_CACHE_TIMEOUT)
+
+
+def _scope(agency_id):
+    return GLOBAL_SCOPE if agency_id is None else str(agency_id)
+
+
+def _version_key(scope):
+    return f"crime_cache_version_{scope}"
+
+
+def _initial_version():
+    # Millisecond clock start, so a counter lost to eviction never restarts below old values.
+    return int(time.time() * 1000)
+
+
+def scope_version(agency_id=None):
+    """Return the current generation of an agency's crimes, or of all crimes."""
+    key = _version_key(_scope(agency_id))
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_versions(*agency_ids):
+    """Invalidate analytics for the given agencies and the global scope."""
+    for scope in {GLOBAL_SCOPE, *(_scope(agency_id) for agency_id in agency_ids if agency_id is not None)}:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), timeout=None)
+
+
+def bump_versions_on_commit(*agency_ids):
+    """Bump versions once the current transaction commits (immediately outside one)."""
+    transaction.on_commit(lambda: bump_versions(*agency_ids))
+
+
+def versioned_key(name, builder, **extra):
+    """
+    Return an analytics cache key for a CrimeQueryBuilder.
+
+    The key holds the builder's agency scope and its current generation,
+    plus the fingerprint of the filters and ``extra`` parameters, so users
+    who see the same data share entries.
+    """
+    agency_id = builder.agency_scope
+    return f"crime_{name}_{_scope(agency_id)}_v{scope_version(agency_id)}_{builder.fingerprint(**extra)}"
+
+
+def analytics_keys(name, builder, **extra):
+    """
+    Return ``(key, stale_key)`` for a CrimeQueryBuilder.
+
+    ``key`` is :func:`versioned_key`; ``stale_key`` omits the generation
+    so the last value survives version bumps and can be served while the
+    new one is computed.
+    """
+    fingerprint = builder.fingerprint(**extra)
+    scope = _scope(builder.agency_scope)
+    return versioned_key(name, builder, **extra), f"crime_{name}_{scope}_stale_{fingerprint}"
+
+
+def versioned_fingerprint(builder):
+    """Return a CrimeQueryBuilder fingerprint bound to the generation of its agency scope."""
+    return f"{builder.fingerprint()}_v{scope_version(builder.agency_scope)}"
@@ -0,0 +1,128 @@
+"""
+Hierarchical point clustering for low-zoom crime maps.
+"""
+import math
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from .functions import Latitude, Longitude
+
+# Cluster radius in pixels and tile extent, as in supercluster's defaults.
+CLUSTER_RADIUS = 40
+TILE_EXTENT = 512
+DEFAULT_MAX_ZOOM = 16
+DEFAULT_CLUSTER_CACHE_TIMEOUT = 60 * 15
+
+
+def _mercator_x(lng):
+    return lng / 360.0 + 0.5
+
+
+def _mercator_y(lat):
+    sin = np.sin(np.radians(lat))
+    y = 0.5 - 0.25 * np.log((1 + sin) / (1 - sin)) / math.pi
+    return np.clip(y, 0.0, 1.0)
+
+
+def _longitude(x):
+    return (x - 0.5) * 360.0
+
+
+def _latitude(y):
+    return np.degrees(2 * np.arctan(np.exp((0.5 - y) * 2 * math.pi))) - 90.0
+
+
+class ClusterIndex:
+    """
+    Multi-zoom grid cluster hierarchy over a set of crimes.
+
+    Level ``max_zoom + 1`` holds the individual points in web-mercator
+    units. Each lower zoom merges the previous level's clusters that fall
+    in the same grid cell (one cell per ``CLUSTER_RADIUS`` pixels), keeping
+    count-weighted centroids, counts and violent counts. All work is done
+    with numpy group-bys, so building the index is a handful of vector
+    passes per level.
+    """
+
+    def __init__(self, levels, max_zoom):
+        self.levels = levels
+        self.max_zoom = max_zoom
+
+    @classmethod
+    def build(cls, lng, lat, violent, max_zoom=DEFAULT_MAX_ZOOM):
+        x = _mercator_x(np.asarray(lng, dtype=np.float64))
+        y = _mercator_y(np.asarray(lat, dtype=np.float64))
+        count = np.ones(len(x), dtype=np.int64)
+        violent = np.asarray(violent, dtype=np.int64)
+
+        levels = {max_zoom + 1: (x, y, count, violent)}
+        for zoom in range(max_zoom, -1, -1):
+            levels[zoom] = cls._merge(*levels[zoom + 1], zoom)
+        return cls(levels, max_zoom)
+
+    @classmethod
+    def from_queryset(cls, queryset, max_zoom=DEFAULT_MAX_ZOOM):
+        rows = list(
+            queryset.order_by()
+            .annotate(point_lng=Longitude('location'), point_lat=Latitude('location'))
+            .values_list('point_lng', 'point_lat', 'is_violent')
+        )
+        if rows:
+            lng, lat, violent = zip(*rows)
+        else:
+            lng, lat, violent = (), (), ()
+        return cls.build(lng, lat, violent, max_zoom)
+
+    @staticmethod
+    def _merge(x, y, count, violent, zoom):
+        if not len(x):
+            return x, y, count, violent
+        cell = CLUSTER_RADIUS / (TILE_EXTENT * 2 ** zoom)
+        cells_per_row = int(math.ceil(1.0 / cell)) + 1
+        keys = np.floor(x / cell).astype(np.int64) * cells_per_row + np.floor(y / cell).astype(np.int64)
+        _, groups = np.unique(keys, return_inverse=True)
+        merged_count = np.bincount(groups, weights=count).astype(np.int64)
+        merged_x = np.bincount(groups, weights=x * count) / merged_count
+        merged_y = np.bincount(groups, weights=y * count) / merged_count
+        merged_violent = np.bincount(groups, weights=violent).astype(np.int64)
+        return merged_x, merged_y, merged_count, merged_violent
+
+    def query(self, bbox, zoom):
+        """
+        Return clusters intersecting ``bbox`` (west, south, east, north) at ``zoom``.
+
+        Zooms above ``max_zoom`` return individual points.
+        """
+        west, south, east, north = bbox
+        x, y, count, violent = self.levels[max(0, min(int(zoom), self.max_zoom + 1))]
+        lng = _longitude(x)
+        lat = _latitude(y)
+        in_lat = (lat >= south) & (lat <= north)
+        if west <= east:
+            in_lng = (lng >= west) & (lng <= east)
+        else:
+            in_lng = (lng >= west) | (lng <= east)
+        mask = in_lat & in_lng
+        return [
+            {
+                'lat': float(cluster_lat),
+                'lng': float(cluster_lng),
+                'count': int(cluster_count),
+                'violent_ratio': float(cluster_violent) / float(cluster_count),
+            }
+            for cluster_lat, cluster_lng, cluster_count, cluster_violent in zip(
+                lat[mask], lng[mask], count[mask], violent[mask]
+            )
+        ]
+
+
+def cluster_index(fingerprint, queryset):
+    """Return the cluster index for a filter fingerprint, building and caching it on a miss."""
+    max_zoom = getattr(settings, 'CRIME_CLUSTER_MAX_ZOOM', DEFAULT_MAX_ZOOM)
+    cache_key = f"crime_clusters_{fingerprint}_{max_zoom}"
+    index = cache.get(cache_key)
+    if index is None:
+        index = ClusterIndex.from_queryset(queryset, max_zoom)
+        timeout = getattr(settings, 'CRIME_CLUSTER_CACHE_TIMEOUT', DEFAULT_CLUSTER_CACHE_TIMEOUT)
+        cache.set(cache_key, index, timeout=timeout)
+    return index
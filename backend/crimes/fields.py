@@ -0,0 +1,55 @@
+"""
+Serializer fields for crimes app.
+"""
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from rest_framework import serializers
+from rest_framework_gis.fields import GeometryField
+from crime_analysis.renderers import RawJSON
+
+GEOJSON_PRECISION = 9
+
+
+def geojson_attr(field_name):
+    return f'{field_name}_geojson'
+
+
+def with_geojson(queryset, field_name, precision=GEOJSON_PRECISION):
+    """Annotate ``queryset`` with ``ST_AsGeoJSON`` of a geometry field."""
+    return queryset.annotate(**{geojson_attr(field_name): AsGeoJSON(field_name, precision=precision)})
+
+
+class PrerenderedGeometryField(GeometryField):
+    """
+    GeometryField that emits the database-rendered GeoJSON when available.
+
+    If the instance carries a ``<field>_geojson`` annotation (see
+    :func:`with_geojson`), that string is passed through as RawJSON and
+    spliced in by the renderer; otherwise the GEOS geometry is converted
+    as usual.
+    """
+
+    def get_attribute(self, instance):
+        rendered = getattr(instance, geojson_attr(self.source), None)
+        if rendered is not None:
+            return RawJSON(rendered)
+        return super().get_attribute(instance)
+
+    def to_representation(self, value):
+        if isinstance(value, RawJSON):
+            return value
+        return super().to_representation(value)
+
+
+class ReferencePrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField resolving ids through an in-process reference table first."""
+
+    def __init__(self, table, **kwargs):
+        self.table = table
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if not isinstance(data, bool):
+            instance = self.table.get(data)
+            if instance is not None:
+                return instance
+        return super().to_internal_value(data)
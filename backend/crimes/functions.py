@@ -0,0 +1,36 @@
+"""
+Database functions for crimes app.
+"""
+from django.db.models import CharField, FloatField, Func, IntegerField
+
+
+class Longitude(Func):
+    """ST_X of a geography/geometry point column."""
+
+    template = 'ST_X(%(expressions)s::geometry)'
+    output_field = FloatField()
+
+
+class Latitude(Func):
+    """ST_Y of a geography/geometry point column."""
+
+    template = 'ST_Y(%(expressions)s::geometry)'
+    output_field = FloatField()
+
+
+class DaysBetween(Func):
+    """Whole days from the second date expression to the first (``end - start``)."""
+
+    arg_joiner = ' - '
+    template = '(%(expressions)s)'
+    output_field = IntegerField()
+
+
+class GeoHash(Func):
+    """ST_GeoHash of a geography/geometry point column at a fixed precision."""
+
+    template = 'ST_GeoHash(%(expressions)s::geometry, %(precision)s)'
+    output_field = CharField()
+
+    def __init__(self, expression, precision, **extra):
+        super().__init__(expression, precision=int(precision), **extra)
@@ -0,0 +1,96 @@
+"""
+Geohash spatial cell keys for crimes app.
+"""
+import numpy as np
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Precision stored on Crime.geohash (~4.8m x 4.8m cells). Shorter prefixes
+# of the same key give coarser cells: 4 ~ 39km, 5 ~ 4.9km, 6 ~ 1.2km.
+GEOHASH_PRECISION = 9
+
+
+def encode(lat, lng, precision=GEOHASH_PRECISION):
+    """Return the geohash of a coordinate, identical to PostGIS ``ST_GeoHash``."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if lng >= mid:
+                bits = bits * 2 + 1
+                lng_range[0] = mid
+            else:
+                bits = bits * 2
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if lat >= mid:
+                bits = bits * 2 + 1
+                lat_range[0] = mid
+            else:
+                bits = bits * 2
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def encode_many(lats, lngs, precision=GEOHASH_PRECISION):
+    """
+    Vectorized :func:`encode` for arrays of coordinates.
+
+    Each coordinate is quantized to its bisection bits in one step (the
+    interval midpoints are dyadic, so this matches the loop bit for bit)
+    and the interleaved bits are cut into base32 characters.
+    """
+    bits = precision * 5
+    lng_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    lng_cells = np.clip(np.floor((lngs + 180.0) / 360.0 * 2.0 ** lng_bits), 0, 2 ** lng_bits - 1).astype(np.uint64)
+    lat_cells = np.clip(np.floor((lats + 90.0) / 180.0 * 2.0 ** lat_bits), 0, 2 ** lat_bits - 1).astype(np.uint64)
+
+    code = np.zeros(lats.shape, dtype=np.uint64)
+    for i in range(bits):
+        # Even bit positions (from the most significant) come from longitude.
+        if i % 2 == 0:
+            bit = (lng_cells >> np.uint64(lng_bits - 1 - i // 2)) & np.uint64(1)
+        else:
+            bit = (lat_cells >> np.uint64(lat_bits - 1 - i // 2)) & np.uint64(1)
+        code = (code << np.uint64(1)) | bit
+
+    alphabet = np.array(list(BASE32))
+    chars = [alphabet[(code >> np.uint64(5 * (precision - 1 - i))) & np.uint64(31)] for i in range(precision)]
+    return [''.join(row) for row in zip(*chars)]
+
+
+def spatial_key(location):
+    """Return the stored geohash for a point geometry, or None without a location."""
+    if location is None:
+        return None
+    return encode(location.y, location.x)
+
+
+def decode(geohash):
+    """Return the ``(lat, lng)`` centre of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lng_range if even else lat_range
+            target[1 - bit] = (target[0] + target[1]) / 2
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lng_range[0] + lng_range[1]) / 2
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+from crimes.functions import GeoHash
+from crimes.geohash import GEOHASH_PRECISION
+from crimes.models import Crime
+
+
+class Command(BaseCommand):
+    help = 'Backfill Crime.geohash spatial cell keys in id-range batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50000,
+                            help='Number of ids covered by each UPDATE batch')
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute keys for every crime, not only missing ones')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = Crime.objects.filter(location__isnull=False)
+        if not options['all']:
+            queryset = queryset.filter(geohash__isnull=True)
+
+        bounds = queryset.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write(self.style.SUCCESS('No crimes need spatial keys'))
+            return
+
+        updated = 0
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            with transaction.atomic():
+                updated += queryset.filter(
+                    id__gte=start, id__lt=start + batch_size
+                ).update(geohash=GeoHash('location', GEOHASH_PRECISION))
+            self.stdout.write(f"Updated {updated} crimes (through id {start + batch_size - 1})")
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully backfilled spatial keys for {updated} crimes'))
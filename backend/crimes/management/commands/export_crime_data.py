@@ -44,7 +44,7 @@ class Command(BaseCommand):
         # Apply geospatial filter if lat/lng provided
         if lat is not None and lng is not None:
             point = Point(lng, lat, srid=4326)
-            filters &= Q(location__distance_lte=(point, D(km=radius)))
+            filters &= Q(location_projected__dwithin=(point, D(km=radius)))
 
         # Fetch districts
         district_queryset = District.objects.all().prefetch_related('neighborhoods')
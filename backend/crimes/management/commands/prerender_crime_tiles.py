@@ -0,0 +1,143 @@
+import gzip
+import json
+import multiprocessing
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from crimes.geohash import decode
+from crimes.models import Crime, District
+from crimes.tiles import crime_layer, public_tile_builder, render_tile, tile_range, tiles_touching
+from crimes.tilestore import TileWriter, clear_dirty, dirty_geohashes, store_path
+
+WRITE_BATCH_SIZE = 500
+
+
+def render_public_tile(tile):
+    """Render one tile of the default public view, gzip-compressed (runs in worker processes)."""
+    z, x, y = tile
+    data = render_tile(z, x, y, [crime_layer(public_tile_builder().build())])
+    return z, x, y, gzip.compress(data) if data else b''
+
+
+class Command(BaseCommand):
+    help = 'Pre-render the public crime tile pyramid over the district bounding box into an MBTiles file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-zoom', type=int, default=12,
+                            help='Deepest zoom level to render (full runs)')
+        parser.add_argument('--padding', type=float, default=0.1,
+                            help='Degrees added around the district bounding box')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of rendering processes')
+        parser.add_argument('--path', default=None,
+                            help='MBTiles file to write (defaults to CRIME_TILE_STORE_PATH)')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only re-render tiles touched by crimes changed since the last run')
+
+    def handle(self, *args, **options):
+        path = options['path'] or store_path()
+        started = timezone.now()
+        if options['incremental']:
+            if not os.path.exists(path):
+                raise CommandError(f"No tile store at {path}; run a full render first")
+            self.render_incremental(path, started, options)
+        else:
+            self.render_full(path, started, options)
+
+    def render_full(self, path, started, options):
+        """Render every tile of the bounding box into a new file, then swap it in."""
+        locations = list(District.objects.filter(location__isnull=False).values_list('location', flat=True))
+        if not locations:
+            raise CommandError('No district locations to derive a bounding box from')
+        padding = options['padding']
+        bounds = (
+            min(point.x for point in locations) - padding, min(point.y for point in locations) - padding,
+            max(point.x for point in locations) + padding, max(point.y for point in locations) + padding,
+        )
+        max_zoom = options['max_zoom']
+        tiles = [tile for z in range(max_zoom + 1) for tile in tile_range(*bounds, z)]
+
+        temp_path = f'{path}.tmp'
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        writer = TileWriter(temp_path)
+        try:
+            writer.set_metadata({
+                'name': 'crimes',
+                'format': 'pbf',
+                'type': 'overlay',
+                'minzoom': 0,
+                'maxzoom': max_zoom,
+                'bounds': ','.join(f'{value:.6f}' for value in bounds),
+                'json': json.dumps({'vector_layers': [{'id': 'crimes', 'minzoom': 0, 'maxzoom': max_zoom, 'fields': {
+                    'id': 'Number', 'category': 'String', 'status': 'String', 'is_violent': 'Boolean', 'date': 'String',
+                }}]}),
+                'rendered_at': started.isoformat(),
+            })
+            # Changes made while rendering are picked up by the next incremental run.
+            pending = dirty_geohashes()
+            self.render(writer, tiles, options['workers'])
+        finally:
+            writer.close()
+        os.replace(temp_path, path)
+        clear_dirty(pending)
+        self.stdout.write(self.style.SUCCESS(f'Successfully rendered {len(tiles)} tiles to {path}'))
+
+    def render_incremental(self, path, started, options):
+        """Re-render the tiles around crimes saved or deleted since the last run."""
+        writer = TileWriter(path)
+        try:
+            metadata = writer.metadata()
+            max_zoom = int(metadata['maxzoom'])
+            rendered_at = parse_datetime(metadata['rendered_at'])
+
+            geohashes = dirty_geohashes()
+            # Bulk loaders skip the signals that mark locations, so also include recently updated rows.
+            changed = set(geohashes)
+            changed.update(
+                Crime.objects.filter(updated_at__gte=rendered_at, geohash__isnull=False)
+                .values_list('geohash', flat=True).distinct()
+            )
+            tiles = set()
+            for geohash in changed:
+                lat, lng = decode(geohash)
+                for z in range(max_zoom + 1):
+                    tiles.update(tiles_touching(lng, lat, z))
+
+            self.render(writer, sorted(tiles), options['workers'])
+            writer.set_metadata({'rendered_at': started.isoformat()})
+        finally:
+            writer.close()
+        clear_dirty(geohashes)
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully re-rendered {len(tiles)} tiles for {len(changed)} changed locations'
+        ))
+
+    def render(self, writer, tiles, workers):
+        """Render ``tiles`` (in worker processes when ``workers > 1``) and store them in batches."""
+        began = time.monotonic()
+        if workers > 1 and len(tiles) > 1:
+            # Children must open their own database connections rather than share the parent's.
+            connections.close_all()
+            pool = multiprocessing.get_context('fork').Pool(workers)
+            results = pool.imap_unordered(render_public_tile, tiles, chunksize=16)
+        else:
+            pool = None
+            results = map(render_public_tile, tiles)
+
+        try:
+            batch = []
+            for done, tile in enumerate(results, 1):
+                batch.append(tile)
+                if len(batch) >= WRITE_BATCH_SIZE:
+                    writer.write(batch)
+                    batch = []
+                    self.stdout.write(f"Rendered {done}/{len(tiles)} tiles ({time.monotonic() - began:.1f}s)")
+            writer.write(batch)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
@@ -0,0 +1,50 @@
+import datetime
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+from crimes.cache import bump_versions
+from crimes.models import Crime, CrimeStatistic
+from crimes.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily CrimeStatistic rollups from the crimes table, one month at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', type=datetime.date.fromisoformat,
+                            help='First day to rebuild (YYYY-MM-DD); defaults to the earliest crime or rollup')
+        parser.add_argument('--end-date', type=datetime.date.fromisoformat,
+                            help='Last day to rebuild (YYYY-MM-DD); defaults to the latest crime or rollup')
+        parser.add_argument('--agency-id', type=int,
+                            help='Only rebuild the rollups of this agency')
+
+    def handle(self, *args, **options):
+        agency_id = options['agency_id']
+        crimes = Crime.objects.all()
+        rollups = CrimeStatistic.objects.filter(status__isnull=False)
+        if agency_id is not None:
+            crimes, rollups = crimes.filter(agency_id=agency_id), rollups.filter(agency_id=agency_id)
+
+        bounds = [
+            queryset.aggregate(low=Min('date'), high=Max('date')) for queryset in (crimes, rollups)
+        ]
+        lows = [bound['low'] for bound in bounds if bound['low'] is not None]
+        highs = [bound['high'] for bound in bounds if bound['high'] is not None]
+        start_date = options['start_date'] or (min(lows) if lows else None)
+        end_date = options['end_date'] or (max(highs) if highs else None)
+        if start_date is None or end_date is None:
+            self.stdout.write(self.style.SUCCESS('No crimes to roll up'))
+            return
+
+        # Month-sized transactions keep each statistics table lock short.
+        written = 0
+        month_start = start_date
+        while month_start <= end_date:
+            month_end = min(month_start.replace(day=1) + relativedelta(months=1, days=-1), end_date)
+            deleted, created = rebuild(month_start, month_end, agency_id)
+            written += created
+            self.stdout.write(f"Rebuilt {month_start:%Y-%m}: {deleted} rows replaced by {created}")
+            month_start = month_end + datetime.timedelta(days=1)
+
+        bump_versions(agency_id)
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt {written} crime statistic rollups'))
@@ -0,0 +1,66 @@
+import importlib
+import time
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from crimes.refresh import load_recipe, prune_recipes, top_requests
+
+# Modules whose refreshable functions should be registered before replaying recipes.
+REFRESHABLE_MODULES = ('crimes.views', 'agencies.views')
+
+
+class Command(BaseCommand):
+    help = 'Refresh the most requested analytics cache entries shortly before they expire'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=60,
+                            help='Seconds between refresh cycles')
+        parser.add_argument('--lead', type=int, default=300,
+                            help='Refresh entries expiring within this many seconds (or missing)')
+        parser.add_argument('--budget', type=float, default=20.0,
+                            help='Maximum seconds of recomputation per cycle')
+        parser.add_argument('--max-refreshes', type=int, default=50,
+                            help='Maximum number of entries recomputed per cycle')
+        parser.add_argument('--top', type=int, default=200,
+                            help='Number of most requested entries considered per cycle')
+        parser.add_argument('--window-hours', type=int, default=2,
+                            help='Hours of request history used to rank entries')
+        parser.add_argument('--once', action='store_true',
+                            help='Run a single cycle and exit')
+
+    def handle(self, *args, **options):
+        for module in REFRESHABLE_MODULES:
+            importlib.import_module(module)
+
+        while True:
+            started = time.monotonic()
+            refreshed = self.refresh_cycle(options)
+            self.stdout.write(f"Refreshed {refreshed} analytics cache entries in {time.monotonic() - started:.1f}s")
+            if options['once']:
+                break
+            time.sleep(max(0, options['interval'] - (time.monotonic() - started)))
+
+    def refresh_cycle(self, options):
+        """Refresh expiring entries in request-frequency order until the budget is spent."""
+        started = time.monotonic()
+        ranking = top_requests(options['window_hours'], options['top'])
+        prune_recipes({member for member, _ in ranking})
+
+        refreshed = 0
+        for member, hits in ranking:
+            if refreshed >= options['max_refreshes'] or time.monotonic() - started >= options['budget']:
+                break
+            recipe = load_recipe(member)
+            if recipe is None:
+                continue
+            func, args = recipe
+            key, _ = func.cache_keys(*args)
+            ttl = cache.ttl(key)
+            if ttl is None or ttl > options['lead']:
+                continue
+            try:
+                if func.refill(*args):
+                    refreshed += 1
+                    self.stdout.write(f"Refreshed {member} ({hits:.0f} recent requests)")
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f"Failed to refresh {member}: {e}"))
+        return refreshed
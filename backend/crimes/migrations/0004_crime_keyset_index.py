@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-16 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crimes', '0003_remove_district_boundary_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='crime',
+            index=models.Index(fields=['-date', '-time', '-id'], name='crimes_crime_keyset_idx'),
+        ),
+    ]
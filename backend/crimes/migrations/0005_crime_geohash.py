@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-16 09:30
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crimes', '0004_crime_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crime',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, max_length=12, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='crime',
+            index=models.Index(django.db.models.functions.text.Left('geohash', 4), name='crimes_crime_geohash4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='crime',
+            index=models.Index(django.db.models.functions.text.Left('geohash', 6), name='crimes_crime_geohash6_idx'),
+        ),
+    ]
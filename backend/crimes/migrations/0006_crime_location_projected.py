@@ -0,0 +1,44 @@
+# Generated by Django 5.1.7 on 2026-10-16 10:00
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+SYNC_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION crimes_crime_sync_location_projected() RETURNS trigger AS $$
+BEGIN
+    IF NEW.location IS NULL THEN
+        NEW.location_projected := NULL;
+    ELSE
+        NEW.location_projected := ST_Transform(NEW.location::geometry, 21037);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER crimes_crime_location_projected
+    BEFORE INSERT OR UPDATE ON crimes_crime
+    FOR EACH ROW EXECUTE FUNCTION crimes_crime_sync_location_projected();
+
+UPDATE crimes_crime SET location = location WHERE location IS NOT NULL;
+"""
+
+DROP_FUNCTION_SQL = """
+DROP TRIGGER IF EXISTS crimes_crime_location_projected ON crimes_crime;
+DROP FUNCTION IF EXISTS crimes_crime_sync_location_projected();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crimes', '0005_crime_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crime',
+            name='location_projected',
+            field=django.contrib.gis.db.models.fields.PointField(blank=True, editable=False, null=True, srid=21037),
+        ),
+        migrations.RunSQL(SYNC_FUNCTION_SQL, DROP_FUNCTION_SQL),
+    ]
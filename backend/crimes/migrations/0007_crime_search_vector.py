@@ -0,0 +1,58 @@
+# Generated by Django 5.1.7 on 2026-10-16 11:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SYNC_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION crimes_crime_sync_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.block_address, '')), 'B');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER crimes_crime_search_vector
+    BEFORE INSERT OR UPDATE OF description, block_address, search_vector ON crimes_crime
+    FOR EACH ROW EXECUTE FUNCTION crimes_crime_sync_search_vector();
+
+UPDATE crimes_crime SET search_vector = NULL;
+"""
+
+DROP_FUNCTION_SQL = """
+DROP TRIGGER IF EXISTS crimes_crime_search_vector ON crimes_crime;
+DROP FUNCTION IF EXISTS crimes_crime_sync_search_vector();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crimes', '0006_crime_location_projected'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='crime',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunSQL(SYNC_FUNCTION_SQL, DROP_FUNCTION_SQL),
+        migrations.AddIndex(
+            model_name='crime',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='crimes_crime_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='crime',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('block_address'), name='gin_trgm_ops'), name='crimes_crime_address_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='crime',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('case_number'), name='gin_trgm_ops'), name='crimes_crime_case_trgm'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.7 on 2026-10-16 12:00
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+BACKFILL_SQL = """
+INSERT INTO crimes_crimestatistic
+    (date, category_id, district_id, neighborhood_id, agency_id, status,
+     count, violent_count, property_count, property_damage, arrests, created_at, updated_at)
+SELECT date, category_id, district_id, neighborhood_id, agency_id, status,
+       COUNT(*), COUNT(*) FILTER (WHERE is_violent), COUNT(property_loss),
+       COALESCE(SUM(property_loss), 0), COUNT(*) FILTER (WHERE arrests_made), NOW(), NOW()
+FROM crimes_crime
+GROUP BY date, category_id, district_id, neighborhood_id, agency_id, status;
+"""
+
+REMOVE_ROLLUPS_SQL = """
+DELETE FROM crimes_crimestatistic WHERE status IS NOT NULL;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crimes', '0007_crime_search_vector'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='crimestatistic',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='crimestatistic',
+            name='status',
+            field=models.CharField(blank=True, choices=[('reported', 'Reported'), ('under_investigation', 'Under Investigation'), ('solved', 'Solved'), ('closed', 'Closed'), ('unfounded', 'Unfounded')], max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='crimestatistic',
+            name='property_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='crimestatistic',
+            constraint=models.UniqueConstraint(models.F('date'), django.db.models.functions.comparison.Coalesce('category', models.Value(0)), django.db.models.functions.comparison.Coalesce('district', models.Value(0)), django.db.models.functions.comparison.Coalesce('neighborhood', models.Value(0)), models.F('agency'), django.db.models.functions.comparison.Coalesce('status', models.Value('')), name='crimes_statistic_rollup_key'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, REMOVE_ROLLUPS_SQL),
+    ]
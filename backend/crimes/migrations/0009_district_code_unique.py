@@ -0,0 +1,50 @@
+# Generated by Django 5.1.7 on 2026-10-16 14:00
+
+from django.db import migrations, models
+from django.db.models import Count
+
+# Duplicated codes listed in the error message.
+MAX_REPORTED_CODES = 20
+
+
+def check_duplicate_codes(apps, schema_editor):
+    """Fail with the offending districts if codes are not unique yet (NULL codes may repeat)."""
+    District = apps.get_model('crimes', 'District')
+    duplicates = list(
+        District.objects.using(schema_editor.connection.alias)
+        .exclude(code=None)
+        .values('code')
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+        .order_by('code')
+    )
+    if not duplicates:
+        return
+    # Districts sharing a code may belong to different agencies, so they cannot be merged automatically.
+    lines = []
+    for row in duplicates[:MAX_REPORTED_CODES]:
+        ids = District.objects.using(schema_editor.connection.alias).filter(code=row['code']).order_by('id')
+        lines.append(f"  {row['code']!r}: district ids {', '.join(str(pk) for pk in ids.values_list('id', flat=True))}")
+    if len(duplicates) > MAX_REPORTED_CODES:
+        lines.append(f"  ... and {len(duplicates) - MAX_REPORTED_CODES} more codes")
+    raise RuntimeError(
+        f"Cannot add crimes_district_code_key: {len(duplicates)} district codes are used more than once.\n"
+        + '\n'.join(lines)
+        + "\nMerge these districts (moving their crimes, neighborhoods and statistics) or give them distinct "
+          "or NULL codes, then run the migration again."
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crimes', '0008_crimestatistic_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_codes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='district',
+            constraint=models.UniqueConstraint(fields=('code',), name='crimes_district_code_key'),
+        ),
+    ]
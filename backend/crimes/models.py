@@ -2,8 +2,17 @@
 Models for crime data and analysis.
 """
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Left, Upper
 from django.contrib.gis.db import models as gis_models
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from agencies.models import Agency
+from .geohash import spatial_key
+from .reference import categories
+
+# Arc 1960 / UTM zone 37S: metric CRS used for planar distance filters over Kenya.
+PROJECTED_SRID = 21037
 
 
 class CrimeCategory(models.Model):
@@ -40,6 +49,10 @@ class District(gis_models.Model):
     class Meta:
         verbose_name_plural = 'Districts'
         ordering = ['name']
+        constraints = [
+            # Import commands upsert districts by code.
+            models.UniqueConstraint(fields=['code'], name='crimes_district_code_key'),
+        ]
 
     def __str__(self):
         return self.name
@@ -79,6 +92,8 @@ class Crime(gis_models.Model):
     time = models.TimeField(blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='reported')
     location = gis_models.PointField(geography=True, blank=True, null=True, srid=4326)
+    # Planar copy of location, kept in sync by a database trigger (migration 0006).
+    location_projected = gis_models.PointField(srid=PROJECTED_SRID, blank=True, null=True, editable=False)
     block_address = models.CharField(max_length=255)
     district = models.ForeignKey(District, on_delete=models.SET_NULL, null=True, blank=True, related_name='crimes')
     neighborhood = models.ForeignKey(Neighborhood, on_delete=models.SET_NULL, null=True, blank=True, related_name='crimes')
@@ -93,6 +108,9 @@ class Crime(gis_models.Model):
     gang_related = models.BooleanField(default=False)
     external_id = models.CharField(max_length=100, blank=True, null=True)
     data_source = models.CharField(max_length=100, blank=True, null=True)
+    geohash = models.CharField(max_length=12, blank=True, null=True, db_index=True)
+    # Weighted description/address tsvector, kept in sync by a database trigger (migration 0007).
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -104,14 +122,23 @@ class Crime(gis_models.Model):
             models.Index(fields=['is_violent']),
             models.Index(fields=['agency']),
             models.Index(fields=['category']),
+            models.Index(fields=['-date', '-time', '-id'], name='crimes_crime_keyset_idx'),
+            models.Index(Left('geohash', 4), name='crimes_crime_geohash4_idx'),
+            models.Index(Left('geohash', 6), name='crimes_crime_geohash6_idx'),
+            GinIndex(fields=['search_vector'], name='crimes_crime_search_idx'),
+            # icontains compiles to UPPER(col) LIKE UPPER(...), so the trigram indexes cover UPPER(col).
+            GinIndex(OpClass(Upper('block_address'), name='gin_trgm_ops'), name='crimes_crime_address_trgm'),
+            GinIndex(OpClass(Upper('case_number'), name='gin_trgm_ops'), name='crimes_crime_case_trgm'),
         ]
 
     def __str__(self):
         return f"{self.case_number} - {self.category.name}"
 
     def save(self, *args, **kwargs):
-        if self.category and self.category.severity_level >= 7:
+        category = categories.get(self.category_id) or self.category
+        if category.severity_level >= 7:
             self.is_violent = True
+        self.geohash = spatial_key(self.location)
         super().save(*args, **kwargs)
 
 class CrimeMedia(models.Model):
@@ -147,17 +174,24 @@ class CrimeNote(models.Model):
 
 
 class CrimeStatistic(models.Model):
-    """Model for aggregated crime statistics."""
+    """
+    Model for aggregated crime statistics.
+
+    Rows with a status are daily rollups maintained by ``crimes.rollups``;
+    rows without one are summaries loaded by the seed/import commands.
+    """
 
     date = models.DateField()
     category = models.ForeignKey(CrimeCategory, on_delete=models.CASCADE, related_name='statistics', null=True, blank=True)
     district = models.ForeignKey(District, on_delete=models.CASCADE, related_name='statistics', null=True, blank=True)
     neighborhood = models.ForeignKey(Neighborhood, on_delete=models.CASCADE, related_name='statistics', null=True, blank=True)
     agency = models.ForeignKey(Agency, on_delete=models.CASCADE, related_name='statistics')
+    status = models.CharField(max_length=20, choices=Crime.STATUS_CHOICES, blank=True, null=True)
 
     # Counts and measures
     count = models.IntegerField(default=0)
     violent_count = models.IntegerField(default=0)
+    property_count = models.IntegerField(default=0)
     property_damage = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     arrests = models.IntegerField(default=0)
 
@@ -166,8 +200,15 @@ class CrimeStatistic(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ['date', 'category', 'district', 'neighborhood', 'agency']
         ordering = ['-date']
+        constraints = [
+            # NULLs compare equal here, so rollups can be upserted with ON CONFLICT on this key.
+            models.UniqueConstraint(
+                F('date'), Coalesce('category', Value(0)), Coalesce('district', Value(0)),
+                Coalesce('neighborhood', Value(0)), F('agency'), Coalesce('status', Value('')),
+                name='crimes_statistic_rollup_key',
+            ),
+        ]
 
     def __str__(self):
         category_name = self.category.name if self.category else "All"
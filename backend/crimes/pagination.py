@@ -0,0 +1,128 @@
+"""
+Keyset (cursor) pagination for crime list endpoints.
+"""
+import base64
+import datetime
+import json
+from django.db.models import F, Q
+
+COUNT_MODES = ('exact', 'estimate', 'none')
+MAX_PAGE_SIZE = 5000
+
+
+def wants_cursor(params):
+    """Return True if the request asks for cursor pagination."""
+    return 'cursor' in params or params.get('pagination') == 'cursor'
+
+
+def keyset_ordering(descending=True):
+    """
+    Return the ``(date, time, id)`` ordering used for keyset pages.
+
+    It matches ``Crime.Meta.ordering`` with PostgreSQL's default NULL
+    placement (NULL times first when descending, last when ascending) and
+    adds ``id`` as a tie-breaker so every row has a unique position.
+    """
+    if descending:
+        return [F('date').desc(), F('time').desc(nulls_first=True), F('id').desc()]
+    return [F('date').asc(), F('time').asc(nulls_last=True), F('id').asc()]
+
+
+def encode_cursor(row):
+    """Return an opaque token pointing just past ``row``."""
+    if isinstance(row, dict):
+        date, time, pk = row['date'], row['time'], row['id']
+    else:
+        date, time, pk = row.date, row.time, row.pk
+    payload = [date.isoformat(), time.isoformat() if time else None, pk]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token):
+    """Return the ``(date, time, id)`` key stored in a cursor. Raises ``ValueError``."""
+    try:
+        date, time, pk = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        return (
+            datetime.date.fromisoformat(date),
+            datetime.time.fromisoformat(time) if time else None,
+            int(pk),
+        )
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {token}") from e
+
+
+def _after(key, descending):
+    """
+    Return a Q object selecting the rows that follow ``key`` in keyset order.
+
+    The redundant ``date <= d`` (or ``>=``) bound gives the planner a range
+    condition on the ``(date, time, id)`` index, which the OR alone does not.
+    """
+    date, time, pk = key
+    op = 'lt' if descending else 'gt'
+    if time is None:
+        tail = Q(time__isnull=True, **{f'id__{op}': pk})
+        if descending:
+            tail |= Q(time__isnull=False)
+    else:
+        tail = Q(**{f'time__{op}': time}) | Q(time=time, **{f'id__{op}': pk})
+        if not descending:
+            tail |= Q(time__isnull=True)
+    bound = Q(date__lte=date) if descending else Q(date__gte=date)
+    return bound & (Q(**{f'date__{op}': date}) | (Q(date=date) & tail))
+
+
+def keyset_paginate(queryset, cursor=None, limit=1000, descending=True):
+    """
+    Return one page of ``queryset`` and the cursor of the next page.
+
+    Pages are selected with a ``WHERE (date, time, id) < cursor`` style
+    predicate instead of ``OFFSET``, so deep pages cost the same as the
+    first one. ``next_cursor`` is None on the last page. Raises
+    ``ValueError`` unless ``1 <= limit <= MAX_PAGE_SIZE``.
+    """
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    queryset = queryset.order_by(*keyset_ordering(descending))
+    if cursor:
+        queryset = queryset.filter(_after(decode_cursor(cursor), descending))
+    rows = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1])
+    return rows, next_cursor
+
+
+def page_count(builder, mode):
+    """Return the total for a paginated query: exact, planner estimate, or None."""
+    if mode == 'exact':
+        return builder.build().count()
+    if mode == 'estimate':
+        return builder.estimate_count()
+    return None
+
+
+def paginate_cursor(builder, params, descending=True, project=None):
+    """
+    Paginate a CrimeQueryBuilder from request parameters.
+
+    Reads ``cursor``, ``limit`` and ``count`` (``exact``, ``estimate`` or
+    ``none``, the default) and returns ``(rows, meta)`` where ``meta``
+    holds ``next_cursor``, ``limit`` and ``count``. ``project`` may turn the
+    built queryset into ``values()`` rows; they must keep ``id``, ``date``
+    and ``time`` for the cursor.
+    """
+    limit = int(params.get('limit', 1000))
+    count_mode = params.get('count', 'none')
+    if count_mode not in COUNT_MODES:
+        raise ValueError(f"Invalid count mode: {count_mode}")
+    queryset = builder.build()
+    if project is not None:
+        queryset = project(queryset)
+    rows, next_cursor = keyset_paginate(queryset, params.get('cursor') or None, limit, descending)
+    return rows, {
+        'next_cursor': next_cursor,
+        'limit': limit,
+        'count': page_count(builder, count_mode),
+    }
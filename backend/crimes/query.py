@@ -0,0 +1,229 @@
+"""
+Composable query building for crime endpoints.
+"""
+import hashlib
+import json
+import logging
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
+from django.db.models import Q
+from .models import Crime
+from .search import keyword_q, search_query, search_rank
+
+logger = logging.getLogger(__name__)
+
+# Statuses visible to users who are neither admins nor scoped to an agency.
+PUBLIC_STATUSES = ['reported', 'solved', 'closed']
+
+# Decimal places kept for radius filter coordinates (~11 m) and radii in km (10 m).
+DEFAULT_COORD_PRECISION = 4
+DEFAULT_RADIUS_PRECISION = 2
+
+
+def is_admin(user):
+    """Return True if the user may see crimes of every status."""
+    return user.is_authenticated and (user.is_staff or user.user_type == 'admin')
+
+
+def user_agency(user):
+    """Return the agency an agency user is scoped to, or None."""
+    if user.is_authenticated and user.user_type == 'agency' and user.agency:
+        return user.agency
+    return None
+
+
+class CrimeQueryBuilder:
+    """
+    Collect crime filters and apply them lazily.
+
+    Every filter method records a canonical ``(name, value)`` entry next to
+    the ``Q`` object it contributes and returns the builder, so calls can
+    be chained. Nothing touches the database until :meth:`build` is
+    evaluated. :meth:`fingerprint` hashes the canonical entries, giving a
+    stable identity for the effective filter set: visibility is recorded as
+    the resulting agency/status filters rather than the user, lists are
+    sorted and radius filters are quantized.
+
+    With ``diagnostics=True`` :meth:`log` records the planner's ``EXPLAIN``
+    output and row estimate instead of executing real counts.
+    """
+
+    def __init__(self, queryset=None, diagnostics=None):
+        self._queryset = queryset if queryset is not None else Crime.objects.all()
+        self._filters = []
+        self._search_query = None
+        if diagnostics is None:
+            diagnostics = getattr(settings, 'CRIME_QUERY_DIAGNOSTICS', False)
+        self.diagnostics = diagnostics
+
+    @classmethod
+    def from_applied(cls, applied, queryset=None):
+        """Rebuild a builder from its :attr:`applied` filters (same fingerprint)."""
+        builder = cls(queryset)
+        for name, value in applied:
+            if name == 'has_location':
+                builder.with_location()
+            elif name == 'within':
+                builder.within(*value)
+            elif name == 'date_from':
+                builder.date_range(start=value)
+            elif name == 'date_to':
+                builder.date_range(end=value)
+            elif name == 'keywords':
+                builder.keywords(value[1], value[0])
+            elif name in ('agency', 'status', 'crime_types', 'neighborhood', 'is_violent'):
+                getattr(builder, name)(value)
+            else:
+                raise ValueError(f"Unknown crime filter: {name}")
+        return builder
+
+    def _add(self, name, value, q):
+        self._filters.append((name, value, q))
+        return self
+
+    # Visibility
+
+    def visible_to(self, user):
+        """Restrict to what a user may list: their agency, or public statuses."""
+        agency = user_agency(user)
+        if agency:
+            return self.agency(agency.pk)
+        if not is_admin(user):
+            return self.status(PUBLIC_STATUSES)
+        return self
+
+    def analytics_scope(self, user, agency_id=None):
+        """
+        Restrict to what a user may aggregate over.
+
+        An explicit ``agency_id`` wins over the user's own agency; every
+        non-admin only sees public statuses. Raises ``ValueError`` for a
+        malformed ``agency_id``.
+        """
+        if agency_id:
+            self.agency(int(agency_id))
+        else:
+            agency = user_agency(user)
+            if agency:
+                self.agency(agency.pk)
+        if not is_admin(user):
+            self.status(PUBLIC_STATUSES)
+        return self
+
+    # Filters
+
+    def agency(self, agency_id):
+        return self._add('agency', int(agency_id), Q(agency_id=agency_id))
+
+    def status(self, statuses):
+        # Always a sorted list, so one status and several compare and fingerprint alike.
+        statuses = [statuses] if isinstance(statuses, str) else sorted(statuses)
+        return self._add('status', statuses, Q(status__in=statuses))
+
+    def with_location(self):
+        return self._add('has_location', True, Q(location__isnull=False))
+
+    def within(self, lat, lng, radius_km):
+        """
+        Keep crimes within ``radius_km`` of a point. Raises ``ValueError`` on bad input.
+
+        Uses the planar ``location_projected`` column, so the filter is a
+        GiST-indexed ``ST_DWithin`` in metres rather than a spheroid one.
+        Coordinates and radius are rounded to ``CRIME_QUERY_COORD_PRECISION``
+        and ``CRIME_QUERY_RADIUS_PRECISION`` decimal places, so nearby
+        requests share one filter (and one cache entry).
+        """
+        coord_precision = getattr(settings, 'CRIME_QUERY_COORD_PRECISION', DEFAULT_COORD_PRECISION)
+        radius_precision = getattr(settings, 'CRIME_QUERY_RADIUS_PRECISION', DEFAULT_RADIUS_PRECISION)
+        lat, lng = round(float(lat), coord_precision), round(float(lng), coord_precision)
+        radius_km = round(float(radius_km), radius_precision)
+        point = Point(lng, lat, srid=4326)
+        return self._add(
+            'within', [lat, lng, radius_km],
+            Q(location_projected__dwithin=(point, D(km=radius_km)))
+        )
+
+    def crime_types(self, names, lowercase=False):
+        names = [name.strip() for name in names if name and name.strip()]
+        if not names:
+            return self
+        if lowercase:
+            names = [name.lower() for name in names]
+        names = sorted(set(names))
+        return self._add('crime_types', names, Q(category__name__in=names))
+
+    def date_range(self, start=None, end=None):
+        if start:
+            self._add('date_from', str(start), Q(date__gte=start))
+        if end:
+            self._add('date_to', str(end), Q(date__lte=end))
+        return self
+
+    def neighborhood(self, neighborhood_id):
+        return self._add('neighborhood', int(neighborhood_id), Q(neighborhood_id=neighborhood_id))
+
+    def is_violent(self, value):
+        return self._add('is_violent', bool(value), Q(is_violent=value))
+
+    def keywords(self, text, mode='plain'):
+        """Full-text/trigram keyword match. Raises ``ValueError`` for an unknown ``mode``."""
+        self._search_query = search_query(text, mode)
+        return self._add('keywords', [mode, text], keyword_q(text, mode))
+
+    # Output
+
+    @property
+    def agency_scope(self):
+        """Return the agency id the query is restricted to, or None for all agencies."""
+        for name, value, _ in self._filters:
+            if name == 'agency':
+                return value
+        return None
+
+    @property
+    def applied(self):
+        """Return the canonical filters as a sorted list of ``[name, value]`` pairs."""
+        return sorted(
+            ([name, value] for name, value, _ in self._filters),
+            key=lambda pair: json.dumps(pair, sort_keys=True, default=str)
+        )
+
+    def fingerprint(self, **extra):
+        """Return a stable hash of the applied filters plus any result-shaping ``extra`` parameters."""
+        payload = json.dumps([self.applied, extra], sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def build(self):
+        """Return the filtered (still unevaluated) queryset."""
+        return self._queryset.filter(*[q for _, _, q in self._filters])
+
+    def rank(self):
+        """Return the relevance expression for the keyword filter, or None without one."""
+        if self._search_query is None:
+            return None
+        return search_rank(self._search_query)
+
+    def explain(self):
+        """Return the planner's JSON plan and its top-level row estimate."""
+        plan = self.build().explain(format='json')
+        try:
+            estimated_rows = json.loads(plan)[0]['Plan']['Plan Rows']
+        except (ValueError, KeyError, IndexError, TypeError):
+            estimated_rows = None
+        return {'estimated_rows': estimated_rows, 'plan': plan}
+
+    def estimate_count(self):
+        """Return the planner's row estimate without counting rows."""
+        return self.explain()['estimated_rows']
+
+    def log(self, label='crime query'):
+        """Log the applied filters, plus the query plan in diagnostics mode."""
+        logger.info(f"{label}: filters={self.applied} fingerprint={self.fingerprint()}")
+        if self.diagnostics:
+            try:
+                diagnostics = self.explain()
+                logger.info(f"{label}: estimated_rows={diagnostics['estimated_rows']} plan={diagnostics['plan']}")
+            except Exception as e:
+                logger.error(f"{label}: EXPLAIN failed: {e}")
+        return self
@@ -0,0 +1,126 @@
+"""
+In-process cache of small reference tables.
+
+Each worker process keeps categories, districts, neighborhoods and
+agencies in memory. Saving or deleting one of these rows clears the local
+copy and publishes the table's label on a Redis channel; a listener
+thread in every other process clears its copy on receipt. A timeout
+bounds staleness should a message be missed.
+
+Cached instances are shared: treat them as read-only.
+"""
+import logging
+import os
+import threading
+import time
+from django.apps import apps
+from django.conf import settings
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'crime_reference_invalidate'
+DEFAULT_REFERENCE_CACHE_TIMEOUT = 60 * 5
+LISTENER_RETRY_SECONDS = 5
+
+_listener_lock = threading.Lock()
+_listener_pid = None
+
+
+class ReferenceTable:
+    """Read-through, process-local copy of one model's rows, in default ordering."""
+
+    def __init__(self, label):
+        self.label = label
+        # (rows by pk, per-field indexes, load time), swapped as a whole so threads see a consistent copy.
+        self._state = None
+
+    @property
+    def model(self):
+        return apps.get_model(self.label)
+
+    def _load(self):
+        _ensure_listener()
+        timeout = getattr(settings, 'CRIME_REFERENCE_CACHE_TIMEOUT', DEFAULT_REFERENCE_CACHE_TIMEOUT)
+        state = self._state
+        if state is None or time.monotonic() - state[2] > timeout:
+            rows = {row.pk: row for row in self.model.objects.all()}
+            state = self._state = (rows, {}, time.monotonic())
+        return state
+
+    def all(self):
+        return list(self._load()[0].values())
+
+    def get(self, pk):
+        """Return the row with primary key ``pk``, or None."""
+        if pk is None:
+            return None
+        try:
+            return self._load()[0].get(int(pk))
+        except (TypeError, ValueError):
+            return None
+
+    def get_by(self, field, value):
+        """Return the first row (in default ordering) whose ``field`` equals ``value``, or None."""
+        rows, indexes, _ = self._load()
+        index = indexes.get(field)
+        if index is None:
+            index = {}
+            for row in rows.values():
+                index.setdefault(getattr(row, field), row)
+            indexes[field] = index
+        return index.get(value)
+
+    def clear(self):
+        self._state = None
+
+
+categories = ReferenceTable('crimes.CrimeCategory')
+districts = ReferenceTable('crimes.District')
+neighborhoods = ReferenceTable('crimes.Neighborhood')
+agencies = ReferenceTable('agencies.Agency')
+
+TABLES = {table.label.lower(): table for table in (categories, districts, neighborhoods, agencies)}
+
+
+def invalidate(label):
+    """Clear a table in this process and publish the invalidation to the others."""
+    label = label.lower()
+    table = TABLES.get(label)
+    if table is not None:
+        table.clear()
+    try:
+        get_redis_connection('default').publish(CHANNEL, label)
+    except Exception as e:
+        logger.warning(f"Could not publish reference invalidation for {label}: {e}")
+
+
+def _listen():
+    while True:
+        try:
+            pubsub = get_redis_connection('default').pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(CHANNEL)
+            # Anything published while unsubscribed is lost, so start from scratch.
+            for table in TABLES.values():
+                table.clear()
+            for message in pubsub.listen():
+                data = message.get('data')
+                label = data.decode('utf-8') if isinstance(data, bytes) else str(data)
+                table = TABLES.get(label)
+                if table is not None:
+                    table.clear()
+        except Exception as e:
+            logger.warning(f"Reference cache listener disconnected: {e}")
+            time.sleep(LISTENER_RETRY_SECONDS)
+
+
+def _ensure_listener():
+    """Start this process's invalidation listener thread (once per pid, so forks get their own)."""
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        _listener_pid = os.getpid()
+        threading.Thread(target=_listen, name='reference-cache-listener', daemon=True).start()
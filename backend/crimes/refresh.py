@@ -0,0 +1,127 @@
+"""
+Request tracking for proactive analytics cache refreshes.
+
+Functions decorated with :func:`refreshable` record each call (its
+arguments encoded as a JSON recipe) in hourly Redis sorted sets. The
+``refresh_analytics_cache`` command replays the most requested recipes
+shortly before their cache entries expire.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import time
+from functools import wraps
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from django_redis import get_redis_connection
+from rest_framework.views import APIView
+from .query import CrimeQueryBuilder
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SECONDS = 60 * 60
+
+# name -> single_flight-wrapped function
+REFRESHABLE = {}
+
+
+def _encode(value):
+    if isinstance(value, CrimeQueryBuilder):
+        return {'builder': value.applied}
+    if isinstance(value, datetime.date):
+        return {'date': value.isoformat()}
+    if isinstance(value, (list, tuple)):
+        return {'list': [_encode(item) for item in value]}
+    if isinstance(value, APIView):
+        return {'view': f'{type(value).__module__}.{type(value).__qualname__}'}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return {'value': value}
+    raise TypeError(f"Cannot encode refresh argument of type {type(value).__name__}")
+
+
+def _decode(encoded):
+    (kind, value), = encoded.items()
+    if kind == 'builder':
+        return CrimeQueryBuilder.from_applied(value)
+    if kind == 'date':
+        return datetime.date.fromisoformat(value)
+    if kind == 'list':
+        return tuple(_decode(item) for item in value)
+    if kind == 'view':
+        return import_string(value)()
+    return value
+
+
+def _hits_key(bucket):
+    return cache.make_key(f"crime_refresh_hits_{bucket}")
+
+
+def _recipes_key():
+    return cache.make_key('crime_refresh_recipes')
+
+
+def track(name, args):
+    """Count one request for ``name`` called with ``args``; failures are only logged."""
+    try:
+        recipe = json.dumps({'name': name, 'args': [_encode(arg) for arg in args]}, sort_keys=True)
+        member = f"{name}:{hashlib.sha1(recipe.encode('utf-8')).hexdigest()}"
+        bucket = int(time.time() // BUCKET_SECONDS)
+        pipe = get_redis_connection('default').pipeline()
+        pipe.zincrby(_hits_key(bucket), 1, member)
+        pipe.expire(_hits_key(bucket), BUCKET_SECONDS * 25)
+        pipe.hset(_recipes_key(), member, recipe)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not track analytics request {name}: {e}")
+
+
+def top_requests(window_hours=2, limit=50):
+    """Return ``[(member, hits)]`` for the most requested recipes over the last ``window_hours``."""
+    connection = get_redis_connection('default')
+    bucket = int(time.time() // BUCKET_SECONDS)
+    counts = {}
+    for offset in range(window_hours):
+        for member, hits in connection.zrange(_hits_key(bucket - offset), 0, -1, withscores=True):
+            member = member.decode('utf-8')
+            counts[member] = counts.get(member, 0) + hits
+    return sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def load_recipe(member):
+    """Return ``(function, args)`` for a tracked member, or None if it can no longer be replayed."""
+    recipe = get_redis_connection('default').hget(_recipes_key(), member)
+    if recipe is None:
+        return None
+    recipe = json.loads(recipe)
+    func = REFRESHABLE.get(recipe['name'])
+    if func is None:
+        return None
+    return func, [_decode(arg) for arg in recipe['args']]
+
+
+def prune_recipes(keep):
+    """Drop stored recipes whose members are not in ``keep``."""
+    connection = get_redis_connection('default')
+    stale = [member for member in connection.hkeys(_recipes_key()) if member.decode('utf-8') not in keep]
+    if stale:
+        connection.hdel(_recipes_key(), *stale)
+    return len(stale)
+
+
+def refreshable(name):
+    """
+    Register a :func:`~crimes.singleflight.single_flight` function for background refresh.
+
+    Its positional arguments must be CrimeQueryBuilders, dates, API views
+    (rebuilt with no arguments), JSON scalars or lists of these.
+    """
+    def decorator(func):
+        REFRESHABLE[name] = func
+
+        @wraps(func)
+        def wrapper(*args):
+            track(name, args)
+            return func(*args)
+        return wrapper
+    return decorator
@@ -0,0 +1,165 @@
+"""
+Incrementally maintained daily crime rollups.
+
+Every ``CrimeStatistic`` row with a status counts one day's crimes for a
+(category, district, neighborhood, agency, status) combination. Saving or
+deleting a crime upserts +1/-1 deltas into its rows in the same
+transaction (see ``crimes.signals``), bulk loaders call :func:`add_crimes`
+with the crimes they inserted, and :func:`rebuild` recomputes rows from
+the crimes table for backfills.
+
+Deleting a district or neighborhood clears the crimes' foreign key
+without signals and cascades to its rollups, so run
+``rebuild_crime_statistics`` afterwards.
+"""
+import logging
+from decimal import Decimal
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Crime, CrimeStatistic
+
+logger = logging.getLogger(__name__)
+
+# Crime columns identifying a rollup row, and the measures summed into it.
+DIMENSIONS = ('date', 'category_id', 'district_id', 'neighborhood_id', 'agency_id', 'status')
+MEASURES = ('count', 'violent_count', 'property_count', 'property_damage', 'arrests')
+
+# Crime columns a delta is computed from.
+SOURCE_FIELDS = DIMENSIONS + ('is_violent', 'property_loss', 'arrests_made')
+
+# CrimeQueryBuilder filters that rollups can answer, as CrimeStatistic lookups.
+ROLLUP_FILTERS = {
+    'agency': lambda value: Q(agency_id=value),
+    'status': lambda value: Q(status__in=value),
+    'crime_types': lambda value: Q(category__name__in=value),
+    'neighborhood': lambda value: Q(neighborhood_id=value),
+    'date_from': lambda value: Q(date__gte=value),
+    'date_to': lambda value: Q(date__lte=value),
+}
+
+UPSERT_BATCH_SIZE = 1000
+
+_TABLE = CrimeStatistic._meta.db_table
+# The conflict target matches the crimes_statistic_rollup_key unique index.
+_UPSERT_SQL = f"""
+INSERT INTO {_TABLE} ({', '.join(DIMENSIONS + MEASURES)}, created_at, updated_at)
+{{source}}
+ON CONFLICT (date, COALESCE(category_id, 0), COALESCE(district_id, 0), COALESCE(neighborhood_id, 0),
+             agency_id, COALESCE(status, ''))
+DO UPDATE SET {', '.join(f'{name} = {_TABLE}.{name} + EXCLUDED.{name}' for name in MEASURES)},
+    updated_at = EXCLUDED.updated_at
+"""
+
+
+def crime_delta(crime, sign=1):
+    """Return ``(dimensions, measures)`` adding (or with ``sign=-1`` removing) one crime, an instance or ``values()`` dict."""
+    get = crime.get if isinstance(crime, dict) else lambda name: getattr(crime, name)
+    loss = get('property_loss')
+    loss = Decimal(0) if loss is None else Decimal(str(loss))
+    return (
+        tuple(get(name) for name in DIMENSIONS),
+        (sign, sign * bool(get('is_violent')), sign * (get('property_loss') is not None),
+         sign * loss, sign * bool(get('arrests_made'))),
+    )
+
+
+def apply_deltas(deltas):
+    """Sum ``(dimensions, measures)`` deltas per row and upsert them. Returns the number of rows touched."""
+    totals = {}
+    for key, measures in deltas:
+        current = totals.get(key)
+        totals[key] = measures if current is None else tuple(a + b for a, b in zip(current, measures))
+    # A fixed row order keeps concurrent upserts from deadlocking on each other.
+    rows = sorted(((key, measures) for key, measures in totals.items() if any(measures)), key=lambda row: repr(row[0]))
+
+    now = timezone.now()
+    width = len(DIMENSIONS) + len(MEASURES) + 2
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[start:start + UPSERT_BATCH_SIZE]
+            values = ', '.join(['(' + ', '.join(['%s'] * width) + ')'] * len(batch))
+            params = [value for key, measures in batch for value in (*key, *measures, now, now)]
+            cursor.execute(_UPSERT_SQL.format(source=f'VALUES {values}'), params)
+    return len(rows)
+
+
+def add_crimes(queryset, sign=1):
+    """
+    Add (or with ``sign=-1`` remove) the crimes of ``queryset`` in one statement.
+
+    The crimes are grouped into rollup rows by the database, so bulk
+    loaders can pass ``Crime.objects.filter(pk__in=...)`` or any other
+    crime queryset without loading rows. Returns the number of rows touched.
+    """
+    grouped = (
+        queryset.order_by()
+        .values(*DIMENSIONS)
+        .annotate(
+            rollup_count=Count('id'),
+            rollup_violent=Count('id', filter=Q(is_violent=True)),
+            rollup_property=Count('property_loss'),
+            rollup_damage=Coalesce(Sum('property_loss'), Value(Decimal(0)), output_field=DecimalField()),
+            rollup_arrests=Count('id', filter=Q(arrests_made=True)),
+        )
+    )
+    sql, params = grouped.query.sql_with_params()
+    measures = ', '.join(f'%s * rollup.{alias}' for alias in (
+        'rollup_count', 'rollup_violent', 'rollup_property', 'rollup_damage', 'rollup_arrests'
+    ))
+    source = (
+        f"SELECT {', '.join(f'rollup.{name}' for name in DIMENSIONS)}, {measures}, %s, %s "
+        f"FROM ({sql}) AS rollup ORDER BY {', '.join(f'rollup.{name}' for name in DIMENSIONS)}"
+    )
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(_UPSERT_SQL.format(source=source), [sign] * len(MEASURES) + [now, now, *params])
+        return cursor.rowcount
+
+
+def rebuild(start_date=None, end_date=None, agency_id=None):
+    """
+    Recompute the rollups (optionally of a date range and agency) from the crimes table.
+
+    Returns ``(rows deleted, rows written)``.
+    """
+    crimes = Crime.objects.all()
+    rollups = CrimeStatistic.objects.filter(status__isnull=False)
+    if start_date:
+        crimes, rollups = crimes.filter(date__gte=start_date), rollups.filter(date__gte=start_date)
+    if end_date:
+        crimes, rollups = crimes.filter(date__lte=end_date), rollups.filter(date__lte=end_date)
+    if agency_id is not None:
+        crimes, rollups = crimes.filter(agency_id=agency_id), rollups.filter(agency_id=agency_id)
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # Concurrent deltas wait until the recomputed rows commit, so none is lost or counted twice.
+            cursor.execute(f'LOCK TABLE {_TABLE} IN SHARE ROW EXCLUSIVE MODE')
+        deleted, _ = rollups.delete()
+        written = add_crimes(crimes)
+    return deleted, written
+
+
+def rollup_queryset(builder):
+    """Return the rollup rows matching a CrimeQueryBuilder, or None if its filters need raw crimes."""
+    if not getattr(settings, 'CRIME_STATS_USE_ROLLUPS', True):
+        return None
+    q = Q()
+    for name, value in builder.applied:
+        to_q = ROLLUP_FILTERS.get(name)
+        if to_q is None:
+            return None
+        q &= to_q(value)
+    return CrimeStatistic.objects.filter(q, status__isnull=False)
+
+
+def analytics_source(builder, label='crime analytics query'):
+    """Return ``(queryset, rollup)``: the builder's rollup rows if they can answer it, else its crimes."""
+    rollups = rollup_queryset(builder)
+    if rollups is not None:
+        logger.info(f"{label}: reading rollups, filters={builder.applied}")
+        return rollups, True
+    return builder.log(label).build(), False
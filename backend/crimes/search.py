@@ -0,0 +1,57 @@
+"""
+Keyword search for crimes app.
+"""
+import re
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, Q
+from rest_framework import filters
+
+# Text search configuration used by the crimes_crime search_vector trigger.
+SEARCH_CONFIG = 'english'
+SEARCH_MODES = ('plain', 'phrase', 'prefix', 'websearch')
+
+
+def search_query(text, mode='plain'):
+    """
+    Return a SearchQuery for ``text``.
+
+    ``plain`` ANDs the words, ``phrase`` requires them in order,
+    ``websearch`` accepts quotes, ``or`` and ``-``, and ``prefix`` matches
+    words starting with each term (``burg`` finds ``burglary``).
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Invalid search mode: {mode}")
+    if mode == 'prefix':
+        terms = re.findall(r'[^\W_]+', text)
+        if terms:
+            return SearchQuery(' & '.join(f'{term}:*' for term in terms), config=SEARCH_CONFIG, search_type='raw')
+        mode = 'plain'
+    return SearchQuery(text, config=SEARCH_CONFIG, search_type=mode)
+
+
+def keyword_q(text, mode='plain'):
+    """
+    Match ``text`` against the indexed search columns.
+
+    Descriptions and addresses go through the tsvector; addresses and case
+    numbers also match as substrings through their trigram indexes.
+    """
+    return (
+        Q(search_vector=search_query(text, mode))
+        | Q(block_address__icontains=text)
+        | Q(case_number__icontains=text)
+    )
+
+
+def search_rank(query):
+    """Return a relevance expression for ordering matches of ``query``."""
+    return SearchRank(F('search_vector'), query)
+
+
+class CrimeSearchFilter(filters.SearchFilter):
+    """SearchFilter that matches each ``search`` term through :func:`keyword_q`."""
+
+    def filter_queryset(self, request, queryset, view):
+        for term in self.get_search_terms(request):
+            queryset = queryset.filter(keyword_q(term))
+        return queryset
@@ -10,6 +10,11 @@ from .models import (
 from django.contrib.gis.geos import Point
 from rest_framework_gis.fields import GeometryField
 from rest_framework_gis.serializers import GeoModelSerializer as GeoJSONSerializer
+from agencies.models import Agency
+from .fields import PrerenderedGeometryField, ReferencePrimaryKeyRelatedField
+from .functions import Latitude, Longitude
+from . import reference
+from .search import SEARCH_MODES
 
 
 class CrimeCategorySerializer(serializers.ModelSerializer):
@@ -22,6 +27,7 @@ class CrimeCategorySerializer(serializers.ModelSerializer):
 
 class DistrictSerializer(GeoFeatureModelSerializer):
     """Serializer for the District model."""
+    location = PrerenderedGeometryField(read_only=True)
     latitude = serializers.SerializerMethodField()
     longitude = serializers.SerializerMethodField()
 
@@ -38,6 +44,7 @@ class DistrictSerializer(GeoFeatureModelSerializer):
 
 class NeighborhoodSerializer(GeoFeatureModelSerializer):
     """Serializer for the Neighborhood model."""
+    location = PrerenderedGeometryField(read_only=True)
     latitude = serializers.SerializerMethodField()
     longitude = serializers.SerializerMethodField()
 
@@ -82,6 +89,83 @@ class CrimeListSerializer(serializers.ModelSerializer):
     def get_district(self, obj):
         return obj.district.name if obj.district else 'Unknown'
 
+
+class CrimeListRowSerializer:
+    """
+    Column-projection equivalent of ``CrimeListSerializer(many=True)``.
+
+    ``project()`` selects only the listed columns with ``values()``, joining
+    category and district names and reading coordinates with ``ST_X``/``ST_Y``,
+    so no model instances or GEOS geometries are built. ``data`` maps each
+    row with a mapper compiled once from CrimeListSerializer's own fields,
+    producing the same output.
+    """
+
+    columns = (
+        'id', 'case_number', 'category__name', 'date', 'time', 'description',
+        'block_address', 'district__name', 'status', 'is_violent', 'property_loss',
+    )
+    _mapper = None
+
+    def __init__(self, queryset, projected=False):
+        self.queryset = queryset
+        self.projected = projected
+
+    @classmethod
+    def project(cls, queryset):
+        """Return ``queryset`` as ``values()`` rows holding only the list columns."""
+        return queryset.values(
+            *cls.columns,
+            location_lng=Longitude('location'),
+            location_lat=Latitude('location'),
+        )
+
+    @classmethod
+    def mapper(cls):
+        """Return the ``(output key, row -> value)`` pairs, compiling them on first use."""
+        if cls._mapper is None:
+            fields = CrimeListSerializer().fields
+
+            def column(name):
+                return lambda row: row[name]
+
+            def formatted(name):
+                to_representation = fields[name].to_representation
+                return lambda row: None if row[name] is None else to_representation(row[name])
+
+            def named(name):
+                return lambda row: 'Unknown' if row[name] is None else row[name]
+
+            def location(row):
+                if row['location_lng'] is None:
+                    return None
+                return {'type': 'Point', 'coordinates': [row['location_lng'], row['location_lat']]}
+
+            cls._mapper = (
+                ('id', column('id')),
+                ('case_number', column('case_number')),
+                ('category', named('category__name')),
+                ('date', formatted('date')),
+                ('time', formatted('time')),
+                ('description', column('description')),
+                ('block_address', column('block_address')),
+                ('district', named('district__name')),
+                ('location', location),
+                ('status', column('status')),
+                ('is_violent', column('is_violent')),
+                ('property_loss', formatted('property_loss')),
+            )
+        return cls._mapper
+
+    @property
+    def data(self):
+        if not hasattr(self, '_data'):
+            rows = self.queryset if self.projected else self.project(self.queryset)
+            mapper = self.mapper()
+            self._data = [{key: value(row) for key, value in mapper} for row in rows]
+        return self._data
+
+
 class CrimeDetailSerializer(GeoFeatureModelSerializer):
     """Serializer for detailed crime information."""
 
@@ -89,6 +173,7 @@ class CrimeDetailSerializer(GeoFeatureModelSerializer):
     district_name = serializers.CharField(source='district.name', read_only=True)
     neighborhood_name = serializers.CharField(source='neighborhood.name', read_only=True)
     agency_name = serializers.CharField(source='agency.name', read_only=True)
+    location = PrerenderedGeometryField(read_only=True)
     latitude = serializers.SerializerMethodField()
     longitude = serializers.SerializerMethodField()
     media = CrimeMediaSerializer(many=True, read_only=True)
@@ -119,7 +204,14 @@ class CrimeCreateSerializer(serializers.ModelSerializer):
 
     latitude = serializers.FloatField(write_only=True)
     longitude = serializers.FloatField(write_only=True)
-    category = serializers.PrimaryKeyRelatedField(queryset=CrimeCategory.objects.all())
+    category = ReferencePrimaryKeyRelatedField(table=reference.categories, queryset=CrimeCategory.objects.all())
+    district = ReferencePrimaryKeyRelatedField(
+        table=reference.districts, queryset=District.objects.all(), allow_null=True, required=False
+    )
+    neighborhood = ReferencePrimaryKeyRelatedField(
+        table=reference.neighborhoods, queryset=Neighborhood.objects.all(), allow_null=True, required=False
+    )
+    agency = ReferencePrimaryKeyRelatedField(table=reference.agencies, queryset=Agency.objects.all())
 
     class Meta:
         model = Crime
@@ -150,8 +242,8 @@ class CrimeStatisticSerializer(serializers.ModelSerializer):
         model = CrimeStatistic
         fields = (
             'id', 'date', 'category', 'category_name', 'district', 'district_name',
-            'neighborhood', 'neighborhood_name', 'agency', 'agency_name',
-            'count', 'violent_count', 'property_damage', 'arrests'
+            'neighborhood', 'neighborhood_name', 'agency', 'agency_name', 'status',
+            'count', 'violent_count', 'property_count', 'property_damage', 'arrests'
         )
 
 
@@ -161,9 +253,10 @@ class CrimeHeatmapSerializer(serializers.Serializer):
     lat = serializers.FloatField()
     lng = serializers.FloatField()
     intensity = serializers.FloatField()
+    count = serializers.IntegerField(required=False)
 
     class Meta:
-        fields = ('lat', 'lng', 'intensity')
+        fields = ('lat', 'lng', 'intensity', 'count')
 
 
 class CrimeSearchSerializer(serializers.Serializer):
@@ -179,13 +272,16 @@ class CrimeSearchSerializer(serializers.Serializer):
     start_date = serializers.DateField(required=False)
     end_date = serializers.DateField(required=False)
     keywords = serializers.CharField(required=False)
+    search_mode = serializers.ChoiceField(choices=SEARCH_MODES, default='plain')
+    order = serializers.ChoiceField(choices=('relevance', 'date'), required=False)
     is_violent = serializers.BooleanField(required=False)
     status = serializers.CharField(required=False)
 
     class Meta:
         fields = (
             'latitude', 'longitude', 'radius', 'crime_types',
-            'start_date', 'end_date', 'keywords', 'is_violent', 'status'
+            'start_date', 'end_date', 'keywords', 'search_mode', 'order',
+            'is_violent', 'status'
         )
 
 
@@ -0,0 +1,68 @@
+"""
+Signal handlers for crimes app.
+"""
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from agencies.models import Agency
+from .cache import bump_versions_on_commit
+from .models import Crime, CrimeCategory, District, Neighborhood
+from .reference import invalidate
+from .rollups import SOURCE_FIELDS, apply_deltas, crime_delta
+from .tilestore import mark_dirty
+
+
+@receiver(post_save, sender=Crime)
+@receiver(post_delete, sender=Crime)
+def invalidate_crime_analytics(sender, instance, **kwargs):
+    """Invalidate cached analytics for the crime's agency after it changes."""
+    bump_versions_on_commit(instance.agency_id)
+
+
+@receiver(pre_save, sender=Crime)
+def remember_previous_values(sender, instance, **kwargs):
+    """Keep the stored values of an existing crime, so its old rollup row and tiles can be updated."""
+    instance._previous_values = None
+    if not instance._state.adding:
+        instance._previous_values = Crime.objects.filter(pk=instance.pk).values(*SOURCE_FIELDS, 'geohash').first()
+
+
+@receiver(post_save, sender=Crime)
+def update_rollups_on_save(sender, instance, **kwargs):
+    """Move the crime's contribution from its previous rollup row to its current one."""
+    deltas = [crime_delta(instance)]
+    previous = getattr(instance, '_previous_values', None)
+    if previous is not None:
+        deltas.append(crime_delta(previous, sign=-1))
+    apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=Crime)
+def update_rollups_on_delete(sender, instance, origin=None, **kwargs):
+    """Remove a deleted crime from the rollups, unless its agency or category is going (their rollups cascade)."""
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin is None or origin_model is Crime:
+        apply_deltas([crime_delta(instance, sign=-1)])
+
+
+@receiver(post_save, sender=Crime)
+@receiver(post_delete, sender=Crime)
+def mark_tiles_dirty(sender, instance, **kwargs):
+    """Queue the pre-rendered tiles around the crime's current and previous location for re-rendering."""
+    previous = getattr(instance, '_previous_values', None) or {}
+    geohashes = (instance.geohash, previous.get('geohash'))
+    transaction.on_commit(lambda: mark_dirty(*geohashes))
+
+
+@receiver(post_save, sender=CrimeCategory)
+@receiver(post_delete, sender=CrimeCategory)
+@receiver(post_save, sender=District)
+@receiver(post_delete, sender=District)
+@receiver(post_save, sender=Neighborhood)
+@receiver(post_delete, sender=Neighborhood)
+@receiver(post_save, sender=Agency)
+@receiver(post_delete, sender=Agency)
+def invalidate_reference_data(sender, instance, **kwargs):
+    """Drop the in-process reference copies of the changed table in every worker."""
+    transaction.on_commit(lambda: invalidate(sender._meta.label))
@@ -0,0 +1,155 @@
+"""
+Single-flight cache fills for expensive analytics.
+"""
+import logging
+import time
+import uuid
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from .cache import analytics_timeout
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCK_TIMEOUT = 30
+DEFAULT_WAIT = 5.0
+DEFAULT_POLL_INTERVAL = 0.1
+DEFAULT_STALE_TIMEOUT = 60 * 60 * 24
+
+METRICS = ('hits', 'fills', 'stale_serves', 'lock_waits', 'wait_timeouts')
+
+# Deletes a lock only if it still holds our token, so an expired lock taken over by another worker survives.
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _metric_key(name, metric):
+    return f"crime_singleflight_{name}_{metric}"
+
+
+def record_metric(name, metric):
+    """Increment a single-flight counter for ``name``."""
+    key = _metric_key(name, metric)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def single_flight_metrics(name):
+    """Return the single-flight counters recorded for ``name``."""
+    values = cache.get_many([_metric_key(name, metric) for metric in METRICS])
+    return {metric: values.get(_metric_key(name, metric), 0) for metric in METRICS}
+
+
+def acquire_lock(lock_key):
+    """Take the fill lock for ``lock_key``; return its token, or None if another worker holds it."""
+    token = uuid.uuid4().hex
+    lock_timeout = getattr(settings, 'CRIME_SINGLE_FLIGHT_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT)
+    if get_redis_connection('default').set(cache.make_key(lock_key), token, nx=True, ex=lock_timeout):
+        return token
+    return None
+
+
+def release_lock(lock_key, token):
+    """Release the fill lock for ``lock_key`` if it is still held with ``token``."""
+    get_redis_connection('default').eval(RELEASE_LOCK_SCRIPT, 1, cache.make_key(lock_key), token)
+
+
+def get_or_compute(name, key, compute, timeout=None, stale_key=None):
+    """
+    Return the cached value for ``key``, computing it in at most one worker.
+
+    On a miss the caller takes a short token lock in Redis and fills the
+    key. Callers that lose the race serve the last value stored under
+    ``stale_key`` if there is one, otherwise poll for the fill for up to
+    ``CRIME_SINGLE_FLIGHT_WAIT`` seconds before computing it themselves.
+    """
+    value = cache.get(key)
+    if value is not None:
+        record_metric(name, 'hits')
+        return value
+
+    timeout = analytics_timeout() if timeout is None else timeout
+    lock_key = f"{key}_lock"
+    token = acquire_lock(lock_key)
+    if token is None:
+        if stale_key:
+            value = cache.get(stale_key)
+            if value is not None:
+                record_metric(name, 'stale_serves')
+                return value
+
+        record_metric(name, 'lock_waits')
+        deadline = time.monotonic() + getattr(settings, 'CRIME_SINGLE_FLIGHT_WAIT', DEFAULT_WAIT)
+        while time.monotonic() < deadline:
+            time.sleep(DEFAULT_POLL_INTERVAL)
+            value = cache.get(key)
+            if value is not None:
+                return value
+        record_metric(name, 'wait_timeouts')
+        logger.warning(f"Single-flight wait for {key} timed out; computing without the lock")
+        return compute()
+
+    try:
+        return _store(name, key, compute(), timeout, stale_key)
+    finally:
+        release_lock(lock_key, token)
+
+
+def _store(name, key, value, timeout, stale_key):
+    cache.set(key, value, timeout=timeout)
+    if stale_key:
+        stale_timeout = getattr(settings, 'CRIME_STALE_CACHE_TIMEOUT', DEFAULT_STALE_TIMEOUT)
+        cache.set(stale_key, value, timeout=timeout + stale_timeout)
+    record_metric(name, 'fills')
+    return value
+
+
+def refill(name, key, compute, timeout=None, stale_key=None):
+    """
+    Recompute and store ``key`` ahead of expiry.
+
+    Returns False without computing if another worker holds the fill lock.
+    """
+    timeout = analytics_timeout() if timeout is None else timeout
+    lock_key = f"{key}_lock"
+    token = acquire_lock(lock_key)
+    if token is None:
+        return False
+    try:
+        _store(name, key, compute(), timeout, stale_key)
+        return True
+    finally:
+        release_lock(lock_key, token)
+
+
+def single_flight(name, key_func, timeout=None):
+    """
+    Decorate a function whose result is cached with single-flight fills.
+
+    ``key_func`` receives the function's arguments and returns a
+    ``(key, stale_key)`` pair; ``stale_key`` may be None to disable stale
+    serves. Counters are recorded under ``name``. The wrapper also exposes
+    ``cache_keys(*args)`` and ``refill(*args)`` for background refreshes.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key, stale_key = key_func(*args, **kwargs)
+            return get_or_compute(name, key, lambda: func(*args, **kwargs), timeout, stale_key)
+
+        def refill_wrapper(*args, **kwargs):
+            key, stale_key = key_func(*args, **kwargs)
+            return refill(name, key, lambda: func(*args, **kwargs), timeout, stale_key)
+
+        wrapper.cache_keys = key_func
+        wrapper.refill = refill_wrapper
+        return wrapper
+    return decorator
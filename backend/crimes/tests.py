@@ -0,0 +1,389 @@
+from datetime import date, time
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.db.models import Count
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django_redis import get_redis_connection
+from rest_framework.test import APIClient
+
+from agencies.models import Agency
+from .aggregates import time_series, window_stats
+from .models import Crime, CrimeCategory, CrimeStatistic
+from .pagination import MAX_PAGE_SIZE, _after, encode_cursor, keyset_paginate
+from .query import PUBLIC_STATUSES, CrimeQueryBuilder
+from .reference import TABLES
+from .singleflight import acquire_lock, get_or_compute, refill, release_lock
+
+User = get_user_model()
+
+
+def clear_reference_tables():
+    # Commit hooks never run inside TestCase, so drop the process-local copies by hand.
+    for table in TABLES.values():
+        table.clear()
+
+
+class CrimeQueryBuilderTests(SimpleTestCase):
+    """Canonical filters and fingerprints."""
+
+    def test_applied_with_single_and_multiple_statuses(self):
+        builder = CrimeQueryBuilder().status(PUBLIC_STATUSES).status('solved')
+        self.assertEqual(builder.applied, [
+            ['status', ['closed', 'reported', 'solved']],
+            ['status', ['solved']],
+        ])
+        self.assertEqual(len(builder.fingerprint()), 40)
+
+    def test_applied_with_mixed_value_types(self):
+        builder = (
+            CrimeQueryBuilder()
+            .status('solved').agency(3).crime_types(['Theft', 'Arson'])
+            .date_range('2024-01-01', '2024-02-01').is_violent(True).with_location()
+        )
+        names = [name for name, _ in builder.applied]
+        self.assertEqual(sorted(names), sorted(['status', 'agency', 'crime_types', 'date_from', 'date_to',
+                                                'is_violent', 'has_location']))
+        self.assertEqual(builder.fingerprint(), builder.fingerprint())
+
+    def test_single_status_matches_one_element_list(self):
+        self.assertEqual(
+            CrimeQueryBuilder().status('solved').fingerprint(),
+            CrimeQueryBuilder().status(['solved']).fingerprint(),
+        )
+
+    def test_fingerprint_ignores_filter_order(self):
+        first = CrimeQueryBuilder().agency(1).status(['solved', 'closed']).crime_types(['Theft'])
+        second = CrimeQueryBuilder().crime_types(['Theft']).status(['closed', 'solved']).agency(1)
+        self.assertEqual(first.fingerprint(), second.fingerprint())
+        self.assertNotEqual(first.fingerprint(), first.fingerprint(page=2))
+
+    def test_from_applied_round_trip(self):
+        builder = CrimeQueryBuilder().status(PUBLIC_STATUSES).status('solved').within(-1.28, 36.82, 2)
+        rebuilt = CrimeQueryBuilder.from_applied(builder.applied)
+        self.assertEqual(rebuilt.applied, builder.applied)
+        self.assertEqual(rebuilt.fingerprint(), builder.fingerprint())
+
+
+class CrimeSearchTests(TestCase):
+    """The search action for users who only see public statuses."""
+
+    def setUp(self):
+        clear_reference_tables()
+        agency = Agency.objects.create(name='Test Police')
+        category = CrimeCategory.objects.create(name='Theft', severity_level=3)
+        for case_number, crime_status in (('T-1', 'solved'), ('T-2', 'reported'), ('T-3', 'under_investigation')):
+            Crime.objects.create(
+                case_number=case_number,
+                category=category,
+                description='Bicycle theft',
+                date=date(2024, 1, 1),
+                status=crime_status,
+                location=Point(36.82, -1.28, srid=4326),
+                block_address='Moi Avenue',
+                agency=agency,
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('viewer', password='viewer-password'))
+        self.url = reverse('crimes:crimes-search')
+
+    def search(self, **data):
+        return self.client.post(self.url, {'latitude': -1.28, 'longitude': 36.82, 'radius': 1, **data}, format='json')
+
+    def test_status_filter(self):
+        response = self.search(status='solved')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['case_number'] for row in response.data['results']], ['T-1'])
+
+    def test_status_filter_cannot_reach_private_statuses(self):
+        response = self.search(status='under_investigation')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+
+    def test_without_status_filter(self):
+        response = self.search()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(row['case_number'] for row in response.data['results']), ['T-1', 'T-2'])
+
+
+class MapParameterTests(TestCase):
+    """Bad map parameters are rejected before any query runs."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('mapper', password='mapper-password'))
+
+    def test_heatmap_rejects_unknown_mode(self):
+        response = self.client.get(reverse('crimes:crimes-heatmap'), {'mode': 'hexagons'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_heatmap_rejects_bad_zoom(self):
+        for mode in ('points', 'grid'):
+            for zoom in ('abc', '-1', '99'):
+                response = self.client.get(reverse('crimes:crimes-heatmap'), {'mode': mode, 'zoom': zoom})
+                self.assertEqual(response.status_code, 400, (mode, zoom))
+
+    def test_clusters_rejects_bad_dates(self):
+        for dates in ({'start_date': 'yesterday'}, {'end_date': '2024-13-01'}):
+            response = self.client.get(reverse('crimes:crimes-clusters'), {'bbox': '36,-2,37,-1', 'zoom': 5, **dates})
+            self.assertEqual(response.status_code, 400, dates)
+
+    def test_clusters_rejects_bad_zoom(self):
+        for zoom in ('abc', '-1', '99'):
+            response = self.client.get(reverse('crimes:crimes-clusters'), {'bbox': '36,-2,37,-1', 'zoom': zoom})
+            self.assertEqual(response.status_code, 400, zoom)
+
+
+class CrimeStatisticEndpointTests(TestCase):
+    """Summary rows and daily rollups are served by separate endpoints."""
+
+    def setUp(self):
+        agency = Agency.objects.create(name='Test Police')
+        CrimeStatistic.objects.create(date=date(2024, 1, 1), agency=agency, count=30)
+        CrimeStatistic.objects.create(date=date(2024, 1, 1), agency=agency, status='solved', count=10)
+        CrimeStatistic.objects.create(date=date(2024, 1, 1), agency=agency, status='reported', count=20)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('analyst', password='analyst-password'))
+
+    def counts(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        rows = response.data['results'] if isinstance(response.data, dict) else response.data
+        return sorted(row['count'] for row in rows)
+
+    def test_statistics_only_lists_summaries(self):
+        self.assertEqual(self.counts(reverse('crimes:statistics-list')), [30])
+
+    def test_rollups_only_list_daily_rows(self):
+        self.assertEqual(self.counts(reverse('crimes:rollups-list')), [10, 20])
+
+    def test_rollups_filter_by_status(self):
+        self.assertEqual(self.counts(reverse('crimes:rollups-list'), status='solved'), [10])
+
+
+def make_crime(agency, category, case_number, crime_date, crime_time=None, **fields):
+    return Crime.objects.create(
+        case_number=case_number,
+        category=category,
+        description='Test crime',
+        date=crime_date,
+        time=crime_time,
+        location=Point(36.82, -1.28, srid=4326),
+        block_address='Moi Avenue',
+        agency=agency,
+        **fields
+    )
+
+
+class KeysetPaginationTests(TestCase):
+    """Walking cursor pages visits every crime once, in (date, time, id) order."""
+
+    def setUp(self):
+        clear_reference_tables()
+        agency = Agency.objects.create(name='Test Police')
+        category = CrimeCategory.objects.create(name='Theft', severity_level=3)
+        times = [None, time(9, 0), None, time(9, 0), time(18, 30), None, time(0, 0)]
+        self.crimes = [
+            make_crime(agency, category, f'K-{index}', date(2024, 1, 1 + index % 2), crime_time)
+            for index, crime_time in enumerate(times)
+        ]
+
+    def expected(self, descending):
+        # PostgreSQL puts NULL times first when descending and last when ascending.
+        key = lambda crime: (crime.date, crime.time is None, crime.time or time.min, crime.pk)
+        return [crime.pk for crime in sorted(self.crimes, key=key, reverse=descending)]
+
+    def walk(self, descending, limit):
+        seen, cursor = [], None
+        while True:
+            rows, cursor = keyset_paginate(Crime.objects.all(), cursor, limit, descending)
+            seen.extend(row.pk for row in rows)
+            if cursor is None:
+                return seen
+
+    def test_descending_pages(self):
+        for limit in (1, 2, 3, 10):
+            self.assertEqual(self.walk(True, limit), self.expected(True), limit)
+
+    def test_ascending_pages(self):
+        for limit in (1, 2, 3, 10):
+            self.assertEqual(self.walk(False, limit), self.expected(False), limit)
+
+    def test_page_after_every_row(self):
+        # Covers cursors on NULL and non-NULL times, in both directions.
+        for descending in (True, False):
+            order = self.expected(descending)
+            for crime in self.crimes:
+                rows, _ = keyset_paginate(Crime.objects.all(), encode_cursor(crime), 100, descending)
+                self.assertEqual([row.pk for row in rows], order[order.index(crime.pk) + 1:], (descending, crime.time))
+
+    def test_cursor_predicate_bounds_the_date(self):
+        crime = self.crimes[0]
+        for descending, bound in ((True, '<='), (False, '>=')):
+            query = str(Crime.objects.filter(_after((crime.date, crime.time, crime.pk), descending)).query)
+            self.assertIn(f'"crimes_crime"."date" {bound}', query)
+
+    def test_invalid_limit(self):
+        for limit in (0, -1, MAX_PAGE_SIZE + 1):
+            with self.assertRaises(ValueError, msg=limit):
+                keyset_paginate(Crime.objects.all(), None, limit)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            keyset_paginate(Crime.objects.all(), 'not-a-cursor', 2)
+
+
+class AggregateTests(TestCase):
+    """The grouped aggregates match the per-window and per-month counting loops they replaced."""
+
+    def setUp(self):
+        clear_reference_tables()
+        self.agency = Agency.objects.create(name='Test Police')
+        theft = CrimeCategory.objects.create(name='Theft', severity_level=3)
+        assault = CrimeCategory.objects.create(name='Assault', severity_level=8)
+        burglary = CrimeCategory.objects.create(name='Burglary', severity_level=5)
+        rows = [
+            (theft, date(2024, 1, 5), {'property_loss': Decimal('120.50')}),
+            (theft, date(2024, 1, 31), {'arrests_made': True}),
+            (assault, date(2024, 1, 20), {}),
+            (theft, date(2024, 2, 1), {'property_loss': Decimal('15.00'), 'arrests_made': True}),
+            (theft, date(2024, 2, 14), {}),
+            (theft, date(2024, 3, 2), {'status': 'solved'}),
+            (assault, date(2024, 3, 9), {'arrests_made': True}),
+            (assault, date(2024, 3, 31), {}),
+            (burglary, date(2024, 3, 15), {'property_loss': Decimal('900.00')}),
+            (burglary, date(2024, 4, 1), {}),
+        ]
+        for index, (category, crime_date, fields) in enumerate(rows):
+            make_crime(self.agency, category, f'A-{index}', crime_date, **fields)
+        self.crimes = Crime.objects.filter(agency=self.agency)
+        self.rollups = CrimeStatistic.objects.filter(agency=self.agency, status__isnull=False)
+
+    def legacy_window_stats(self, current_range, previous_range):
+        current = self.crimes.filter(date__gte=current_range[0], date__lte=current_range[1])
+        previous = self.crimes.filter(date__gte=previous_range[0], date__lte=previous_range[1])
+        return {
+            'total_crimes': current.count(),
+            'previous_total_crimes': previous.count(),
+            'violent_crimes': current.filter(is_violent=True).count(),
+            'previous_violent_crimes': previous.filter(is_violent=True).count(),
+            'property_crimes': current.filter(property_loss__isnull=False).count(),
+            'previous_property_crimes': previous.filter(property_loss__isnull=False).count(),
+            'arrests': current.filter(arrests_made=True).count(),
+            'previous_arrests': previous.filter(arrests_made=True).count(),
+            'top_crimes': list(
+                current.values('category__name').annotate(count=Count('id')).order_by('-count')[:10]
+            ),
+        }
+
+    def legacy_time_series(self, start_date, end_date):
+        series = []
+        current_date = start_date.replace(day=1)
+        while current_date <= end_date:
+            next_month = current_date + relativedelta(months=1)
+            month_crimes = self.crimes.filter(date__gte=current_date, date__lt=next_month)
+            series.append({
+                'period': current_date,
+                'total': month_crimes.count(),
+                'violent': month_crimes.filter(is_violent=True).count(),
+                'property': month_crimes.filter(property_loss__isnull=False).count(),
+                'arrests': month_crimes.filter(arrests_made=True).count(),
+            })
+            current_date = next_month
+        return series
+
+    def test_window_stats_matches_legacy_counts(self):
+        windows = ((date(2024, 2, 1), date(2024, 3, 31)), (date(2024, 1, 1), date(2024, 1, 31)))
+        expected = self.legacy_window_stats(*windows)
+        self.assertEqual(window_stats(self.crimes, *windows), expected)
+        self.assertEqual(window_stats(self.rollups, *windows, rollup=True), expected)
+
+    def test_window_stats_with_empty_window(self):
+        windows = ((date(2025, 1, 1), date(2025, 1, 31)), (date(2024, 1, 1), date(2024, 1, 31)))
+        stats = window_stats(self.crimes, *windows)
+        self.assertEqual(stats, self.legacy_window_stats(*windows))
+        self.assertEqual(stats['top_crimes'], [])
+
+    def test_time_series_matches_legacy_loop(self):
+        start_date, end_date = date(2023, 12, 1), date(2024, 5, 31)
+        expected = self.legacy_time_series(start_date, end_date)
+        self.assertEqual(time_series(self.crimes, start_date, end_date), expected)
+        self.assertEqual(time_series(self.rollups, start_date, end_date, rollup=True), expected)
+
+    def test_time_series_fills_empty_days(self):
+        series = time_series(self.crimes, date(2024, 3, 30), date(2024, 4, 2), granularity='day', metrics=['total'])
+        self.assertEqual(series, [
+            {'period': date(2024, 3, 30), 'total': 0},
+            {'period': date(2024, 3, 31), 'total': 1},
+            {'period': date(2024, 4, 1), 'total': 1},
+            {'period': date(2024, 4, 2), 'total': 0},
+        ])
+
+
+class SingleFlightLockTests(SimpleTestCase):
+    """A worker only ever releases the fill lock it still holds."""
+
+    key = 'crime_singleflight_test'
+    lock_key = f'{key}_lock'
+
+    def setUp(self):
+        self.redis = get_redis_connection('default')
+        self.addCleanup(cache.delete_many, [self.key, self.lock_key])
+
+    def take_over_lock(self):
+        # What another worker does once our lock has expired.
+        self.redis.set(cache.make_key(self.lock_key), 'other-worker')
+        return 'value'
+
+    def assert_lock_kept(self):
+        self.assertEqual(self.redis.get(cache.make_key(self.lock_key)), b'other-worker')
+
+    def test_lock_is_exclusive_until_released(self):
+        token = acquire_lock(self.lock_key)
+        self.assertIsNotNone(token)
+        self.assertIsNone(acquire_lock(self.lock_key))
+        release_lock(self.lock_key, token)
+        self.assertIsNotNone(acquire_lock(self.lock_key))
+
+    def test_release_keeps_a_lock_taken_over_by_another_worker(self):
+        token = acquire_lock(self.lock_key)
+        self.take_over_lock()
+        release_lock(self.lock_key, token)
+        self.assert_lock_kept()
+
+    def test_slow_fill_keeps_the_next_workers_lock(self):
+        self.assertEqual(get_or_compute('test', self.key, self.take_over_lock, timeout=60), 'value')
+        self.assert_lock_kept()
+
+    def test_slow_refill_keeps_the_next_workers_lock(self):
+        cache.delete(self.lock_key)
+        self.assertTrue(refill('test', self.key, self.take_over_lock, timeout=60))
+        self.assert_lock_kept()
+
+
+class ClusterWindowTests(TestCase):
+    """Clusters only cover the last 30 days unless a start date is given."""
+
+    def setUp(self):
+        clear_reference_tables()
+        agency = Agency.objects.create(name='Test Police')
+        category = CrimeCategory.objects.create(name='Theft', severity_level=3)
+        make_crime(agency, category, 'C-1', date.today())
+        make_crime(agency, category, 'C-2', date.today() - relativedelta(days=90))
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('clusterer', password='clusterer-password'))
+
+    def total(self, **params):
+        response = self.client.get(reverse('crimes:crimes-clusters'), {'bbox': '36,-2,37,-1', 'zoom': 0, **params})
+        self.assertEqual(response.status_code, 200)
+        return sum(cluster['count'] for cluster in response.data['results'])
+
+    def test_default_window(self):
+        self.assertEqual(self.total(), 1)
+
+    def test_explicit_start_date(self):
+        self.assertEqual(self.total(start_date=(date.today() - relativedelta(days=120)).isoformat()), 2)
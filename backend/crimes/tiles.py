@@ -0,0 +1,174 @@
+"""
+Mapbox Vector Tile rendering for crimes app.
+"""
+import math
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import CharField, F
+from django.db.models.functions import Cast
+from .models import District, Neighborhood
+from .query import PUBLIC_STATUSES, CrimeQueryBuilder
+
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+MAX_ZOOM = 22
+# Latitude limit of the web-mercator tile grid.
+MAX_LATITUDE = 85.05112878
+DEFAULT_TILE_CACHE_TIMEOUT = 60 * 15
+
+LAYER_NAMES = ('crimes', 'districts', 'neighborhoods', 'hotspots')
+
+
+class TileLayer:
+    """A named MVT layer built from a queryset, its geometry field and attributes."""
+
+    def __init__(self, name, queryset, geom_field, attributes):
+        self.name = name
+        self.queryset = queryset
+        self.geom_field = geom_field
+        self.attributes = attributes
+
+    @property
+    def table(self):
+        return self.queryset.model._meta.db_table
+
+    @property
+    def geom_column(self):
+        return self.queryset.model._meta.get_field(self.geom_field).column
+
+    def source_sql(self):
+        """Return SQL selecting ``tile_pk`` plus ``tile_attr_<name>`` columns."""
+        annotations = {'tile_pk': F('pk')}
+        for name, expression in self.attributes.items():
+            annotations[f'tile_attr_{name}'] = F(expression) if isinstance(expression, str) else expression
+        queryset = self.queryset.order_by().annotate(**annotations).values(*annotations)
+        return queryset.query.sql_with_params()
+
+
+def crime_layer(queryset):
+    return TileLayer('crimes', queryset, 'location', {
+        'id': 'id',
+        'category': 'category__name',
+        'status': 'status',
+        'is_violent': 'is_violent',
+        'date': Cast('date', CharField()),
+    })
+
+
+def district_layer(queryset=None):
+    queryset = queryset if queryset is not None else District.objects.all()
+    return TileLayer('districts', queryset.filter(location__isnull=False), 'location', {
+        'id': 'id',
+        'name': 'name',
+        'code': 'code',
+    })
+
+
+def neighborhood_layer(queryset=None):
+    queryset = queryset if queryset is not None else Neighborhood.objects.all()
+    return TileLayer('neighborhoods', queryset.filter(location__isnull=False), 'location', {
+        'id': 'id',
+        'name': 'name',
+        'district_id': 'district_id',
+    })
+
+
+def hotspot_layer(queryset=None):
+    from crime_analytics.models import HotspotZone
+
+    queryset = queryset if queryset is not None else HotspotZone.objects.all()
+    return TileLayer('hotspots', queryset, 'boundary', {
+        'id': 'id',
+        'name': 'name',
+        'intensity': 'intensity',
+    })
+
+
+def public_tile_builder():
+    """Return the filters of the default public tile view (what anonymous users see)."""
+    return CrimeQueryBuilder().status(PUBLIC_STATUSES).with_location()
+
+
+def valid_tile(z, x, y):
+    """Return True if ``z/x/y`` addresses an existing web-mercator tile."""
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tile_position(lng, lat, z):
+    """Return the fractional ``(x, y)`` tile coordinates of a point at zoom ``z``."""
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    scale = 2 ** z
+    x = (lng + 180.0) / 360.0 * scale
+    y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * scale
+    return x, y
+
+
+def tile_range(west, south, east, north, z, margin=0.0):
+    """
+    Yield every ``(z, x, y)`` tile overlapping a lon/lat bounding box.
+
+    ``margin`` widens the box by a fraction of a tile, e.g. the MVT buffer
+    within which a feature is also drawn into a neighbouring tile.
+    """
+    last = 2 ** z - 1
+    min_x, min_y = tile_position(west, north, z)
+    max_x, max_y = tile_position(east, south, z)
+    for x in range(max(0, math.floor(min_x - margin)), min(last, math.floor(max_x + margin)) + 1):
+        for y in range(max(0, math.floor(min_y - margin)), min(last, math.floor(max_y + margin)) + 1):
+            yield z, x, y
+
+
+def tiles_touching(lng, lat, z):
+    """Yield the tiles at zoom ``z`` whose rendering (buffer included) contains a point."""
+    return tile_range(lng, lat, lng, lat, z, margin=TILE_BUFFER / TILE_EXTENT)
+
+
+def render_tile(z, x, y, layers):
+    """
+    Render one vector tile with PostGIS ``ST_AsMVT``.
+
+    Each layer's queryset is joined as a subquery to its base table; the
+    tile envelope filter is applied on the base geometry column so the
+    spatial index is used, and the encoded layers are concatenated into a
+    single tile.
+    """
+    parts = []
+    params = []
+    for layer in layers:
+        source_sql, source_params = layer.source_sql()
+        pk_column = layer.queryset.model._meta.pk.column
+        columns = ', '.join(
+            f'src."tile_attr_{name}" AS "{name}"' for name in layer.attributes
+        )
+        parts.append(
+            f"""COALESCE((SELECT ST_AsMVT(tile, %s, {TILE_EXTENT}, 'geom') FROM (
+                SELECT ST_AsMVTGeom(
+                    ST_Transform(base."{layer.geom_column}"::geometry, 3857),
+                    ST_TileEnvelope(%s, %s, %s), {TILE_EXTENT}, {TILE_BUFFER}, true
+                ) AS geom, {columns}
+                FROM "{layer.table}" AS base
+                JOIN ({source_sql}) AS src ON src.tile_pk = base."{pk_column}"
+                WHERE base."{layer.geom_column}" && ST_Transform(ST_TileEnvelope(%s, %s, %s), 4326)::geography
+            ) AS tile), ''::bytea)"""
+        )
+        params.extend([layer.name, z, x, y, *source_params, z, x, y])
+
+    if not parts:
+        return b''
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {' || '.join(parts)}", params)
+        tile = cursor.fetchone()[0]
+    return bytes(tile) if tile else b''
+
+
+def cached_tile(fingerprint, z, x, y, layers):
+    """Return a rendered tile, cached per filter fingerprint and layer set."""
+    layer_key = '-'.join(layer.name for layer in layers)
+    cache_key = f"crime_tile_{fingerprint}_{layer_key}_{z}_{x}_{y}"
+    tile = cache.get(cache_key)
+    if tile is None:
+        tile = render_tile(z, x, y, layers)
+        timeout = getattr(settings, 'CRIME_TILE_CACHE_TIMEOUT', DEFAULT_TILE_CACHE_TIMEOUT)
+        cache.set(cache_key, tile, timeout=timeout)
+    return tile
@@ -0,0 +1,142 @@
+"""
+On-disk store of pre-rendered public crime tiles.
+
+``prerender_crime_tiles`` renders the default public tile view into an
+MBTiles SQLite file (gzip-compressed tiles, TMS row order), which the
+tiles endpoint reads without touching PostgreSQL. Saved and deleted
+crimes add their geohash to a Redis set while a store exists, so the
+next incremental run only re-renders the tiles they touch.
+"""
+import gzip
+import logging
+import os
+import sqlite3
+import threading
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS tiles (
+    zoom_level INTEGER NOT NULL,
+    tile_column INTEGER NOT NULL,
+    tile_row INTEGER NOT NULL,
+    tile_data BLOB NOT NULL,
+    PRIMARY KEY (zoom_level, tile_column, tile_row)
+) WITHOUT ROWID;
+"""
+
+_local = threading.local()
+
+
+def store_path():
+    return getattr(settings, 'CRIME_TILE_STORE_PATH', os.path.join(settings.BASE_DIR, 'tiles', 'crimes.mbtiles'))
+
+
+def tms_row(z, y):
+    """MBTiles rows count from the bottom of the grid."""
+    return 2 ** z - 1 - y
+
+
+def _reader():
+    """Return this thread's read-only connection, reopened when the file is replaced."""
+    path = store_path()
+    try:
+        identity = os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+    cached = getattr(_local, 'reader', None)
+    if cached is not None and cached[0] == identity:
+        return cached[1]
+    if cached is not None:
+        cached[1].close()
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+    _local.reader = (identity, connection)
+    return connection
+
+
+def read_tile(z, x, y):
+    """Return a stored tile (gzip-compressed, or empty), or None if it was never rendered."""
+    try:
+        connection = _reader()
+        if connection is None:
+            return None
+        row = connection.execute(
+            'SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?',
+            (z, x, tms_row(z, y))
+        ).fetchone()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not read pre-rendered tile {z}/{x}/{y}: {e}")
+        return None
+    return None if row is None else bytes(row[0])
+
+
+def stored_tile_response(request, data):
+    """Serve a stored tile, compressed unless the client does not accept gzip."""
+    compressed = bool(data)
+    if compressed and 'gzip' not in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        data, compressed = gzip.decompress(data), False
+    response = HttpResponse(data, content_type='application/vnd.mapbox-vector-tile')
+    if compressed:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+class TileWriter:
+    """Writes tiles and metadata into an MBTiles file."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA_SQL)
+
+    def metadata(self):
+        return dict(self.connection.execute('SELECT name, value FROM metadata'))
+
+    def set_metadata(self, values):
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)',
+                [(name, str(value)) for name, value in values.items()]
+            )
+
+    def write(self, tiles):
+        """Store ``(z, x, y, data)`` tiles in one transaction."""
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data) VALUES (?, ?, ?, ?)',
+                [(z, x, tms_row(z, y), data) for z, x, y, data in tiles]
+            )
+
+    def close(self):
+        self.connection.close()
+
+
+def _dirty_key():
+    return cache.make_key('crime_tile_dirty')
+
+
+def mark_dirty(*geohashes):
+    """Record changed crime locations for the next incremental render; failures are only logged."""
+    geohashes = [geohash for geohash in geohashes if geohash]
+    if not geohashes or not os.path.exists(store_path()):
+        return
+    try:
+        get_redis_connection('default').sadd(_dirty_key(), *geohashes)
+    except Exception as e:
+        logger.warning(f"Could not record changed tile locations: {e}")
+
+
+def dirty_geohashes():
+    return {member.decode('utf-8') for member in get_redis_connection('default').smembers(_dirty_key())}
+
+
+def clear_dirty(geohashes):
+    if geohashes:
+        get_redis_connection('default').srem(_dirty_key(), *geohashes)
@@ -10,6 +10,7 @@ router.register(r'categories', views.CrimeCategoryViewSet, basename='categories'
 router.register(r'districts', views.DistrictViewSet, basename='districts')
 router.register(r'neighborhoods', views.NeighborhoodViewSet, basename='neighborhoods')
 router.register(r'statistics', views.CrimeStatisticViewSet, basename='statistics')
+router.register(r'rollups', views.CrimeRollupViewSet, basename='rollups')
 router.register(r'media', views.CrimeMediaViewSet, basename='media')
 router.register(r'notes', views.CrimeNoteViewSet, basename='notes')
 
@@ -18,4 +19,5 @@ urlpatterns = [
     path('public/', views.public_crimes, name='public-crimes'),
     path('stats/', views.CrimeViewSet.as_view({'get': 'stats'}), name='crime-stats'),
     path('trends/', views.CrimeViewSet.as_view({'get': 'trends'}), name='crime-trends'),
+    path('tiles/<int:z>/<int:x>/<int:y>.mvt', views.CrimeViewSet.as_view({'get': 'tiles'}), name='crime-tiles'),
 ]
\ No newline at end of file
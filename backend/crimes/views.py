@@ -1,6 +1,6 @@
 import datetime
 import logging
-from django.http import JsonResponse, FileResponse
+from django.http import HttpResponse, JsonResponse, FileResponse
 from django.conf import settings
 import os
 import json
@@ -30,10 +30,27 @@ from .models import (
 )
 from .serializers import (
     CrimeCategorySerializer, CrimeMediaSerializer, CrimeNoteSerializer, DistrictSerializer, NeighborhoodSerializer,
-    CrimeListSerializer, CrimeDetailSerializer, CrimeCreateSerializer,
+    CrimeListSerializer, CrimeListRowSerializer, CrimeDetailSerializer, CrimeCreateSerializer,
     CrimeStatisticSerializer, CrimeHeatmapSerializer, CrimeSearchSerializer,
     CrimeStatResponseSerializer, PublicCrimeSerializer
 )
+from .query import CrimeQueryBuilder, PUBLIC_STATUSES
+from .pagination import paginate_cursor, wants_cursor
+from .heatmap import MODES as HEATMAP_MODES, heatmap_grid, heatmap_points
+from .tiles import (
+    LAYER_NAMES, MAX_ZOOM, cached_tile, crime_layer, district_layer, hotspot_layer,
+    neighborhood_layer, public_tile_builder, valid_tile
+)
+from .tilestore import read_tile, stored_tile_response
+from .cache import analytics_keys, versioned_fingerprint
+from .clustering import cluster_index
+from .reference import categories
+from .refresh import refreshable
+from .rollups import analytics_source
+from .singleflight import single_flight
+from .fields import with_geojson
+from .search import CrimeSearchFilter
+from .aggregates import BUCKET_FUNCTIONS, period_key, period_label, time_series, window_stats
 from accounts.permissions import IsAgencyUser
 
 class CrimeFilter(django_filters.FilterSet):
@@ -70,6 +87,7 @@ class CrimeViewSet(viewsets.ModelViewSet):
     serializer_class = CrimeListSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filterset_class = CrimeFilter
+    filter_backends = [DjangoFilterBackend, CrimeSearchFilter, filters.OrderingFilter]
     search_fields = ['description', 'block_address', 'case_number']
     ordering_fields = ['date', 'time', 'category__name', 'status']
     ordering = ['-date', '-time']
@@ -92,61 +110,59 @@ class CrimeViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated(), IsAgencyUser()]
         return super().get_permissions()
 
-    def get_queryset(self):
-        """Apply additional filters to queryset."""
-        user = self.request.user
+    def get_query_builder(self):
+        """Return a query builder with the list filters from the request applied."""
         logger = logging.getLogger(__name__)
-        queryset = super().get_queryset()
-
-        logger.info(f"Initial queryset count: {queryset.count()}")
-
-        # Filter by user's agency for agency users
-        if user.is_authenticated and user.user_type == 'agency' and user.agency:
-            queryset = queryset.filter(agency=user.agency)
-            logger.info(f"After agency filter: {queryset.count()} records")
-        elif not (user.is_authenticated and (user.is_staff or user.user_type == 'admin')):
-            queryset = queryset.filter(status__in=['reported', 'solved', 'closed'])
-            logger.info(f"After status filter: {queryset.count()} records")
-
-        # Ensure location is not null
-        queryset = queryset.filter(location__isnull=False)
-        logger.info(f"After location filter: {queryset.count()} records")
+        params = self.request.query_params
+        builder = CrimeQueryBuilder(super().get_queryset()).visible_to(self.request.user).with_location()
 
         # Geospatial filter
-        lat = self.request.query_params.get('lat')
-        lng = self.request.query_params.get('lng')
-        radius = self.request.query_params.get('radius')
+        lat = params.get('lat')
+        lng = params.get('lng')
+        radius = params.get('radius')
         if lat and lng and radius:
             try:
-                point = Point(float(lng), float(lat), srid=4326)
-                queryset = queryset.filter(location__dwithin=(point, D(km=float(radius))))
-                logger.info(f"After geospatial filter (radius={radius} km): {queryset.count()} records")
+                builder.within(lat, lng, radius)
             except (ValueError, TypeError) as e:
                 logger.error(f"Geospatial filter error: {e}")
 
         # Apply additional filters
-        crime_types = self.request.query_params.get('crimeTypes', '').split(',')
-        if crime_types and crime_types[0]:
-            queryset = queryset.filter(category__name__in=[t.lower() for t in crime_types])
-            logger.info(f"After crime types filter ({crime_types}): {queryset.count()} records")
-
-        start_date = self.request.query_params.get('startDate')
-        if start_date:
+        builder.crime_types(params.get('crimeTypes', '').split(','), lowercase=True)
+        builder.date_range(params.get('startDate'), params.get('endDate'))
+        return builder
+
+    def get_analytics_builder(self, default_radius=None, require_location=True):
+        """
+        Return a query builder with the shared analytics filters applied.
+
+        Counts that need no coordinates pass ``require_location=False``, so
+        without a radius filter they can be read from the daily rollups.
+        Raises ``ValueError`` if the ``agency_id`` parameter is malformed.
+        """
+        logger = logging.getLogger(__name__)
+        params = self.request.query_params
+        builder = CrimeQueryBuilder()
+        if require_location:
+            builder.with_location()
+
+        lat = params.get('lat')
+        lng = params.get('lng')
+        radius = params.get('radius', default_radius)
+        if lat and lng and radius:
             try:
-                queryset = queryset.filter(date__gte=start_date)
-                logger.info(f"After start date filter ({start_date}): {queryset.count()} records")
-            except ValueError as e:
-                logger.error(f"Start date filter error: {e}")
+                builder.within(lat, lng, radius)
+            except (ValueError, TypeError) as e:
+                logger.error(f"Invalid geospatial parameters: {e}")
 
-        end_date = self.request.query_params.get('endDate')
-        if end_date:
-            try:
-                queryset = queryset.filter(date__lte=end_date)
-                logger.info(f"After end date filter ({end_date}): {queryset.count()} records")
-            except ValueError as e:
-                logger.error(f"End date filter error: {e}")
+        builder.crime_types(params.get('crime_types', '').split(','))
+        builder.analytics_scope(self.request.user, params.get('agency_id'))
+        return builder
 
-        logger.info(f"Final queryset count: {queryset.count()}")
+    def get_queryset(self):
+        """Apply additional filters to queryset."""
+        queryset = self.get_query_builder().log('Crime list query').build().select_related('category', 'district')
+        if self.action == 'retrieve':
+            queryset = with_geojson(queryset, 'location')
         return queryset
 
     def perform_create(self, serializer):
@@ -171,19 +187,25 @@ class CrimeViewSet(viewsets.ModelViewSet):
             return Response({'error': 'You can only delete your agency’s crimes'}, status=status.HTTP_403_FORBIDDEN)
         instance.delete()
 
-    @method_decorator(cache_page(60 * 15))  # Cache for 15 minutes
+    @refreshable('stats')
+    @single_flight('stats', lambda self, builder, current, previous: analytics_keys(
+        'stats', builder, current=current, previous=previous
+    ))
+    def stats_data(self, builder, current, previous):
+        """Compute the stats payload for the current and previous date windows."""
+        queryset, rollup = analytics_source(builder, 'Crime stats query')
+        stats = window_stats(queryset, current, previous, rollup=rollup)
+
+        if not stats['total_crimes']:
+            stats['top_crimes'] = [{'category__name': cat.name, 'count': 0} for cat in categories.all()[:5]]
+
+        return CrimeStatResponseSerializer(stats).data
+
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Get crime statistics for dashboard charts."""
         logger = logging.getLogger(__name__)
         try:
-            cache_key = f"crime_stats_{request.user.id if request.user.is_authenticated else 'anon'}_{request.query_params.get('agency_id')}_{request.query_params.get('time_frame', 'last30Days')}"
-            cached_data = cache.get(cache_key)
-            if cached_data:
-                logger.info("Using cached stats data.")
-                return Response(cached_data)
-
-            user = self.request.user
             agency_id = request.query_params.get('agency_id')
             time_frame = request.query_params.get('time_frame', 'last30Days')
             crime_types = request.query_params.get('crime_types', '').split(',')
@@ -209,66 +231,14 @@ class CrimeViewSet(viewsets.ModelViewSet):
                 previous_start_date = start_date - datetime.timedelta(days=30)
                 previous_end_date = start_date - datetime.timedelta(days=1)
 
-            area_filter = Q()
-            lat = self.request.query_params.get('lat')
-            lng = self.request.query_params.get('lng')
-            if lat and lng and radius:
-                try:
-                    point = Point(float(lng), float(lat), srid=4326)
-                    area_filter = Q(location__dwithin=(point, D(km=float(radius))))
-                except (ValueError, TypeError) as e:
-                    logger.error(f"Invalid geospatial parameters: {e}")
-
-            type_filter = Q()
-            if crime_types and crime_types[0]:
-                type_filter = Q(category__name__in=crime_types)
+            try:
+                builder = self.get_analytics_builder(default_radius=5, require_location=False)
+            except ValueError:
+                logger.error(f"Invalid agency_id: {agency_id}")
+                return Response({'error': 'Invalid agency_id'}, status=status.HTTP_400_BAD_REQUEST)
 
-            agency_filter = Q()
-            if agency_id:
-                try:
-                    agency_filter = Q(agency_id=int(agency_id))
-                except ValueError:
-                    logger.error(f"Invalid agency_id: {agency_id}")
-            elif user.is_authenticated and user.user_type == 'agency' and user.agency:
-                agency_filter = Q(agency=user.agency)
-
-            status_filter = Q()
-            if not (user.is_authenticated and (user.is_staff or user.user_type == 'admin')):
-                status_filter = Q(status__in=['reported', 'solved', 'closed'])
-
-            base_query = Crime.objects.filter(location__isnull=False)
-            current_crimes = base_query.filter(
-                date__gte=start_date,
-                date__lte=end_date
-            ).filter(area_filter).filter(type_filter).filter(agency_filter).filter(status_filter)
-            previous_crimes = base_query.filter(
-                date__gte=previous_start_date,
-                date__lte=previous_end_date
-            ).filter(area_filter).filter(type_filter).filter(agency_filter).filter(status_filter)
-
-            crime_type_counts = current_crimes.values('category__name').annotate(
-                count=Count('id')
-            ).order_by('-count')[:10]
-
-            if not current_crimes.exists() and not crime_type_counts:
-                categories = CrimeCategory.objects.all()[:5]
-                crime_type_counts = [{'category__name': cat.name, 'count': 0} for cat in categories]
-
-            stats = {
-                'total_crimes': current_crimes.count(),
-                'previous_total_crimes': previous_crimes.count(),
-                'violent_crimes': current_crimes.filter(is_violent=True).count(),
-                'previous_violent_crimes': previous_crimes.filter(is_violent=True).count(),
-                'property_crimes': current_crimes.filter(property_loss__isnull=False).count(),
-                'previous_property_crimes': previous_crimes.filter(property_loss__isnull=False).count(),
-                'arrests': current_crimes.filter(arrests_made=True).count(),
-                'previous_arrests': previous_crimes.filter(arrests_made=True).count(),
-                'top_crimes': list(crime_type_counts),
-            }
-
-            serializer = CrimeStatResponseSerializer(stats)
-            cache.set(cache_key, serializer.data, timeout=3600)
-            return Response(serializer.data)
+            data = self.stats_data(builder, (start_date, end_date), (previous_start_date, previous_end_date))
+            return Response(data)
         except Exception as e:
             logger.error(f"Error in stats action: {e}", exc_info=True)
             return Response({
@@ -276,143 +246,115 @@ class CrimeViewSet(viewsets.ModelViewSet):
                 'detail': str(e) if settings.DEBUG else 'See server logs for details'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @method_decorator(cache_page(60 * 15))
+    @refreshable('trends')
+    @single_flight('trends', lambda self, builder, start_date, end_date, granularity: analytics_keys(
+        'trends', builder, granularity=granularity
+    ))
+    def trends_data(self, builder, start_date, end_date, granularity):
+        """Compute the trends chart payload for a date range and granularity."""
+        logger = logging.getLogger(__name__)
+        queryset, rollup = analytics_source(builder, 'Crime trends query')
+
+        series = time_series(queryset, start_date, end_date, granularity=granularity, rollup=rollup)
+
+        trends = []
+        labels = []
+        total_crimes = []
+        violent_crimes = []
+        property_crimes = []
+        arrests_data = []
+
+        has_data = any(bucket['total'] for bucket in series)
+        for bucket in series:
+            period = bucket['period']
+            month_count = bucket['total']
+            violent_count = bucket['violent']
+            property_count = bucket['property']
+            arrests_count = bucket['arrests']
+
+            if not has_data:
+                import random
+                month_count = random.randint(30, 100)
+                violent_count = random.randint(5, 20)
+                property_count = random.randint(15, 40)
+                arrests_count = random.randint(2, 15)
+                logger.info(f"Using placeholder data for {period.strftime('%Y-%m-%d')}")
+
+            trends.append({
+                'date': period_key(period, granularity),
+                'total': month_count,
+                'violent': violent_count,
+                'property': property_count,
+                'arrests': arrests_count
+            })
+
+            labels.append(period_label(period, granularity))
+            total_crimes.append(month_count)
+            violent_crimes.append(violent_count)
+            property_crimes.append(property_count)
+            arrests_data.append(arrests_count)
+
+        chart_data = {
+            'labels': labels,
+            'datasets': [
+                {
+                    'label': 'Total Crimes',
+                    'data': total_crimes,
+                    'fill': False,
+                    'backgroundColor': 'rgba(75, 192, 192, 0.6)',
+                    'borderColor': 'rgba(75, 192, 192, 1)',
+                    'tension': 0.1
+                },
+                {
+                    'label': 'Violent Crimes',
+                    'data': violent_crimes,
+                    'fill': False,
+                    'backgroundColor': 'rgba(255, 99, 132, 0.6)',
+                    'borderColor': 'rgba(255, 99, 132, 1)',
+                    'tension': 0.1
+                },
+                {
+                    'label': 'Property Crimes',
+                    'data': property_crimes,
+                    'fill': False,
+                    'backgroundColor': 'rgba(255, 159, 64, 0.6)',
+                    'borderColor': 'rgba(255, 159, 64, 1)',
+                    'tension': 0.1
+                },
+                {
+                    'label': 'Arrests',
+                    'data': arrests_data,
+                    'fill': False,
+                    'backgroundColor': 'rgba(54, 162, 235, 0.6)',
+                    'borderColor': 'rgba(54, 162, 235, 1)',
+                    'tension': 0.1
+                }
+            ],
+            'rawData': trends
+        }
+        return chart_data
+
     @action(detail=False, methods=['get'])
     def trends(self, request):
         """Get crime trends over time for Line chart."""
         logger = logging.getLogger(__name__)
         try:
-            cache_key = f"crime_trends_{request.user.id if request.user.is_authenticated else 'anon'}_{request.query_params.get('months', 6)}_{request.query_params.get('agency_id')}"
-            cached_data = cache.get(cache_key)
-            if cached_data:
-                logger.info("Using cached trends data.")
-                return Response(cached_data)
-
-            user = self.request.user
             months = int(request.query_params.get('months', 6))
             agency_id = request.query_params.get('agency_id')
+            granularity = request.query_params.get('granularity', 'month')
+            if granularity not in BUCKET_FUNCTIONS:
+                return Response({'error': 'Invalid granularity'}, status=status.HTTP_400_BAD_REQUEST)
             end_date = datetime.date.today()
             start_date = end_date - relativedelta(months=months)
 
-            lat = request.query_params.get('lat')
-            lng = request.query_params.get('lng')
-            radius = request.query_params.get('radius')
-            area_filter = Q()
-            if lat and lng and radius:
-                try:
-                    point = Point(float(lng), float(lat), srid=4326)
-                    area_filter = Q(location__dwithin=(point, D(km=float(radius))))
-                except (ValueError, TypeError) as e:
-                    logger.error(f"Invalid geospatial parameters: {e}")
-
-            agency_filter = Q()
-            if agency_id:
-                try:
-                    agency_filter = Q(agency_id=int(agency_id))
-                except ValueError:
-                    logger.error(f"Invalid agency_id: {agency_id}")
-                    return Response({'error': 'Invalid agency_id'}, status=status.HTTP_400_BAD_REQUEST)
-            elif user.is_authenticated and user.user_type == 'agency' and user.agency:
-                agency_filter = Q(agency=user.agency)
-
-            status_filter = Q()
-            if not (user.is_authenticated and (user.is_staff or user.user_type == 'admin')):
-                status_filter = Q(status__in=['reported', 'solved', 'closed'])
+            try:
+                builder = self.get_analytics_builder(require_location=False)
+            except ValueError:
+                logger.error(f"Invalid agency_id: {agency_id}")
+                return Response({'error': 'Invalid agency_id'}, status=status.HTTP_400_BAD_REQUEST)
 
-            type_filter = Q()
-            crime_types = request.query_params.get('crime_types', '').split(',')
-            if crime_types and crime_types[0]:
-                type_filter = Q(category__name__in=crime_types)
-
-            queryset = Crime.objects.filter(
-                date__gte=start_date,
-                date__lte=end_date,
-                location__isnull=False
-            ).filter(area_filter).filter(agency_filter).filter(status_filter).filter(type_filter)
-
-            trends = []
-            current_date = start_date.replace(day=1)
-            labels = []
-            total_crimes = []
-            violent_crimes = []
-            property_crimes = []
-            arrests_data = []
-
-            has_data = queryset.exists()
-            while current_date <= end_date:
-                next_month = current_date + relativedelta(months=1)
-                month_crimes = queryset.filter(date__gte=current_date, date__lt=next_month)
-                month_count = month_crimes.count()
-
-                if has_data:
-                    violent_count = month_crimes.filter(is_violent=True).count()
-                    property_count = month_crimes.filter(property_loss__isnull=False).count()
-                    arrests_count = month_crimes.filter(arrests_made=True).count()
-                else:
-                    import random
-                    month_count = random.randint(30, 100)
-                    violent_count = random.randint(5, 20)
-                    property_count = random.randint(15, 40)
-                    arrests_count = random.randint(2, 15)
-                    logger.info(f"Using placeholder data for {current_date.strftime('%Y-%m')}")
-
-                trends.append({
-                    'date': current_date.strftime('%Y-%m'),
-                    'total': month_count,
-                    'violent': violent_count,
-                    'property': property_count,
-                    'arrests': arrests_count
-                })
-
-                labels.append(current_date.strftime('%b %Y'))
-                total_crimes.append(month_count)
-                violent_crimes.append(violent_count)
-                property_crimes.append(property_count)
-                arrests_data.append(arrests_count)
-
-                current_date = next_month
-
-            chart_data = {
-                'labels': labels,
-                'datasets': [
-                    {
-                        'label': 'Total Crimes',
-                        'data': total_crimes,
-                        'fill': False,
-                        'backgroundColor': 'rgba(75, 192, 192, 0.6)',
-                        'borderColor': 'rgba(75, 192, 192, 1)',
-                        'tension': 0.1
-                    },
-                    {
-                        'label': 'Violent Crimes',
-                        'data': violent_crimes,
-                        'fill': False,
-                        'backgroundColor': 'rgba(255, 99, 132, 0.6)',
-                        'borderColor': 'rgba(255, 99, 132, 1)',
-                        'tension': 0.1
-                    },
-                    {
-                        'label': 'Property Crimes',
-                        'data': property_crimes,
-                        'fill': False,
-                        'backgroundColor': 'rgba(255, 159, 64, 0.6)',
-                        'borderColor': 'rgba(255, 159, 64, 1)',
-                        'tension': 0.1
-                    },
-                    {
-                        'label': 'Arrests',
-                        'data': arrests_data,
-                        'fill': False,
-                        'backgroundColor': 'rgba(54, 162, 235, 0.6)',
-                        'borderColor': 'rgba(54, 162, 235, 1)',
-                        'tension': 0.1
-                    }
-                ],
-                'rawData': trends
-            }
-
-            cache.set(cache_key, chart_data, timeout=3600)
-            return Response(chart_data)
+            builder.date_range(start_date, end_date)
+            return Response(self.trends_data(builder, start_date, end_date, granularity))
         except Exception as e:
             logger.error(f"Error in trends action: {e}", exc_info=True)
             return Response({
@@ -420,66 +362,52 @@ class CrimeViewSet(viewsets.ModelViewSet):
                 'detail': str(e) if settings.DEBUG else 'See server logs for details'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @method_decorator(cache_page(60 * 15))
+    @refreshable('heatmap')
+    @single_flight('heatmap', lambda self, builder, end_date, days, mode, zoom: analytics_keys(
+        'heatmap', builder, end_date=end_date, days=days, mode=mode, zoom=zoom
+    ))
+    def heatmap_data(self, builder, end_date, days, mode, zoom):
+        """Compute heatmap points, or grid cells for ``zoom`` in grid mode."""
+        logger = logging.getLogger(__name__)
+        crimes = builder.log('Crime heatmap query').build()
+
+        if mode == 'grid':
+            heatmap_data = heatmap_grid(crimes, end_date, days, zoom)
+        else:
+            heatmap_data = heatmap_points(crimes, end_date, days)
+
+        logger.info(f"Generated heatmap data: {len(heatmap_data)} points")
+        return CrimeHeatmapSerializer(heatmap_data, many=True).data
+
     @action(detail=False, methods=['get'])
     def heatmap(self, request):
-        """Get data for a crime heatmap."""
+        """Get data for a crime heatmap (``mode=grid`` bins crimes per ``zoom``)."""
         logger = logging.getLogger(__name__)
         try:
-            cache_key = f"crime_heatmap_{request.user.id if request.user.is_authenticated else 'anon'}_{request.query_params.get('days', 30)}_{request.query_params.get('agency_id')}"
-            cached_data = cache.get(cache_key)
-            if cached_data:
-                logger.info("Using cached heatmap data.")
-                return Response(cached_data)
-
-            user = self.request.user
-            days = int(request.query_params.get('days', 30))
-            agency_id = request.query_params.get('agency_id')
+            mode = request.query_params.get('mode', 'points')
+            if mode not in HEATMAP_MODES:
+                return Response({'error': f"mode must be one of: {', '.join(HEATMAP_MODES)}"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            try:
+                days = int(request.query_params.get('days', 30))
+                zoom = int(request.query_params.get('zoom', 6))
+            except ValueError:
+                return Response({'error': 'Invalid days or zoom'}, status=status.HTTP_400_BAD_REQUEST)
+            if not 0 <= zoom <= MAX_ZOOM:
+                return Response({'error': f'zoom must be between 0 and {MAX_ZOOM}'}, status=status.HTTP_400_BAD_REQUEST)
+            if mode != 'grid':
+                # Only grid mode bins per zoom level, so points share one cache entry.
+                zoom = None
             end_date = datetime.date.today()
             start_date = end_date - datetime.timedelta(days=days)
 
-            crime_type_filter = Q()
-            crime_types = request.query_params.get('crime_types')
-            if crime_types:
-                crime_type_list = crime_types.split(',')
-                crime_type_filter = Q(category__name__in=crime_type_list)
+            try:
+                builder = self.get_analytics_builder()
+            except ValueError:
+                return Response({'error': 'Invalid agency_id'}, status=status.HTTP_400_BAD_REQUEST)
 
-            agency_filter = Q()
-            if agency_id:
-                try:
-                    agency_filter = Q(agency_id=int(agency_id))
-                except ValueError:
-                    return Response({'error': 'Invalid agency_id'}, status=status.HTTP_400_BAD_REQUEST)
-            elif user.is_authenticated and user.user_type == 'agency' and user.agency:
-                agency_filter = Q(agency=user.agency)
-
-            status_filter = Q()
-            if not (user.is_authenticated and (user.is_staff or user.user_type == 'admin')):
-                status_filter = Q(status__in=['reported', 'solved', 'closed'])
-
-            crimes = Crime.objects.filter(
-                date__gte=start_date,
-                date__lte=end_date,
-                location__isnull=False
-            ).filter(crime_type_filter).filter(agency_filter).filter(status_filter)
-
-            heatmap_data = []
-            for crime in crimes:
-                days_ago = (end_date - crime.date).days
-                recency_factor = 1.0 - (days_ago / days) if days > 0 else 1.0
-                severity_factor = 2.0 if crime.is_violent else 1.0
-                intensity = recency_factor * severity_factor
-
-                heatmap_data.append({
-                    'lat': crime.location.y,
-                    'lng': crime.location.x,
-                    'intensity': intensity
-                })
-
-            serializer = CrimeHeatmapSerializer(heatmap_data, many=True)
-            cache.set(cache_key, serializer.data, timeout=3600)
-            logger.info(f"Generated heatmap data: {len(heatmap_data)} points")
-            return Response(serializer.data)
+            builder.date_range(start_date, end_date)
+            return Response(self.heatmap_data(builder, end_date, days, mode, zoom))
         except Exception as e:
             logger.error(f"Error in heatmap action: {e}", exc_info=True)
             return Response({
@@ -487,12 +415,93 @@ class CrimeViewSet(viewsets.ModelViewSet):
                 'detail': str(e) if settings.DEBUG else 'See server logs for details'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['get'], url_path=r'tiles/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.mvt')
+    def tiles(self, request, z=None, x=None, y=None):
+        """Get a Mapbox Vector Tile of crimes and optional reference layers."""
+        logger = logging.getLogger(__name__)
+        try:
+            z, x, y = int(z), int(x), int(y)
+            if not valid_tile(z, x, y):
+                return Response({'error': 'Invalid tile coordinates'}, status=status.HTTP_400_BAD_REQUEST)
+
+            names = request.query_params.get('layers', 'crimes').split(',')
+            if any(name not in LAYER_NAMES for name in names):
+                return Response({'error': 'Invalid layers'}, status=status.HTTP_400_BAD_REQUEST)
+
+            user = request.user
+            builder = self.get_query_builder()
+            if names == ['crimes'] and builder.applied == public_tile_builder().applied:
+                stored = read_tile(z, x, y)
+                if stored is not None:
+                    return stored_tile_response(request, stored)
+
+            layers = []
+            if 'crimes' in names:
+                layers.append(crime_layer(builder.build()))
+            if 'districts' in names:
+                districts = DistrictViewSet(request=request).get_queryset()
+                layers.append(district_layer(districts))
+            if 'neighborhoods' in names:
+                neighborhoods = NeighborhoodViewSet(request=request).get_queryset()
+                layers.append(neighborhood_layer(neighborhoods))
+            if 'hotspots' in names and user.is_authenticated:
+                layers.append(hotspot_layer())
+
+            tile = cached_tile(versioned_fingerprint(builder), z, x, y, layers)
+            return HttpResponse(tile, content_type='application/vnd.mapbox-vector-tile')
+        except Exception as e:
+            logger.error(f"Error in tiles action: {e}", exc_info=True)
+            return Response({
+                'error': 'An unexpected error occurred',
+                'detail': str(e) if settings.DEBUG else 'See server logs for details'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(detail=False, methods=['get'])
+    def clusters(self, request):
+        """
+        Get server-side crime clusters for a map viewport (``bbox`` and ``zoom``).
+
+        Like ``map_data``, crimes default to the last 30 days unless ``start_date`` is given.
+        """
+        logger = logging.getLogger(__name__)
+        try:
+            try:
+                bbox = [float(value) for value in request.query_params.get('bbox', '').split(',')]
+                zoom = int(request.query_params.get('zoom', 0))
+            except ValueError:
+                return Response({'error': 'Invalid bbox or zoom'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                start_date = request.query_params.get('start_date')
+                start_date = (
+                    datetime.date.fromisoformat(start_date) if start_date
+                    else datetime.date.today() - datetime.timedelta(days=30)
+                )
+                end_date = request.query_params.get('end_date')
+                end_date = datetime.date.fromisoformat(end_date) if end_date else None
+            except ValueError:
+                return Response({'error': 'Invalid start_date or end_date'}, status=status.HTTP_400_BAD_REQUEST)
+            if len(bbox) != 4:
+                return Response({'error': 'bbox must be west,south,east,north'}, status=status.HTTP_400_BAD_REQUEST)
+            if not 0 <= zoom <= MAX_ZOOM:
+                return Response({'error': f'zoom must be between 0 and {MAX_ZOOM}'}, status=status.HTTP_400_BAD_REQUEST)
+
+            builder = self.get_query_builder().date_range(start_date, end_date)
+            index = cluster_index(versioned_fingerprint(builder), builder.build())
+            clusters = index.query(bbox, zoom)
+            logger.info(f"Clusters returned {len(clusters)} clusters (zoom={zoom})")
+            return Response({'results': clusters, 'zoom': zoom})
+        except Exception as e:
+            logger.error(f"Error in clusters action: {e}", exc_info=True)
+            return Response({
+                'error': 'An unexpected error occurred',
+                'detail': str(e) if settings.DEBUG else 'See server logs for details'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
     @action(detail=False, methods=['post'])
     def search(self, request):
-        """Advanced search for crimes with offset/limit."""
+        """Advanced search for crimes with offset/limit, ranked by relevance for keyword searches."""
         logger = logging.getLogger(__name__)
         try:
-            user = self.request.user
             agency_id = request.query_params.get('agency_id')
             offset = int(request.query_params.get('offset', 0))
             limit = int(request.query_params.get('limit', 1000))
@@ -500,48 +509,35 @@ class CrimeViewSet(viewsets.ModelViewSet):
             serializer = CrimeSearchSerializer(data=request.data)
             if not serializer.is_valid():
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            data = serializer.validated_data
 
-            point = Point(
-                serializer.validated_data['longitude'],
-                serializer.validated_data['latitude'],
-                srid=4326
-            )
-
-            agency_filter = Q()
-            if agency_id:
-                try:
-                    agency_filter = Q(agency_id=int(agency_id))
-                except ValueError:
-                    return Response({'error': 'Invalid agency_id'}, status=status.HTTP_400_BAD_REQUEST)
-            elif user.is_authenticated and user.user_type == 'agency' and user.agency:
-                agency_filter = Q(agency=user.agency)
-
-            status_filter = Q()
-            if not (user.is_authenticated and (user.is_staff or user.user_type == 'admin')):
-                status_filter = Q(status__in=['reported', 'solved', 'closed'])
-
-            queryset = Crime.objects.filter(
-                location__dwithin=(point, D(km=serializer.validated_data['radius'])),
-                location__isnull=False
-            ).filter(agency_filter).filter(status_filter)
-
-            if 'crime_types' in serializer.validated_data:
-                queryset = queryset.filter(category__name__in=serializer.validated_data['crime_types'])
-            if 'start_date' in serializer.validated_data:
-                queryset = queryset.filter(date__gte=serializer.validated_data['start_date'])
-            if 'end_date' in serializer.validated_data:
-                queryset = queryset.filter(date__lte=serializer.validated_data['end_date'])
-            if 'keywords' in serializer.validated_data:
-                keyword_filter = Q(description__icontains=serializer.validated_data['keywords']) | \
-                                Q(block_address__icontains=serializer.validated_data['keywords'])
-                queryset = queryset.filter(keyword_filter)
-            if 'is_violent' in serializer.validated_data:
-                queryset = queryset.filter(is_violent=serializer.validated_data['is_violent'])
-            if 'status' in serializer.validated_data:
-                queryset = queryset.filter(status=serializer.validated_data['status'])
-
-            queryset = queryset.order_by('date', 'time')[offset:offset + limit]
-            serializer = CrimeListSerializer(queryset, many=True)
+            try:
+                builder = CrimeQueryBuilder().with_location().analytics_scope(request.user, agency_id)
+            except ValueError:
+                return Response({'error': 'Invalid agency_id'}, status=status.HTTP_400_BAD_REQUEST)
+            builder.within(data['latitude'], data['longitude'], data['radius'])
+
+            if 'crime_types' in data:
+                builder.crime_types(data['crime_types'])
+            builder.date_range(data.get('start_date'), data.get('end_date'))
+            if 'keywords' in data:
+                builder.keywords(data['keywords'], data['search_mode'])
+            if 'is_violent' in data:
+                builder.is_violent(data['is_violent'])
+            if 'status' in data:
+                builder.status(data['status'])
+            builder.log('Crime search query')
+
+            if wants_cursor(request.query_params):
+                return cursor_page_response(builder, request.query_params, ascending=True)
+
+            queryset = builder.build().order_by('date', 'time')
+            # Keyword searches rank by relevance unless date order is asked for;
+            # cursor pages above always use date order.
+            if builder.rank() is not None and data.get('order', 'relevance') == 'relevance':
+                queryset = queryset.annotate(rank=builder.rank()).order_by('-rank', 'date', 'time')
+            queryset = CrimeListRowSerializer.project(queryset)[offset:offset + limit]
+            serializer = CrimeListRowSerializer(queryset, projected=True)
             logger.info(f"Search returned {len(serializer.data)} crimes (offset={offset}, limit={limit})")
             return Response({
                 'results': serializer.data,
@@ -566,22 +562,21 @@ class CrimeViewSet(viewsets.ModelViewSet):
             neighborhood_id = request.query_params.get('neighborhood_id')
             start_date = request.query_params.get('start_date') or datetime.date.today() - datetime.timedelta(days=30)
             end_date = request.query_params.get('end_date')
-            user = self.request.user
 
-            queryset = self.get_queryset()
+            builder = self.get_query_builder()
             if neighborhood_id:
                 try:
-                    queryset = queryset.filter(neighborhood__id=int(neighborhood_id))
+                    builder.neighborhood(neighborhood_id)
                 except ValueError:
                     logger.error(f"Invalid neighborhood_id: {neighborhood_id}")
                     return Response({'error': 'Invalid neighborhood_id'}, status=status.HTTP_400_BAD_REQUEST)
-            if start_date:
-                queryset = queryset.filter(date__gte=start_date)
-            if end_date:
-                queryset = queryset.filter(date__lte=end_date)
+            builder.date_range(start_date, end_date).log('Crime map query')
+
+            if wants_cursor(request.query_params):
+                return cursor_page_response(builder, request.query_params)
 
-            queryset = queryset[offset:offset + limit]
-            serializer = CrimeLightSerializer(queryset, many=True)
+            queryset = CrimeListRowSerializer.project(builder.build())[offset:offset + limit]
+            serializer = CrimeListRowSerializer(queryset, projected=True)
             logger.info(f"Map data returned {len(serializer.data)} crimes (offset={offset}, limit={limit})")
             return Response({
                 'results': serializer.data,
@@ -618,8 +613,8 @@ class DistrictViewSet(viewsets.ReadOnlyModelViewSet):
         """Filter districts by user's agency."""
         user = self.request.user
         if user.is_authenticated and user.user_type == 'agency' and user.agency:
-            return District.objects.filter(agency=user.agency)
-        return District.objects.all()
+            return with_geojson(District.objects.filter(agency=user.agency), 'location')
+        return with_geojson(District.objects.all(), 'location')
 
 class NeighborhoodViewSet(viewsets.ReadOnlyModelViewSet):
     """API endpoint for neighborhoods."""
@@ -634,12 +629,12 @@ class NeighborhoodViewSet(viewsets.ReadOnlyModelViewSet):
         """Filter neighborhoods by user's agency districts."""
         user = self.request.user
         if user.is_authenticated and user.user_type == 'agency' and user.agency:
-            return Neighborhood.objects.filter(district__agency=user.agency)
-        return Neighborhood.objects.all()
+            return with_geojson(Neighborhood.objects.filter(district__agency=user.agency), 'location')
+        return with_geojson(Neighborhood.objects.all(), 'location')
 
 class CrimeStatisticViewSet(viewsets.ReadOnlyModelViewSet):
-    """API endpoint for crime statistics."""
-    queryset = CrimeStatistic.objects.all()
+    """API endpoint for the summary crime statistics loaded by the seed/import commands."""
+    queryset = CrimeStatistic.objects.filter(status__isnull=True)
     serializer_class = CrimeStatisticSerializer
     permission_classes = [permissions.IsAuthenticated]
     filterset_fields = ['date', 'category', 'district', 'neighborhood', 'agency']
@@ -648,10 +643,16 @@ class CrimeStatisticViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         """Filter statistics by user's agency."""
+        queryset = self.queryset.all()
         user = self.request.user
         if user.is_authenticated and user.user_type == 'agency' and user.agency:
-            return CrimeStatistic.objects.filter(agency=user.agency)
-        return CrimeStatistic.objects.all()
+            return queryset.filter(agency=user.agency)
+        return queryset
+
+class CrimeRollupViewSet(CrimeStatisticViewSet):
+    """API endpoint for the daily per-status rollups maintained by ``crimes.rollups``."""
+    queryset = CrimeStatistic.objects.filter(status__isnull=False)
+    filterset_fields = ['date', 'category', 'district', 'neighborhood', 'agency', 'status']
 
 class CrimeMediaViewSet(viewsets.ModelViewSet):
     """API endpoint for crime media."""
@@ -706,14 +707,13 @@ def public_crimes(request):
         lng = float(lng)
         radius = float(radius)
 
-        user_location = Point(lng, lat, srid=4326)
-        crimes = Crime.objects.filter(
-            location__dwithin=(user_location, D(km=radius)),
-            status__in=['reported', 'solved', 'closed'],
-            location__isnull=False
-        )[offset:offset + limit]
+        builder = CrimeQueryBuilder().with_location().status(PUBLIC_STATUSES).within(lat, lng, radius)
+        if wants_cursor(request.query_params):
+            return cursor_page_response(builder, request.query_params)
 
-        serializer = CrimeListSerializer(crimes, many=True)
+        crimes = CrimeListRowSerializer.project(builder.build())[offset:offset + limit]
+
+        serializer = CrimeListRowSerializer(crimes, projected=True)
         logger.info(f"Public crimes returned {len(serializer.data)} crimes (offset={offset}, limit={limit})")
         return Response({
             'results': serializer.data,
@@ -727,6 +727,18 @@ def public_crimes(request):
         logger.error(f"Error in public_crimes: {e}", exc_info=True)
         return Response({"error": str(e)}, status=500)
     
+def cursor_page_response(builder, params, ascending=False):
+    """Serialize one keyset page of crimes, or a 400 for a bad cursor/count."""
+    try:
+        rows, meta = paginate_cursor(
+            builder, params, descending=not ascending, project=CrimeListRowSerializer.project
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    serializer = CrimeListRowSerializer(rows, projected=True)
+    return Response({'results': serializer.data, **meta})
+
+
 def get_exported_crime_summary(request):
     file_path = os.path.join(settings.MEDIA_ROOT, 'exports', 'crime_data_export.json')
     